@@ -0,0 +1,142 @@
+"""周期数据编码方式基准测试
+
+对比codec.CYCLE_CODECS中各编码方式的压缩率、编码/解码吞吐量，以及写入SQLite后的
+文件大小和按时间范围读取并解码全部数据的耗时。
+
+使用现场采集的数据（从已有数据库中读取最新的若干周期）：
+
+    python benchmarks/bench_cycle_codec.py --db gis_pd_data.db --count 20000
+
+不指定--db时使用模拟数据（底噪加稀疏脉冲），只能作为参考，选择编码方式请以现场数据为准。
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gis_pd_core import (DatabaseManager, MV_TABLE, CYCLE_CODECS, encode_cycle, decode_cycle,  # noqa: E402
+                         decode_cycles, format_timestamp)
+from gis_pd_core.decoder import ADC_REFERENCE, ADC_RESOLUTION  # noqa: E402
+from gis_pd_core.sqlite_config import connect  # noqa: E402
+
+
+def load_cycles(db_path, count):
+    """从数据库中读取最新的count个周期"""
+    conn = connect(db_path, read_only=True)
+    try:
+        rows = conn.execute(
+            "SELECT data FROM cycle_data ORDER BY time_us DESC, id DESC LIMIT ?", (count,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return decode_cycles([row[0] for row in rows])[::-1]
+
+
+def synthetic_cycles(count, samples, seed=0):
+    """生成模拟周期：半正态分布的底噪，每周期平均2个衰减振荡脉冲"""
+    rng = np.random.default_rng(seed)
+    cycles = []
+    for _ in range(count):
+        values = np.abs(rng.normal(0.05, 0.02, samples))
+        for _ in range(rng.poisson(2)):
+            start = rng.integers(0, samples - 8)
+            t = np.arange(8)
+            values[start:start + 8] += rng.uniform(0.3, 3.0) * np.exp(-t / 2) * np.cos(t)
+        codes = np.clip(np.round(np.abs(values) * ADC_RESOLUTION / ADC_REFERENCE), 0, ADC_RESOLUTION - 1)
+        cycles.append(MV_TABLE[codes.astype(np.int64)])
+    return cycles
+
+
+def bench_codec(codec, cycles, workdir):
+    """测试一种编码方式，返回结果字典"""
+    start = time.perf_counter()
+    blobs = [encode_cycle(data, codec) for data in cycles]
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for blob in blobs:
+        decode_cycle(blob)
+    decode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = decode_cycles(blobs)
+    batch_s = time.perf_counter() - start
+    for original, value in zip(cycles, decoded):
+        assert np.array_equal(original, value), f"{codec} 解码结果与原数据不一致"
+
+    # 写入数据库后按时间范围读取并解码
+    db_path = os.path.join(workdir, f"{codec}.db")
+    db = DatabaseManager(db_path=db_path, rollups=False, cycle_codec=codec)
+    # 每20毫秒一个周期（50Hz）
+    base = datetime.datetime.now() - datetime.timedelta(seconds=len(cycles) * 0.02)
+    records = [(format_timestamp(base + datetime.timedelta(seconds=i * 0.02)), i, data, "")
+               for i, data in enumerate(cycles)]
+    for i in range(0, len(records), 1000):
+        db.write_batch(records[i:i + 1000], [])
+    db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    page_count = db.conn.execute("PRAGMA page_count").fetchone()[0]
+    db.close()
+    file_mb = os.path.getsize(db_path) / 1024 / 1024
+
+    conn = connect(db_path, read_only=True)
+    start = time.perf_counter()
+    rows = conn.execute("SELECT data FROM cycle_data WHERE time_us BETWEEN ? AND ? ORDER BY time_us, id",
+                        (0, 2 ** 62)).fetchall()
+    decode_cycles([row[0] for row in rows])
+    query_s = time.perf_counter() - start
+    conn.close()
+
+    return {
+        "codec": codec,
+        "bytes": sum(len(blob) for blob in blobs),
+        "encode_s": encode_s,
+        "decode_s": decode_s,
+        "batch_s": batch_s,
+        "file_mb": file_mb,
+        "pages": page_count,
+        "query_s": query_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="周期数据编码方式基准测试")
+    parser.add_argument("--db", default=None, help="读取现场数据的数据库文件（不指定时使用模拟数据）")
+    parser.add_argument("--count", type=int, default=20000, help="测试的周期数")
+    parser.add_argument("--samples", type=int, default=360, help="模拟数据每周期的采样点数")
+    parser.add_argument("--codec", action="append", dest="codecs", choices=tuple(CYCLE_CODECS),
+                        help="只测试指定的编码方式（可多次指定）")
+    args = parser.parse_args()
+
+    if args.db:
+        cycles = load_cycles(args.db, args.count)
+        print(f"数据来源: {args.db}，{len(cycles)} 个周期")
+    else:
+        cycles = synthetic_cycles(args.count, args.samples)
+        print(f"数据来源: 模拟数据，{len(cycles)} 个周期 x {args.samples} 点")
+    if not cycles:
+        print("没有可测试的周期数据")
+        return 1
+    samples = sum(len(data) for data in cycles)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for codec in args.codecs or CYCLE_CODECS:
+            results.append(bench_codec(codec, cycles, workdir))
+
+    baseline = next((r["bytes"] for r in results if r["codec"] == "none"), samples * 2)
+    print(f"{'编码方式':<12}{'字节/点':>8}{'压缩率':>8}{'编码(点/秒)':>14}{'解码(点/秒)':>14}"
+          f"{'批量解码(点/秒)':>18}{'文件(MB)':>10}{'页数':>10}{'读取+解码(ms)':>16}")
+    for r in results:
+        print(f"{r['codec']:<12}{r['bytes'] / samples:>8.3f}{baseline / r['bytes']:>8.2f}"
+              f"{samples / r['encode_s']:>14.3e}{samples / r['decode_s']:>14.3e}{samples / r['batch_s']:>18.3e}"
+              f"{r['file_mb']:>10.2f}{r['pages']:>10}{r['query_s'] * 1000:>16.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+"""MQTT接收延迟基准测试
+
+对比两种网络循环方式从发布到收到消息(解码完成，即message_received的数据来源)的延迟：
+- poll:  旧的MQTTThread实现，循环调用 client.loop(0.1) 后 time.sleep(0.01)
+- event: 新的MQTTThread实现，client.loop_forever() 由套接字可读事件驱动
+
+发布端在帧头的4个数据中写入发送时刻(perf_counter_ns)，接收端解码后计算延迟。
+需要一个可访问的MQTT Broker，例如本机的mosquitto：
+
+    python benchmarks/bench_mqtt_latency.py --broker 127.0.0.1 --rate 200 --count 2000
+"""
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gis_pd_core import decode_payload  # noqa: E402
+
+SAMPLES_PER_CYCLE = 360
+
+
+def build_payload(send_ns):
+    """构造一帧负载：帧头4个数据为发送时刻，帧尾1个数据，中间为周期数据"""
+    header = struct.pack(">Q", send_ns)
+    body = np.random.randint(0, 4096, SAMPLES_PER_CYCLE, dtype=np.uint16).astype(">u2").tobytes()
+    return header + body + b"\x00\x00"
+
+
+def run_mode(mode, args):
+    """运行一种网络循环方式，返回延迟数组(微秒)"""
+    topic = f"bench/{uuid.uuid4().hex}"
+    latencies = []
+    done = threading.Event()
+
+    def on_connect(client, userdata, flags, rc, properties):
+        client.subscribe(topic, qos=args.qos)
+
+    def on_message(client, userdata, msg):
+        recv_ns = time.perf_counter_ns()
+        send_ns = struct.unpack(">Q", msg.payload[:8])[0]
+        decode_payload(msg.payload)
+        latencies.append((recv_ns - send_ns) / 1000.0)
+        if len(latencies) >= args.count:
+            done.set()
+
+    sub = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    sub.on_connect = on_connect
+    sub.on_message = on_message
+    sub.connect(args.broker, args.port)
+
+    running = True
+
+    def poll_loop():
+        while running:
+            sub.loop(0.1)
+            time.sleep(0.01)
+
+    if mode == "poll":
+        thread = threading.Thread(target=poll_loop, daemon=True)
+    else:
+        thread = threading.Thread(target=sub.loop_forever, daemon=True)
+    thread.start()
+
+    pub = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    pub.connect(args.broker, args.port)
+    pub.loop_start()
+    time.sleep(0.5)  # 等待订阅生效
+
+    interval = 1.0 / args.rate
+    next_time = time.perf_counter()
+    for _ in range(args.count):
+        pub.publish(topic, build_payload(time.perf_counter_ns()), qos=args.qos)
+        next_time += interval
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    done.wait(timeout=10)
+    running = False
+    pub.loop_stop()
+    pub.disconnect()
+    sub.disconnect()
+    thread.join(timeout=2)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT接收延迟基准测试")
+    parser.add_argument("--broker", default="127.0.0.1", help="Broker地址")
+    parser.add_argument("--port", type=int, default=1883, help="Broker端口")
+    parser.add_argument("--rate", type=float, default=100.0, help="发布速率(条/秒)")
+    parser.add_argument("--count", type=int, default=1000, help="每种方式发布的消息数")
+    parser.add_argument("--qos", type=int, default=1, choices=(0, 1, 2), help="QoS等级")
+    parser.add_argument("--modes", nargs="+", default=["poll", "event"], choices=("poll", "event"))
+    args = parser.parse_args()
+
+    print(f"Broker {args.broker}:{args.port}, 速率 {args.rate} 条/秒, 每种方式 {args.count} 条")
+    print(f"{'方式':<8}{'收到':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for mode in args.modes:
+        lat = run_mode(mode, args)
+        if len(lat) == 0:
+            print(f"{mode:<8}{0:>8}")
+            continue
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99]) / 1000.0
+        print(f"{mode:<8}{len(lat):>8}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{lat.max() / 1000.0:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
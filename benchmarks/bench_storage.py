@@ -0,0 +1,127 @@
+"""存储后端基准测试：SQLite与周期日志
+
+对比DatabaseManager（SQLite）和CycleLogStore（追加写入的周期日志）：
+
+- 持续写入速率：按BatchWriter的批大小调用write_batch写入全部周期，统计每秒周期数
+- 按时间范围读取的延迟：随机选取若干个固定长度的时间窗口，读取并解码为float64数组，
+  统计中位数和95分位耗时；周期日志另外测试get_cycle_matrix（memmap视图，不逐行构造结果）
+
+    python benchmarks/bench_storage.py --count 200000 --window 1 --window 60
+
+默认不更新预聚合表（两种存储更新预聚合表的开销相同），--rollups 时同时更新。
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gis_pd_core import DatabaseManager, CYCLE_CODECS, decode_cycles, format_timestamp  # noqa: E402
+from gis_pd_core.cycle_log import CycleLogStore  # noqa: E402
+from bench_cycle_codec import synthetic_cycles  # noqa: E402
+
+# 每20毫秒一个周期（50Hz）
+CYCLE_SECONDS = 0.02
+
+
+def make_records(cycles, start):
+    """生成 (timestamp, cycle_number, data, channel) 记录"""
+    return [(format_timestamp(start + datetime.timedelta(seconds=i * CYCLE_SECONDS)), i, data, "")
+            for i, data in enumerate(cycles)]
+
+
+def bench_insert(store, records, batch_rows):
+    """按批写入全部记录，返回耗时(秒)"""
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_rows):
+        if not store.write_batch(records[i:i + batch_rows], []):
+            raise RuntimeError("写入失败")
+    return time.perf_counter() - start
+
+
+def bench_reads(read, start, total_seconds, window, repeat, seed=0):
+    """随机时间窗口读取，返回每次读取的耗时(毫秒)数组"""
+    rng = np.random.default_rng(seed)
+    times = []
+    for _ in range(repeat):
+        offset = rng.uniform(0, max(total_seconds - window, 0))
+        begin = start + datetime.timedelta(seconds=offset)
+        end = begin + datetime.timedelta(seconds=window)
+        t0 = time.perf_counter()
+        read(format_timestamp(begin), format_timestamp(end))
+        times.append((time.perf_counter() - t0) * 1000)
+    return np.array(times)
+
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite与周期日志存储基准测试")
+    parser.add_argument("--count", type=int, default=100000, help="写入的周期数")
+    parser.add_argument("--samples", type=int, default=360, help="每周期的采样点数")
+    parser.add_argument("--batch-rows", type=int, default=500, help="每次write_batch写入的周期数")
+    parser.add_argument("--window", type=float, action="append", dest="windows",
+                        help="读取的时间窗口长度(秒)，可多次指定（默认1和60）")
+    parser.add_argument("--repeat", type=int, default=50, help="每种窗口读取的次数")
+    parser.add_argument("--codec", default="none", choices=tuple(CYCLE_CODECS), help="SQLite周期数据的编码方式")
+    parser.add_argument("--log-dtype", default="float64", choices=("float64", "float32"), help="周期日志的数据类型")
+    parser.add_argument("--rollups", action="store_true", help="写入时同时更新预聚合表")
+    args = parser.parse_args()
+    windows = args.windows or [1.0, 60.0]
+
+    # 模拟数据只生成一部分，循环使用，避免生成数据的时间远长于测试时间
+    pool = synthetic_cycles(min(args.count, 5000), args.samples)
+    cycles = [pool[i % len(pool)] for i in range(args.count)]
+    start = datetime.datetime.now().replace(microsecond=0) - datetime.timedelta(days=1)
+    records = make_records(cycles, start)
+    total_seconds = args.count * CYCLE_SECONDS
+    print(f"{args.count} 个周期 x {args.samples} 点，时间跨度 {total_seconds:.0f} 秒，每批 {args.batch_rows} 个")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        backends = [
+            (f"sqlite({args.codec})", os.path.join(workdir, "bench.db"),
+             lambda path: DatabaseManager(db_path=path, rollups=args.rollups, cycle_codec=args.codec)),
+            (f"cycle-log({args.log_dtype})", os.path.join(workdir, "log"),
+             lambda path: CycleLogStore(path, value_dtype=args.log_dtype, rollups=args.rollups)),
+        ]
+        results = []
+        for name, path, create in backends:
+            store = create(path)
+            insert_s = bench_insert(store, records, args.batch_rows)
+            store.close()
+            size_mb = directory_size(path) / 1024 / 1024
+
+            # 重新以只读方式打开，与Web服务的读取方式一致
+            reader = CycleLogStore(path, read_only=True) if name.startswith("cycle-log") else \
+                DatabaseManager(db_path=path, rollups=False)
+            reads = {}
+            for window in windows:
+                reads[f"{window:g}s"] = bench_reads(
+                    lambda a, b: decode_cycles([row[3] for row in reader.get_cycle_data_by_time(a, b)]),
+                    start, total_seconds, window, args.repeat)
+                if isinstance(reader, CycleLogStore):
+                    reads[f"{window:g}s matrix"] = bench_reads(
+                        reader.get_cycle_matrix, start, total_seconds, window, args.repeat)
+            reader.close()
+            results.append((name, args.count / insert_s, size_mb, reads))
+
+    print(f"{'存储':<20}{'写入(周期/秒)':>14}{'大小(MB)':>10}")
+    for name, rate, size_mb, _ in results:
+        print(f"{name:<20}{rate:>14.0f}{size_mb:>10.1f}")
+    print(f"\n{'存储':<20}{'读取窗口':>14}{'中位数(ms)':>12}{'95分位(ms)':>12}")
+    for name, _, _, reads in results:
+        for label, times in reads.items():
+            print(f"{name:<20}{label:>14}{np.median(times):>12.2f}{np.percentile(times, 95):>12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
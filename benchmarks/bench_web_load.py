@@ -0,0 +1,139 @@
+"""Web服务负载测试：大范围查询期间的WebSocket推送延迟
+
+在临时数据库中写入历史周期数据后，进程内启动Web服务（Starlette TestClient，与uvicorn相同，
+所有请求和WebSocket连接共用一个事件循环），并运行：
+
+- 写入线程：每隔--interval秒通过BatchWriter写入一个当前时刻的周期（模拟采集程序），每次提交后发送新数据通知
+- WebSocket客户端：接收推送，延迟 = 收到推送的时刻 - 推送中每个周期的时间戳
+  （包含写库线程的攒批时间；--notify-port 0时不发送通知，包含服务端1秒的轮询间隔）
+- 查询线程（第二阶段）：连续请求覆盖全部历史数据的/api/cycle_data_by_time（服务器读取并解码全部周期，降采样后返回）
+
+分别统计空闲阶段和大范围查询阶段的推送延迟。数据库查询在线程池中执行时，两个阶段的p99应基本相同；
+如果查询阻塞事件循环，第二阶段的延迟会增加一次查询的耗时。
+
+    python benchmarks/bench_web_load.py --count 100000 --duration 10
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+from gis_pd_core import BatchWriter, DatabaseManager, format_timestamp  # noqa: E402
+from gis_pd_core.notify import ChangeNotifier, NOTIFY_ENV  # noqa: E402
+from gis_pd_core.writer import DEFAULT_MAX_DELAY_MS  # noqa: E402
+from bench_cycle_codec import synthetic_cycles  # noqa: E402
+
+
+def fill_history(db, count, samples, end):
+    """写入count个历史周期（每20毫秒一个），最后一个周期在end之前，返回第一个周期的时间"""
+    pool = synthetic_cycles(min(count, 2000), samples)
+    start = end - datetime.timedelta(seconds=count * 0.02)
+    for i in range(0, count, 5000):
+        records = [(format_timestamp(start + datetime.timedelta(seconds=j * 0.02)), j, pool[j % len(pool)], "")
+                   for j in range(i, min(i + 5000, count))]
+        db.write_batch(records, [])
+    return start
+
+
+def run_phase(client, duration, writer, cycle, samples, interval, big_query=None):
+    """运行一个阶段，返回 (推送延迟数组(毫秒), 大范围查询耗时列表(秒))"""
+    latencies = []
+    query_times = []
+    stop = threading.Event()
+
+    def write_loop():
+        # cycle为列表，跨阶段保持周期编号递增
+        data = list(np.random.default_rng(cycle[0]).normal(0, 1, samples))
+        while not stop.is_set():
+            writer.save_cycle(cycle[0], data)
+            cycle[0] += 1
+            time.sleep(interval)
+
+    def query_loop():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            response = client.get("/api/cycle_data_by_time", params=big_query)
+            query_times.append(time.perf_counter() - t0)
+            # 不解析响应：客户端与服务端在同一进程中，解析大JSON会持有GIL，影响测得的服务端延迟
+            if not response.content.startswith(b'{"success":true'):
+                print(f"查询失败: {response.content[:200]}")
+
+    threads = [threading.Thread(target=write_loop, daemon=True)]
+    if big_query is not None:
+        threads.append(threading.Thread(target=query_loop, daemon=True))
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()  # 初始数据
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            message = ws.receive_json()
+            received = datetime.datetime.now()
+            for item in message.get("data", []):
+                sent = datetime.datetime.fromisoformat(item["timestamp"])
+                latencies.append((received - sent).total_seconds() * 1000)
+        stop.set()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), query_times
+
+
+def summarize(name, latencies, query_times):
+    if not latencies.size:
+        print(f"{name:<16}没有收到推送")
+        return
+    line = (f"{name:<16}{latencies.size:>8}{np.median(latencies):>12.0f}{np.percentile(latencies, 99):>12.0f}"
+            f"{latencies.max():>12.0f}")
+    if query_times:
+        line += f"   大范围查询 {len(query_times)} 次，平均 {np.mean(query_times):.2f} 秒"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Web服务大范围查询期间的WebSocket推送延迟")
+    parser.add_argument("--count", type=int, default=100000, help="历史周期数（大范围查询读取全部历史数据）")
+    parser.add_argument("--samples", type=int, default=360, help="每周期的采样点数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个阶段的时长(秒)")
+    parser.add_argument("--interval", type=float, default=0.05, help="写入新周期的间隔(秒)")
+    parser.add_argument("--batch-delay-ms", type=float, default=DEFAULT_MAX_DELAY_MS, help="写库线程攒批的最长等待时间(毫秒)")
+    parser.add_argument("--notify-port", type=int, default=47652, help="新数据通知的UDP端口，0表示只使用轮询")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "gis_pd_data.db")
+    writer_db = DatabaseManager(db_path=db_path, rollups=False)
+    now = datetime.datetime.now()
+    start = fill_history(writer_db, args.count, args.samples, now - datetime.timedelta(seconds=1))
+    big_query = {"start_time": format_timestamp(start), "end_time": format_timestamp(now)}
+    print(f"历史数据 {args.count} 个周期 x {args.samples} 点，数据库 {os.path.getsize(db_path) / 1024 / 1024:.0f} MB")
+
+    # Web服务在导入时读取数据库路径，模板和静态文件目录相对于项目根目录
+    os.environ["GIS_PD_DB_PATH"] = db_path
+    os.environ[NOTIFY_ENV] = str(args.notify_port)
+    os.chdir(PROJECT_ROOT)
+    from fastapi.testclient import TestClient
+    from gis_pd_web.main import app
+
+    cycle = [args.count]
+    notifier = ChangeNotifier(args.notify_port)
+    writer = BatchWriter(writer_db, max_delay_ms=args.batch_delay_ms, notifier=notifier)
+    with TestClient(app) as client:
+        print(f"\n{'阶段':<16}{'推送周期':>8}{'中位数(ms)':>12}{'p99(ms)':>12}{'最大(ms)':>12}")
+        summarize("空闲", *run_phase(client, args.duration, writer, cycle, args.samples, args.interval))
+        summarize("大范围查询", *run_phase(client, args.duration, writer, cycle, args.samples, args.interval,
+                                                 big_query))
+    writer.close()
+    notifier.close()
+    writer_db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
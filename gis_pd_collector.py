@@ -0,0 +1,10 @@
+"""GIS局部放电无界面数据采集程序入口（不依赖PySide6，可在无显示环境的变电站主机上运行）
+
+    python gis_pd_collector.py --broker 192.168.16.135 --topic pub1
+"""
+import sys
+
+from gis_pd_core.collector import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""GIS局部放电监测系统公共模块（不依赖Qt，可被GUI、采集程序和Web服务共同导入）
+
+MQTT接收模块依赖paho-mqtt，不在此处导入，使用时请从gis_pd_core.mqtt_ingest导入，
+这样Web服务等只读端无需安装paho-mqtt。
+"""
+from .decoder import decode_payload, payload_to_codes, codes_to_mv, MV_TABLE
+from .codec import encode_cycle, decode_cycle, decode_cycles, encode_raw, decode_raw, CYCLE_CODECS
+from .ring_buffer import RingBuffer, DROP_OLDEST, DROP_NEWEST, BLOCK, OVERFLOW_POLICIES
+from .database import (DatabaseManager, get_application_path, format_timestamp, timestamp_to_us,
+                       us_to_timestamp, TIMESTAMP_FORMAT)
+from .pagination import encode_cursor, decode_cursor, NEWEST_FIRST, OLDEST_FIRST
+from .writer import BatchWriter
+from .notify import ChangeNotifier
+from .partitions import PartitionedStore
+from .export import CycleExport
+from .cycle_log import CycleLogStore
+from .storage import open_storage
+from .query import CycleQuery, CycleBatch, CycleCache
+from .frames import encode_frame, decode_frame
+from .charts import prpd_histogram, PrpdHistogram, prps_matrix, CycleDownsampler
+
+__all__ = [
+    "decode_payload",
+    "payload_to_codes",
+    "codes_to_mv",
+    "MV_TABLE",
+    "encode_cycle",
+    "decode_cycle",
+    "decode_cycles",
+    "CYCLE_CODECS",
+    "encode_raw",
+    "decode_raw",
+    "RingBuffer",
+    "DROP_OLDEST",
+    "DROP_NEWEST",
+    "BLOCK",
+    "OVERFLOW_POLICIES",
+    "DatabaseManager",
+    "get_application_path",
+    "format_timestamp",
+    "timestamp_to_us",
+    "us_to_timestamp",
+    "TIMESTAMP_FORMAT",
+    "encode_cursor",
+    "decode_cursor",
+    "NEWEST_FIRST",
+    "OLDEST_FIRST",
+    "BatchWriter",
+    "ChangeNotifier",
+    "PartitionedStore",
+    "CycleExport",
+    "CycleLogStore",
+    "open_storage",
+    "CycleQuery",
+    "CycleBatch",
+    "CycleCache",
+    "encode_frame",
+    "decode_frame",
+    "prpd_histogram",
+    "PrpdHistogram",
+    "prps_matrix",
+    "CycleDownsampler",
+]
+
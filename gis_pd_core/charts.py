@@ -0,0 +1,419 @@
+"""PRPD/PRPS图表数据的服务端计算
+
+GUI和Web前端不再逐点处理周期数据，只渲染本模块计算好的固定大小的数组：
+
+- PRPD：相位区间 x 幅值区间的采样点计数矩阵（密度图），大小与覆盖的周期数无关。
+  prpd_histogram一次计算一批周期；PrpdHistogram维护最新N个周期的滑动窗口，
+  新周期到达时只计算新周期，移出窗口的周期按保存的单元序号减去计数，不重新计算整个窗口。
+- PRPS：周期 x 相位的幅值矩阵。prps_matrix把每个周期重采样到指定的相位点数，
+  周期数超过上限时把相邻的周期合并为一行（取最大值包络，放电脉冲不会因抽取而消失）。
+- 周期数据降采样：CycleDownsampler把时间范围内的周期按时间段分块流式合并，限制返回的周期数和每周期点数，
+  可按最大值包络合并同一时间段的周期（envelope），或用LTTB按每周期的峰值序列选出代表性的周期（lttb）。
+
+相位与rollups模块相同，按采样点在周期内的相对位置划分（第j个点的相位为 j * 360 / 点数），
+与周期的采样点数无关。采样点数相同的周期组成二维数组一起计算。
+"""
+from collections import deque
+
+import numpy as np
+
+from .decoder import ADC_REFERENCE
+from .query import CycleBatch
+
+# PRPD默认的相位区间数（每个区间5度）和幅值区间数
+PRPD_PHASE_BINS = 72
+PRPD_AMPLITUDE_BINS = 64
+# PRPD默认的幅值范围（毫伏）：12位ADC的满量程；超出范围的采样点计入两端的区间
+PRPD_AMPLITUDE_RANGE = (0.0, ADC_REFERENCE)
+# 相位区间数和幅值区间数的上限（计数矩阵最多约100万个单元）
+MAX_PHASE_BINS = 1440
+MAX_AMPLITUDE_BINS = 1024
+# PRPS矩阵的相位点数和行数上限
+MAX_PRPS_POINTS = 4096
+MAX_PRPS_ROWS = 5000
+# 周期数据降采样方式：相邻周期合并为最大值包络，或按峰值序列用LTTB选取周期（不合并）
+DOWNSAMPLE_ENVELOPE = "envelope"
+DOWNSAMPLE_LTTB = "lttb"
+DOWNSAMPLE_MODES = (DOWNSAMPLE_ENVELOPE, DOWNSAMPLE_LTTB)
+
+
+def _length_groups(cycles):
+    """按采样点数分组：点数 -> (周期序号数组, (周期数, 点数) 的float64矩阵)"""
+    groups = {}
+    for i, data in enumerate(cycles):
+        values = np.asarray(data, dtype=np.float64)
+        groups.setdefault(values.size, []).append((i, values))
+    return {
+        n: (np.array([i for i, _ in members]), np.vstack([values for _, values in members]))
+        for n, members in groups.items() if n
+    }
+
+
+def _cell_matrix(matrix, phase_bins, amplitude_bins, amplitude_range):
+    """(周期数, 点数) 的采样点矩阵 -> (单元序号矩阵, 非NaN掩码)"""
+    low, high = amplitude_range
+    n = matrix.shape[1]
+    phase_index = (np.arange(n) * phase_bins) // n
+    amplitude_index = np.floor((matrix - low) * (amplitude_bins / (high - low)))
+    valid = ~np.isnan(amplitude_index)
+    cells = phase_index * amplitude_bins + np.clip(np.nan_to_num(amplitude_index), 0, amplitude_bins - 1)
+    return cells.astype(np.int32), valid
+
+
+def check_prpd_args(phase_bins, amplitude_bins, amplitude_range):
+    """检查PRPD参数，返回 (phase_bins, amplitude_bins, (幅值下限, 幅值上限))，参数无效时抛出ValueError"""
+    phase_bins, amplitude_bins = int(phase_bins), int(amplitude_bins)
+    if not 1 <= phase_bins <= MAX_PHASE_BINS:
+        raise ValueError(f"相位区间数应在1到{MAX_PHASE_BINS}之间: {phase_bins}")
+    if not 1 <= amplitude_bins <= MAX_AMPLITUDE_BINS:
+        raise ValueError(f"幅值区间数应在1到{MAX_AMPLITUDE_BINS}之间: {amplitude_bins}")
+    low, high = (float(v) for v in amplitude_range)
+    if not low < high:
+        raise ValueError(f"幅值范围无效: {low} - {high}")
+    return phase_bins, amplitude_bins, (low, high)
+
+
+def prpd_cells(cycles, phase_bins=PRPD_PHASE_BINS, amplitude_bins=PRPD_AMPLITUDE_BINS,
+               amplitude_range=PRPD_AMPLITUDE_RANGE):
+    """计算每个采样点所在的PRPD单元序号（相位区间 * amplitude_bins + 幅值区间）
+
+    Args:
+        cycles: 周期数据列表，各周期的采样点数可以不同
+
+    Returns:
+        与cycles顺序一致的int32数组列表，NaN采样点不计入
+    """
+    result = [np.empty(0, dtype=np.int32)] * len(cycles)
+    for rows, matrix in _length_groups(cycles).values():
+        cells, valid = _cell_matrix(matrix, phase_bins, amplitude_bins, amplitude_range)
+        for row, row_cells, row_valid in zip(rows, cells, valid):
+            result[row] = row_cells if row_valid.all() else row_cells[row_valid]
+    return result
+
+
+def prpd_histogram(cycles, phase_bins=PRPD_PHASE_BINS, amplitude_bins=PRPD_AMPLITUDE_BINS,
+                   amplitude_range=PRPD_AMPLITUDE_RANGE):
+    """一批周期的PRPD计数矩阵
+
+    Args:
+        cycles: 周期数据列表（如CycleBatch.values），各周期的采样点数可以不同
+        amplitude_range: (幅值下限, 幅值上限)，超出范围的采样点计入两端的区间
+
+    Returns:
+        (phase_bins, amplitude_bins) 的int64计数矩阵
+    """
+    size = phase_bins * amplitude_bins
+    counts = np.zeros(size, dtype=np.int64)
+    for _, matrix in _length_groups(cycles).values():
+        cells, valid = _cell_matrix(matrix, phase_bins, amplitude_bins, amplitude_range)
+        counts += np.bincount(cells[valid], minlength=size)
+    return counts.reshape(phase_bins, amplitude_bins)
+
+
+def prpd_edges(phase_bins=PRPD_PHASE_BINS, amplitude_bins=PRPD_AMPLITUDE_BINS,
+               amplitude_range=PRPD_AMPLITUDE_RANGE):
+    """相位区间边界（度）和幅值区间边界，分别有phase_bins + 1和amplitude_bins + 1个值"""
+    return np.linspace(0, 360, phase_bins + 1), np.linspace(*amplitude_range, amplitude_bins + 1)
+
+
+class PrpdHistogram:
+    """最新window个周期的PRPD计数矩阵（增量更新）
+
+    保存窗口内每个周期的单元序号，周期移出窗口时减去其计数。
+    方法本身不加锁，多个线程更新同一个实例时由调用方加锁。
+    """
+    def __init__(self, window, phase_bins=PRPD_PHASE_BINS, amplitude_bins=PRPD_AMPLITUDE_BINS,
+                 amplitude_range=PRPD_AMPLITUDE_RANGE):
+        self.window = max(1, int(window))
+        self.phase_bins, self.amplitude_bins, self.amplitude_range = check_prpd_args(
+            phase_bins, amplitude_bins, amplitude_range)
+        self.size = self.phase_bins * self.amplitude_bins
+        self._counts = np.zeros(self.size, dtype=np.int64)
+        self._cycles = deque()
+        # 已计入的最大周期id（调用方据此只读取更新的周期）
+        self.last_id = 0
+
+    def __len__(self):
+        return len(self._cycles)
+
+    @property
+    def counts(self):
+        """(phase_bins, amplitude_bins) 的计数矩阵（副本）"""
+        return self._counts.reshape(self.phase_bins, self.amplitude_bins).copy()
+
+    @property
+    def point_count(self):
+        return int(self._counts.sum())
+
+    def add(self, cycles, ids=None):
+        """按写入顺序（id升序）加入新周期，超出窗口的最早加入的周期移出
+
+        Args:
+            cycles: 周期数据列表
+            ids: 周期id，用于更新last_id
+        """
+        # 只有最后window个周期会留在窗口中
+        cycles = list(cycles)[-self.window:]
+        cells = prpd_cells(cycles, self.phase_bins, self.amplitude_bins, self.amplitude_range)
+        if cells:
+            self._counts += np.bincount(np.concatenate(cells), minlength=self.size)
+            self._cycles.extend(cells)
+        removed = []
+        while len(self._cycles) > self.window:
+            removed.append(self._cycles.popleft())
+        if removed:
+            self._counts -= np.bincount(np.concatenate(removed), minlength=self.size)
+        if ids is not None and len(ids):
+            self.last_id = max(self.last_id, int(max(ids)))
+
+    def clear(self):
+        self._counts[:] = 0
+        self._cycles.clear()
+        self.last_id = 0
+
+
+def resample_phase(matrix, points):
+    """将 (周期数, n) 的矩阵重采样为 (周期数, points)
+
+    points不小于n时按相位线性插值（与np.interp相同，最后一个采样点之后取最后一个值）；
+    points小于n时取每个相位区间内的最大值，窄脉冲不会被插值丢掉。
+    """
+    n = matrix.shape[1]
+    if points == n:
+        return matrix
+    if points < n:
+        # 每个区间至少有一个采样点，可以使用reduceat
+        starts = np.searchsorted((np.arange(n) * points) // n, np.arange(points))
+        return np.maximum.reduceat(matrix, starts, axis=1)
+    position = np.arange(points) * (n / points)
+    left = np.floor(position).astype(np.intp)
+    right = np.minimum(left + 1, n - 1)
+    weight = position - left
+    return matrix[:, left] * (1 - weight) + matrix[:, right] * weight
+
+
+def prps_matrix(cycles, points=None, max_rows=None):
+    """PRPS矩阵：每个周期重采样到points个相位点，周期数超过max_rows时按最大值包络抽取
+
+    Args:
+        cycles: 周期数据列表（按时间顺序），各周期的采样点数可以不同
+        points: 相位点数，None表示使用最长周期的点数
+        max_rows: 行数上限，None表示不抽取
+
+    Returns:
+        (matrix, starts)：(行数, points) 的float64矩阵；starts为每行第一个周期在cycles中的序号，
+        第i行由 cycles[starts[i]:starts[i + 1]] 合并而成
+    """
+    count = len(cycles)
+    if points is None:
+        points = max((len(data) for data in cycles), default=0)
+    matrix = np.zeros((count, points))
+    if points:
+        for rows, values in _length_groups(cycles).values():
+            matrix[rows] = resample_phase(values, points)
+    starts = np.arange(count)
+    if max_rows is not None and count > max_rows:
+        # 相邻的周期均匀分成max_rows组，每组取各相位的最大值（fmax忽略NaN）
+        starts = np.searchsorted((np.arange(count) * max_rows) // count, np.arange(max_rows))
+        matrix = np.fmax.reduceat(matrix, starts, axis=0)
+    return matrix, starts
+
+
+def lttb_indices(y, n, x=None):
+    """Largest-Triangle-Three-Buckets降采样：从序列中选出n个点的序号（升序）
+
+    首尾点总是保留，中间的点均匀分成n - 2个桶，每个桶选出与前一个选中点、下一个桶的均值点
+    组成的三角形面积最大的点，峰值和谷值都会被保留。x默认为序号。
+    """
+    y = np.asarray(y, dtype=np.float64)
+    count = len(y)
+    if n >= count:
+        return np.arange(count)
+    if n <= 2:
+        return np.array([0, count - 1][:max(n, 0)], dtype=np.intp)
+    x = np.arange(count, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    # n - 1个边界把 [1, count - 1) 分成n - 2个非空的桶
+    edges = np.linspace(1, count - 1, n - 1).astype(np.intp)
+    selected = np.empty(n, dtype=np.intp)
+    selected[0], selected[-1] = 0, count - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i == n - 3:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_hi = edges[i + 2]
+            next_x, next_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+class _BucketRows:
+    """每个时间段保存一行：相位点数组和代表该行的周期的id、时间、编号"""
+    def __init__(self, buckets, points):
+        self.values = np.full((buckets, points), np.nan)
+        self.ids = np.full(buckets, -1, dtype=np.int64)
+        self.time_us = np.zeros(buckets, dtype=np.int64)
+        self.cycle_numbers = np.zeros(buckets, dtype=np.int64)
+        self.timestamps = np.empty(buckets, dtype=object)
+
+    def set(self, buckets, rows, batch, time_us):
+        """把batch中第rows个周期的id、时间和编号记为buckets时间段的代表周期"""
+        self.ids[buckets] = batch.ids[rows]
+        self.time_us[buckets] = time_us[rows]
+        self.cycle_numbers[buckets] = batch.cycle_numbers[rows]
+        self.timestamps[buckets] = [batch.timestamps[i] for i in rows]
+
+
+class _ChannelBuckets:
+    """一个通道的时间段划分和各时间段的降采样状态"""
+    def __init__(self, start_us, end_us, buckets, points, mode):
+        self.start_us = int(start_us)
+        self.span = max(1, int(end_us) - self.start_us + 1)
+        self.buckets = max(1, int(buckets))
+        self.counts = np.zeros(self.buckets, dtype=np.int64)
+        if mode == DOWNSAMPLE_LTTB:
+            # 每个时间段峰值最大和最小的周期作为LTTB的候选
+            self.high, self.low = _BucketRows(self.buckets, points), _BucketRows(self.buckets, points)
+            self.high_peak = np.full(self.buckets, -np.inf)
+            self.low_peak = np.full(self.buckets, np.inf)
+        else:
+            self.rows = _BucketRows(self.buckets, points)
+
+    def bucket_of(self, time_us):
+        # 按浮点数计算，时间跨度很长、时间段很多时整数乘积不会溢出
+        bucket = ((time_us - self.start_us) * (self.buckets / self.span)).astype(np.int64)
+        return np.clip(bucket, 0, self.buckets - 1)
+
+
+class CycleDownsampler:
+    """分块流式降采样时间范围内的周期，内存只与时间段数和点数有关，与读取的周期数无关
+
+    时间范围按通道划分为若干等长的时间段，按时间顺序分块加入周期（add），每块处理完即可释放：
+    - envelope：同一时间段的周期合并为一行，取各相位的最大值（fmax忽略NaN），
+      行的id、时间和周期编号为该时间段第一个周期的值
+    - lttb：每个时间段保留峰值最大和最小的周期作为候选，result()时对候选的峰值序列用LTTB
+      选出与时间段数相同的周期，返回原周期（不合并）
+    每个周期先重采样为points个相位点（见resample_phase，点数减少时取区间最大值）。
+    """
+    def __init__(self, layout, points, mode=DOWNSAMPLE_ENVELOPE, default=None):
+        """
+        Args:
+            layout: {通道ID: (start_us, end_us, buckets)}，各通道的时间范围（epoch微秒）和时间段数，
+                时间段数为0的通道被忽略
+            points: 每个周期的相位点数
+            mode: DOWNSAMPLE_ENVELOPE 或 DOWNSAMPLE_LTTB
+            default: 不在layout中的通道使用的 (start_us, end_us, buckets)，None表示忽略这些通道
+        """
+        if mode not in DOWNSAMPLE_MODES:
+            raise ValueError(f"不支持的降采样方式: {mode}")
+        self.layout = dict(layout)
+        self.default = default
+        self.points = max(1, int(points))
+        self.mode = mode
+        self.channels = {}
+        # 已加入的周期数和其中最长周期的点数
+        self.rows_read = 0
+        self.longest = 0
+
+    def _channel(self, channel):
+        state = self.channels.get(channel)
+        if state is None:
+            spec = self.layout.get(channel, self.default)
+            if spec is None or spec[2] < 1:
+                return None
+            state = self.channels[channel] = _ChannelBuckets(*spec, self.points, self.mode)
+        return state
+
+    def add(self, batch, time_us):
+        """加入一块周期（query.CycleBatch，按时间顺序）
+
+        Args:
+            batch: 一块周期数据
+            time_us: 各周期的时间（epoch微秒）
+        """
+        time_us = np.asarray(time_us, dtype=np.int64)
+        self.rows_read += len(batch)
+        self.longest = max(self.longest, max((len(values) for values in batch.values), default=0))
+        groups = {}
+        for i, channel in enumerate(batch.channels):
+            groups.setdefault(channel, []).append(i)
+        for channel, members in groups.items():
+            state = self._channel(channel)
+            if state is None:
+                continue
+            members = np.array(members, dtype=np.intp)
+            bucket = state.bucket_of(time_us[members])
+            order = np.argsort(bucket, kind="stable")
+            members, bucket = members[order], bucket[order]
+            matrix, _ = prps_matrix([batch.values[i] for i in members], self.points)
+            # 每个时间段在本块中的第一行
+            starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+            runs = bucket[starts]
+            if self.mode == DOWNSAMPLE_LTTB:
+                self._add_candidates(state, batch, time_us, members, bucket, starts, runs, matrix)
+            else:
+                first = state.counts[runs] == 0
+                state.rows.set(runs[first], members[starts[first]], batch, time_us)
+                state.rows.values[runs] = np.fmax(state.rows.values[runs], np.fmax.reduceat(matrix, starts, axis=0))
+            state.counts[runs] += np.diff(np.append(starts, len(members)))
+
+    @staticmethod
+    def _add_candidates(state, batch, time_us, members, bucket, starts, runs, matrix):
+        """用本块中各时间段峰值最大和最小的周期更新候选"""
+        # 没有有效采样点的周期峰值按0计
+        peaks = np.nan_to_num(np.fmax.reduce(matrix, axis=1))
+        for rows, peak, sign, better in ((state.high, state.high_peak, -1, np.greater),
+                                         (state.low, state.low_peak, 1, np.less)):
+            # 按时间段排序、同一时间段内按峰值排序，每段的第一行即为峰值最大（最小）的周期
+            chosen = np.lexsort((sign * peaks, bucket))[starts]
+            replace = better(peaks[chosen], peak[runs])
+            targets, chosen = runs[replace], chosen[replace]
+            rows.set(targets, members[chosen], batch, time_us)
+            rows.values[targets] = matrix[chosen]
+            peak[targets] = peaks[chosen]
+
+    def result(self):
+        """降采样结果
+
+        Returns:
+            (CycleBatch, cycles_per_row)：按时间顺序排列；cycles_per_row为每行代表的原周期数（int64数组，
+            lttb为1）
+        """
+        parts = []
+        for channel, state in self.channels.items():
+            if self.mode == DOWNSAMPLE_LTTB:
+                parts.append(self._lttb_rows(channel, state))
+            else:
+                keep = np.flatnonzero(state.counts)
+                rows = state.rows
+                parts.append((rows.ids[keep], rows.time_us[keep], rows.cycle_numbers[keep], rows.timestamps[keep],
+                              [channel] * len(keep), rows.values[keep], state.counts[keep]))
+        if not parts:
+            return CycleBatch(np.empty(0, dtype=np.int64), [], np.empty(0, dtype=np.int64), [], []), \
+                np.empty(0, dtype=np.int64)
+        ids, times, cycle_numbers, timestamps, channels, values, sizes = (
+            np.concatenate([part[i] for part in parts]) for i in range(7))
+        order = np.lexsort((ids, times))
+        batch = CycleBatch(ids[order], timestamps[order].tolist(), cycle_numbers[order],
+                           channels[order].tolist(), list(values[order]))
+        return batch, sizes[order]
+
+    @staticmethod
+    def _lttb_rows(channel, state):
+        """一个通道的候选周期按时间排序后用LTTB选出state.buckets个"""
+        fields = []
+        for rows, peak in ((state.high, state.high_peak), (state.low, state.low_peak)):
+            keep = np.flatnonzero(rows.ids >= 0)
+            fields.append((rows.ids[keep], rows.time_us[keep], rows.cycle_numbers[keep], rows.timestamps[keep],
+                           rows.values[keep], peak[keep]))
+        ids, times, cycle_numbers, timestamps, values, peaks = (
+            np.concatenate([field[i] for field in fields]) for i in range(6))
+        # 峰值最大和最小的是同一个周期时只保留一个
+        _, unique = np.unique(ids, return_index=True)
+        unique = unique[np.lexsort((ids[unique], times[unique]))]
+        selected = unique[lttb_indices(peaks[unique], state.buckets, times[unique])]
+        return (ids[selected], times[selected], cycle_numbers[selected], timestamps[selected],
+                [channel] * len(selected), values[selected], np.ones(len(selected), dtype=np.int64))
@@ -0,0 +1,318 @@
+"""周期数据的二进制编码
+
+cycle_data.data 列保存带版本号的二进制数据，格式为4字节头部加数据块：
+
+    字节0-1: 魔数 b"PD"
+    字节2:   格式版本（当前为1）
+    字节3:   编码方式，位0-1为数据类型 CODES_U16 / VALUES_F64，
+             位2-3为差分方式 FILTER_*，位4-5为压缩方式 COMPRESS_*
+    之后:    小端序数据块
+
+解码器得到的毫伏值都来自MV_TABLE查表，因此编码时先尝试把每个值反查回
+12位ADC码值，全部命中时按uint16保存（每点2字节，解码结果与原值完全一致）；
+否则按float64保存（无损）。旧版本以逗号分隔的文本保存的数据仍可读取。
+
+局部放电周期数据大部分是底噪，只有少量脉冲，可以选择压缩编码（CYCLE_CODECS）：
+先对整数数据做差分（delta，相邻点之差再经zigzag映射为小的无符号数）或异或（xor），
+再按字节拆分为低字节和高字节两个平面（高字节几乎全为0），最后用zlib或lzma压缩。
+编码方式保存在每条数据的头部，同一数据库中可以混合存在，按数据库设置选择新数据的编码方式
+（见schema.get_setting）。decode_cycles批量解码时按编码方式和长度分组，差分还原和查表都是矩阵运算。
+
+raw_data.raw_data 列保存原始负载字节（可选zlib压缩），同样带有版本号头部，
+旧版本以十六进制文本保存的数据仍可读取。
+"""
+import lzma
+import struct
+import zlib
+
+import numpy as np
+
+from .decoder import MV_TABLE
+
+CYCLE_MAGIC = b"PD"
+CYCLE_FORMAT_VERSION = 1
+HEADER = struct.Struct("<2sBB")
+
+# 数据类型
+CODES_U16 = 0    # ADC码值，解码时通过MV_TABLE查表得到毫伏值
+VALUES_F64 = 1   # 直接保存的float64值
+
+_DTYPES = {
+    CODES_U16: np.dtype("<u2"),
+    VALUES_F64: np.dtype("<f8"),
+}
+
+# 差分方式（作用于数据的整数表示）
+FILTER_NONE = 0
+FILTER_DELTA = 1
+FILTER_XOR = 2
+
+# 压缩方式（压缩前按字节拆分为字节平面）
+COMPRESS_NONE = 0
+COMPRESS_ZLIB = 1
+COMPRESS_LZMA = 2
+
+# 周期数据编码方式名称 -> (差分方式, 压缩方式)
+CYCLE_CODECS = {
+    "none": (FILTER_NONE, COMPRESS_NONE),
+    "zlib": (FILTER_NONE, COMPRESS_ZLIB),
+    "lzma": (FILTER_NONE, COMPRESS_LZMA),
+    "delta-zlib": (FILTER_DELTA, COMPRESS_ZLIB),
+    "delta-lzma": (FILTER_DELTA, COMPRESS_LZMA),
+    "xor-zlib": (FILTER_XOR, COMPRESS_ZLIB),
+    "xor-lzma": (FILTER_XOR, COMPRESS_LZMA),
+}
+DEFAULT_CYCLE_CODEC = "none"
+
+# 与数据位宽相同的无符号/有符号整数类型（差分在整数表示上进行）
+_UNSIGNED = {2: np.dtype("<u2"), 8: np.dtype("<u8")}
+_SIGNED = {2: np.dtype("<i2"), 8: np.dtype("<i8")}
+
+# 毫伏值 * 100（取整）-> 对应的最小码值，用于把毫伏值直接索引回码值（不做二分查找）。
+# MV_TABLE中的值都是两位小数，同一毫伏值对应多个码值时取最小的一个，与原searchsorted结果一致
+_MV_SCALE = 100
+_MV_TO_CODE = np.full(int(np.rint(MV_TABLE[-1] * _MV_SCALE)) + 1, MV_TABLE.size - 1, dtype=np.uint16)
+np.minimum.at(_MV_TO_CODE, np.rint(MV_TABLE * _MV_SCALE).astype(np.intp), np.arange(MV_TABLE.size, dtype=np.uint16))
+_MV_TO_CODE.setflags(write=False)
+
+ZLIB_LEVEL = 6
+# lzma使用不带文件头的原始LZMA2流，每条数据可节省约60字节
+_LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6}]
+
+
+def _kind_byte(dtype_kind, filter_id, compression):
+    return dtype_kind | (filter_id << 2) | (compression << 4)
+
+
+def _split_kind(kind):
+    """将编码方式字节拆分为 (数据类型, 差分方式, 压缩方式)"""
+    return kind & 0x3, (kind >> 2) & 0x3, (kind >> 4) & 0x3
+
+
+def _apply_filter(block, filter_id):
+    """对一维整数数据做差分（结果为同位宽的无符号整数）"""
+    unsigned = _UNSIGNED[block.dtype.itemsize]
+    ints = block.view(unsigned)
+    if filter_id == FILTER_XOR:
+        out = ints.copy()
+        out[1:] ^= ints[:-1]
+        return out
+    # delta：相邻点之差，再用zigzag把小的负数映射为小的正数（-1 -> 1, 1 -> 2）
+    signed = ints.view(_SIGNED[block.dtype.itemsize])
+    diff = signed.copy()
+    diff[1:] -= signed[:-1]
+    bits = block.dtype.itemsize * 8
+    return ((diff << 1) ^ (diff >> (bits - 1))).view(unsigned)
+
+
+def _undo_filter(matrix, filter_id):
+    """按行还原差分（matrix形状为 (周期数, 点数)，每行为一个周期）"""
+    if filter_id == FILTER_XOR:
+        return np.bitwise_xor.accumulate(matrix, axis=1)
+    signed = _SIGNED[matrix.dtype.itemsize]
+    diff = ((matrix >> 1) ^ (0 - (matrix & 1)).astype(matrix.dtype)).view(signed)
+    return np.cumsum(diff, axis=1, dtype=signed)
+
+
+def _compress(data, compression):
+    if compression == COMPRESS_ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    return lzma.compress(data, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+
+
+def _decompress(data, compression):
+    if compression == COMPRESS_ZLIB:
+        return zlib.decompress(data)
+    return lzma.decompress(data, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+
+
+def values_to_codes(values):
+    """将毫伏值反查为ADC码值，存在无法精确还原的值时返回None"""
+    values = np.asarray(values, dtype=np.float64)
+    if not values.size:
+        return np.zeros(0, dtype=np.uint16)
+    scaled = np.rint(values * _MV_SCALE)
+    # 负数、超出范围或NaN都无法还原（NaN的比较结果为False）
+    if not (scaled.min() >= 0 and scaled.max() < _MV_TO_CODE.size):
+        return None
+    codes = _MV_TO_CODE[scaled.astype(np.intp)]
+    if not np.array_equal(MV_TABLE[codes], values):
+        return None
+    return codes
+
+
+def encode_cycle(data, codec=DEFAULT_CYCLE_CODEC):
+    """将一个周期的数据编码为二进制（bytes）
+
+    Args:
+        data: 周期数据（毫伏值数组或列表，接收路径上直接传入解码得到的数组）
+        codec: 编码方式，CYCLE_CODECS中的名称
+    """
+    if codec not in CYCLE_CODECS:
+        raise ValueError(f"不支持的周期数据编码方式: {codec}")
+    filter_id, compression = CYCLE_CODECS[codec]
+    values = np.asarray(data, dtype=np.float64)
+    codes = values_to_codes(values)
+    if codes is not None:
+        dtype_kind, block = CODES_U16, codes.astype("<u2")
+    else:
+        dtype_kind, block = VALUES_F64, values.astype("<f8")
+    if compression == COMPRESS_NONE:
+        filter_id = FILTER_NONE
+        body = block.tobytes()
+    else:
+        if filter_id != FILTER_NONE:
+            block = _apply_filter(block, filter_id)
+        # 拆分为字节平面：先是所有点的第0字节，然后是第1字节……
+        planes = block.view(np.uint8).reshape(-1, block.dtype.itemsize).T
+        body = _compress(planes.tobytes(), compression)
+    kind = _kind_byte(dtype_kind, filter_id, compression)
+    return HEADER.pack(CYCLE_MAGIC, CYCLE_FORMAT_VERSION, kind) + body
+
+
+def is_encoded(blob):
+    """判断数据是否为二进制格式（否则为旧版本的逗号分隔文本）"""
+    return isinstance(blob, (bytes, bytearray, memoryview)) and bytes(blob[:2]) == CYCLE_MAGIC
+
+
+def cycle_codec_of(blob):
+    """获取二进制周期数据的编码方式名称，旧版本文本或无法识别时返回None"""
+    if not is_encoded(blob):
+        return None
+    _, filter_id, compression = _split_kind(blob[3])
+    for name, value in CYCLE_CODECS.items():
+        if value == (filter_id, compression):
+            return name
+    return None
+
+
+def _decode_legacy(blob):
+    """解码旧格式：逗号分隔的文本"""
+    if isinstance(blob, (bytes, bytearray, memoryview)):
+        blob = bytes(blob).decode("ascii")
+    if not blob:
+        return np.empty(0, dtype=np.float64)
+    return np.array(blob.split(','), dtype=np.float64)
+
+
+def _unpack_cycle(blob):
+    """解析头部并解压，返回 (数据类型, 差分方式, 是否按字节平面保存, 数据块bytes)"""
+    _, version, kind = HEADER.unpack_from(blob)
+    dtype_kind, filter_id, compression = _split_kind(kind)
+    if (version != CYCLE_FORMAT_VERSION or dtype_kind not in _DTYPES or kind >> 6
+            or filter_id > FILTER_XOR or compression > COMPRESS_LZMA):
+        raise ValueError(f"不支持的周期数据格式: 版本 {version}, 类型 {kind}")
+    body = memoryview(blob)[HEADER.size:]
+    if compression != COMPRESS_NONE:
+        return dtype_kind, filter_id, True, _decompress(body, compression)
+    return dtype_kind, filter_id, False, body
+
+
+def _decode_matrix(dtype_kind, filter_id, planar, data, rows):
+    """将rows个等长周期的数据块解码为 (rows, 点数) 的float64矩阵"""
+    dtype = _DTYPES[dtype_kind]
+    if planar:
+        # 字节平面还原为按点排列
+        planes = np.frombuffer(data, dtype=np.uint8).reshape(rows, dtype.itemsize, -1)
+        matrix = np.ascontiguousarray(planes.transpose(0, 2, 1)).view(_UNSIGNED[dtype.itemsize])
+        matrix = matrix.reshape(rows, -1)
+    else:
+        matrix = np.frombuffer(data, dtype=_UNSIGNED[dtype.itemsize]).reshape(rows, -1)
+    if filter_id != FILTER_NONE:
+        matrix = _undo_filter(matrix, filter_id)
+    matrix = matrix.view(dtype)
+    if dtype_kind == CODES_U16:
+        return MV_TABLE[matrix]
+    return matrix.astype(np.float64)
+
+
+def decode_cycle(blob):
+    """将数据库中的周期数据解码为float64数组，兼容旧版本的逗号分隔文本
+
+    周期日志存储（cycle_log）的查询结果已经是数组，原样返回（float64时不复制）。
+    """
+    if blob is None:
+        return np.empty(0, dtype=np.float64)
+    if isinstance(blob, np.ndarray):
+        return blob.astype(np.float64, copy=False)
+    if not is_encoded(blob):
+        return _decode_legacy(blob)
+    dtype_kind, filter_id, planar, data = _unpack_cycle(blob)
+    return _decode_matrix(dtype_kind, filter_id, planar, data, 1)[0]
+
+
+def decode_cycles(blobs):
+    """批量解码周期数据，返回与blobs顺序一致的float64数组列表
+
+    编码方式和长度相同的周期合并为一个矩阵，差分还原和查表各只执行一次。
+    """
+    result = [None] * len(blobs)
+    groups = {}
+    for i, blob in enumerate(blobs):
+        if blob is None:
+            result[i] = np.empty(0, dtype=np.float64)
+        elif isinstance(blob, np.ndarray):
+            result[i] = blob.astype(np.float64, copy=False)
+        elif not is_encoded(blob):
+            result[i] = _decode_legacy(blob)
+        else:
+            dtype_kind, filter_id, planar, data = _unpack_cycle(blob)
+            key = (dtype_kind, filter_id, planar, len(data))
+            groups.setdefault(key, ([], []))
+            groups[key][0].append(i)
+            groups[key][1].append(data)
+    for (dtype_kind, filter_id, planar, _), (indexes, chunks) in groups.items():
+        matrix = _decode_matrix(dtype_kind, filter_id, planar, b"".join(chunks), len(chunks))
+        for i, row in zip(indexes, matrix):
+            result[i] = row
+    return result
+
+
+# 原始数据的二进制格式：4字节头部（魔数 b"PR"、格式版本、压缩方式）后接原始负载
+RAW_MAGIC = b"PR"
+RAW_FORMAT_VERSION = 1
+
+# 原始数据压缩方式
+RAW_UNCOMPRESSED = 0
+RAW_ZLIB = 1
+RAW_COMPRESSIONS = {
+    None: RAW_UNCOMPRESSED,
+    "zlib": RAW_ZLIB,
+}
+
+
+def encode_raw(payload, compression=None):
+    """将原始负载编码为带版本号的二进制，兼容传入旧版本的十六进制字符串
+
+    Args:
+        payload: 原始负载（bytes）或十六进制字符串
+        compression: None（不压缩）或 "zlib"
+    """
+    if isinstance(payload, str):
+        payload = bytes.fromhex(payload)
+    if compression not in RAW_COMPRESSIONS:
+        raise ValueError(f"不支持的压缩方式: {compression}")
+    method = RAW_COMPRESSIONS[compression]
+    if method == RAW_ZLIB:
+        payload = zlib.compress(payload)
+    return HEADER.pack(RAW_MAGIC, RAW_FORMAT_VERSION, method) + bytes(payload)
+
+
+def decode_raw(blob):
+    """将数据库中的原始数据解码为原始负载（bytes），兼容旧版本的十六进制文本"""
+    if blob is None:
+        return b""
+    if isinstance(blob, str):
+        # 旧格式：十六进制文本
+        return bytes.fromhex(blob)
+    blob = bytes(blob)
+    if blob[:2] != RAW_MAGIC:
+        return bytes.fromhex(blob.decode("ascii"))
+
+    _, version, method = HEADER.unpack_from(blob)
+    if version != RAW_FORMAT_VERSION or method not in RAW_COMPRESSIONS.values():
+        raise ValueError(f"不支持的原始数据格式: 版本 {version}, 压缩方式 {method}")
+    payload = blob[HEADER.size:]
+    if method == RAW_ZLIB:
+        return zlib.decompress(payload)
+    return payload
@@ -0,0 +1,198 @@
+"""无界面数据采集程序（不依赖PySide6）
+
+订阅配置的MQTT主题（可多个，支持通配符），每个主题映射到一个通道，
+解码后按固定间隔取出并交给写库线程分组提交，数据标记通道ID。断线后由paho网络循环自动重连，
+重连成功后重新订阅。GUI和Web服务只需读取数据库即可。
+
+用法：
+    python gis_pd_collector.py --broker 192.168.16.135 --topic pub1
+    python gis_pd_collector.py --topic "gis/bay1/+" --channel-map gis/bay1/uhf1=B1-UHF1
+    python gis_pd_collector.py --partition day --retention-days 365 --db /data/gis_pd_partitions
+    python gis_pd_collector.py --backend cycle-log --db /data/gis_pd_cycle_log
+"""
+import argparse
+import signal
+import threading
+import time
+
+from .codec import CYCLE_CODECS
+from .database import format_timestamp
+from .partitions import PERIODS
+from .storage import open_storage, BACKENDS, SQLITE
+from .mqtt_ingest import MQTTIngestClient
+from .notify import ChangeNotifier, notify_port
+from .ring_buffer import RingBuffer, OVERFLOW_POLICIES, DROP_OLDEST
+from .writer import BatchWriter, DEFAULT_MAX_BATCH_ROWS, DEFAULT_MAX_DELAY_MS
+
+
+class Collector:
+    """数据采集器：从MQTTIngestClient批量取出周期数据并交给写库线程"""
+    def __init__(self, db_manager, ingest, flush_interval=0.02, save_raw=False, stats_interval=60.0,
+                 writer=None):
+        """初始化采集器
+
+        Args:
+            db_manager: 数据库管理器
+            ingest: MQTT接收客户端
+            flush_interval: 从接收缓冲区取数据的间隔(秒)
+            save_raw: 是否同时保存原始数据
+            stats_interval: 打印统计信息的间隔(秒)，0表示不打印
+            writer: 写库线程，为None时使用默认参数创建
+        """
+        self.db_manager = db_manager
+        self.writer = writer or BatchWriter(db_manager)
+        self.ingest = ingest
+        self.flush_interval = flush_interval
+        self.save_raw = save_raw
+        self.stats_interval = stats_interval
+
+        # 每个通道独立的周期编号
+        self.cycle_numbers = {}
+        self.saved_cycles = 0
+        self.saved_raw = 0
+
+        # 原始数据缓冲区，与周期数据使用相同的容量和溢出策略
+        self.raw_buffer = RingBuffer(ingest.queue_size, ingest.overflow_policy, ingest.block_timeout)
+
+        self.ingest.on_status = self.on_status
+        if self.save_raw:
+            self.ingest.on_raw = self.on_raw
+
+    def on_status(self, connected, message):
+        """连接状态回调函数"""
+        print(f"[{format_timestamp()}] {message}")
+
+    def on_raw(self, broker, topic, payload, timestamp, channel):
+        """原始数据回调函数（在MQTT线程中调用）"""
+        self.raw_buffer.put((format_timestamp(timestamp), broker, topic, payload, channel))
+
+    def flush(self):
+        """将缓冲区中的数据取出并放入写库队列"""
+        batch = self.ingest.drain()
+        if batch:
+            records = []
+            for cycle in batch:
+                if len(cycle.data) == 0:
+                    continue
+                cycle_number = self.cycle_numbers.get(cycle.channel, 0) + 1
+                self.cycle_numbers[cycle.channel] = cycle_number
+                records.append((format_timestamp(cycle.timestamp), cycle_number, cycle.data, cycle.channel))
+            if self.writer.save_cycle_batch(records):
+                self.saved_cycles += len(records)
+
+        raw_batch = self.raw_buffer.drain()
+        if raw_batch and self.writer.save_raw_batch(raw_batch):
+            self.saved_raw += len(raw_batch)
+
+    def print_stats(self):
+        """打印采集统计信息"""
+        stats = self.ingest.get_queue_stats()
+        writer_stats = self.writer.get_stats()
+        print(f"[{format_timestamp()}] 已接收周期数据: {self.saved_cycles}, 原始数据: {self.saved_raw}, "
+              f"通道数: {len(stats['channels'])}, 队列: {stats['depth']}/{stats['capacity']}, "
+              f"丢弃: {stats['dropped_count']}")
+        print(f"[{format_timestamp()}] 写库: 已提交 {writer_stats['rows']} 行/{writer_stats['batches']} 批, "
+              f"待写入: {writer_stats['pending']}, 平均批大小: {writer_stats['avg_batch_size']:.1f}, "
+              f"提交耗时 平均/最大: {writer_stats['avg_commit_ms']:.1f}/{writer_stats['max_commit_ms']:.1f}ms, "
+              f"失败批次: {writer_stats['failed_batches']}")
+
+    def run(self, stop_event):
+        """运行采集循环，直到stop_event被设置"""
+        # 异步连接：Broker暂时不可用时网络循环会持续重试
+        self.ingest.connect(blocking=False)
+        self.ingest.loop_start()
+        last_stats_time = time.monotonic()
+        try:
+            while not stop_event.wait(self.flush_interval):
+                self.flush()
+                if self.stats_interval and time.monotonic() - last_stats_time >= self.stats_interval:
+                    self.print_stats()
+                    last_stats_time = time.monotonic()
+        finally:
+            self.ingest.disconnect()
+            # 写入剩余数据并等待写库线程提交完成
+            self.flush()
+            self.writer.close()
+            self.print_stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GIS局部放电无界面数据采集程序")
+    parser.add_argument("--broker", default="192.168.16.135", help="MQTT Broker地址")
+    parser.add_argument("--port", type=int, default=1883, help="MQTT Broker端口")
+    parser.add_argument("--topic", action="append", dest="topics",
+                        help="订阅的主题，支持+/#通配符，可重复指定多个（默认pub1）")
+    parser.add_argument("--channel-map", action="append", default=[], metavar="TOPIC=CHANNEL",
+                        help="主题到通道ID的映射，可重复指定；未映射的主题以主题名作为通道ID")
+    parser.add_argument("--qos", type=int, default=1, choices=(0, 1, 2), help="订阅的QoS等级")
+    parser.add_argument("--backend", default=SQLITE, choices=BACKENDS,
+                        help="存储后端：sqlite（默认）或 cycle-log（追加写入的周期日志，适合高频采集）")
+    parser.add_argument("--db", default=None,
+                        help="数据库文件路径（默认为程序目录下的gis_pd_data.db）；使用--partition时为分区目录"
+                             "（默认为程序目录下的gis_pd_partitions），使用cycle-log时为日志目录"
+                             "（默认为程序目录下的gis_pd_cycle_log）")
+    parser.add_argument("--partition", default=None, choices=PERIODS, help="按天或按周将数据写入独立的分区文件")
+    parser.add_argument("--retention-days", type=float, default=None,
+                        help="分区数据的保留天数，超过后删除整个分区文件（默认永久保留）")
+    parser.add_argument("--flush-interval", type=float, default=0.02, help="从接收缓冲区取数据的间隔(秒)")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_MAX_BATCH_ROWS, help="写库线程每个事务最多写入的行数")
+    parser.add_argument("--batch-delay-ms", type=float, default=DEFAULT_MAX_DELAY_MS,
+                        help="写库线程攒批的最长等待时间(毫秒)")
+    parser.add_argument("--notify-port", type=int, default=notify_port(),
+                        help="每次提交后向本机该UDP端口发送新数据通知，Web服务收到后立即推送"
+                             "（默认为环境变量GIS_PD_NOTIFY_PORT或47651，0表示不通知）")
+    parser.add_argument("--queue-size", type=int, default=10000, help="每个通道的接收缓冲区容量(周期数)")
+    parser.add_argument("--overflow-policy", default=DROP_OLDEST, choices=OVERFLOW_POLICIES,
+                        help="接收缓冲区满时的策略")
+    parser.add_argument("--save-raw", action="store_true", help="同时保存原始数据")
+    parser.add_argument("--raw-compression", default=None, choices=("zlib",), help="原始数据的压缩方式（默认不压缩）")
+    parser.add_argument("--cycle-codec", default=None, choices=tuple(CYCLE_CODECS),
+                        help="周期数据的编码方式，保存为数据库设置（默认沿用数据库中的设置，新数据库不压缩）")
+    parser.add_argument("--stats-interval", type=float, default=60.0, help="打印统计信息的间隔(秒)，0表示不打印")
+    args = parser.parse_args(argv)
+
+    channel_map = {}
+    for item in args.channel_map:
+        topic, sep, channel = item.partition("=")
+        if not sep or not topic or not channel:
+            parser.error(f"无效的通道映射: {item}，格式应为 主题=通道ID")
+        channel_map[topic] = channel
+
+    try:
+        db_manager = open_storage(args.backend, args.db, partition=args.partition,
+                                  retention_days=args.retention_days, raw_compression=args.raw_compression,
+                                  cycle_codec=args.cycle_codec)
+    except ValueError as e:
+        parser.error(str(e))
+    if not db_manager.connected:
+        return 1
+
+    ingest = MQTTIngestClient(args.broker, args.port, args.topics or ["pub1"], qos=args.qos,
+                              queue_size=args.queue_size, overflow_policy=args.overflow_policy,
+                              channel_map=channel_map)
+    notifier = ChangeNotifier(args.notify_port)
+    writer = BatchWriter(db_manager, max_batch_rows=args.batch_rows, max_delay_ms=args.batch_delay_ms,
+                         notifier=notifier)
+    collector = Collector(db_manager, ingest, flush_interval=args.flush_interval,
+                          save_raw=args.save_raw, stats_interval=args.stats_interval, writer=writer)
+
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        print("收到退出信号，正在写入剩余数据...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    print(f"开始采集: {args.broker}:{args.port} 主题: {', '.join(ingest.topics)}")
+    try:
+        collector.run(stop_event)
+    finally:
+        db_manager.close()
+        notifier.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,679 @@
+"""追加写入的周期日志存储（内存映射读取）
+
+高频采集时，SQLite每行的B树维护、页分配和事务开销远大于周期数据本身。周期日志把
+周期数据按固定长度的记录追加写入二进制文件，另有一个时间索引文件，读取时通过
+numpy.memmap直接映射文件，时间范围内连续的记录不需要复制：
+
+    cycle_log.json   元数据：每条记录的点数、数据类型和通道名称表
+    cycles.bin       周期记录 (time_us, cycle_number, channel, length, data[points])，第i条记录的id为i+1
+    cycles.idx       时间索引 (time_us, channel)，每条记录12字节；按块（INDEX_BLOCK条）统计
+                     最早/最晚时间，按时间查询时只读取与范围重叠的块，写入顺序稍有乱序也能正确查询
+    gis_pd_log.db    SQLite数据库，保存原始数据、预聚合表和原始数据的统计表（原始数据长度不定，
+                     只在需要时保存）
+
+CycleLogStore提供与DatabaseManager相同的写入和查询方法，可直接交给BatchWriter、采集程序、
+GUI和Web服务使用（见storage模块）。查询结果中的data是float数组（memmap视图），
+codec.decode_cycle/decode_cycles对数组原样返回，调用方的解码代码不需要区分存储后端。
+
+写入时先追加记录、再追加索引，读取端以索引的条数为准，Web服务等只读进程不会读到
+写了一半的记录；程序异常退出后重新打开时按记录文件补齐或截断索引。
+每条记录的点数在创建时确定（默认取第一个周期的点数），较短的周期以NaN补齐，较长的
+周期截断（length字段保存原长度）。日志不支持按保留期删除数据，需要时使用分区存储。
+"""
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from .database import DatabaseManager, format_timestamp, timestamp_to_us, us_to_timestamp
+from .pagination import NEWEST_FIRST, OLDEST_FIRST, decode_cursor, page_query, split_page
+from .rollups import update_rollups, fetch_rollup_rows, merge_rollup_rows, choose_resolution
+from .schema import RAW_COLUMNS
+from .stats import read_stats_rows, merge_stats
+from .sqlite_config import connect
+
+LOG_FORMAT_VERSION = 1
+
+# 日志目录中的文件
+META_FILE = "cycle_log.json"
+RECORDS_FILE = "cycles.bin"
+INDEX_FILE = "cycles.idx"
+LOG_DB_FILE = "gis_pd_log.db"
+
+# 周期数据可选的保存类型
+LOG_DTYPES = ("float64", "float32")
+
+# 时间索引的记录类型
+INDEX_DTYPE = np.dtype([("time_us", "<i8"), ("channel", "<i4")])
+
+# 时间索引每块的记录数（按块统计最早/最晚时间）
+INDEX_BLOCK = 1024
+
+# 查询的时间范围不受限制时使用的边界
+_MIN_US = -2 ** 63
+_MAX_US = 2 ** 63 - 1
+
+
+def record_dtype(points, value_dtype="float64"):
+    """周期记录的类型"""
+    return np.dtype([
+        ("time_us", "<i8"),
+        ("cycle_number", "<i8"),
+        ("channel", "<i4"),
+        ("length", "<i4"),
+        ("data", np.dtype(value_dtype).newbyteorder("<"), (points,)),
+    ])
+
+
+class CycleRow(tuple):
+    """周期数据查询结果行 (id, timestamp, cycle_number, data, channel[, time_us])，
+    与sqlite3.Row一样可以按索引或列名访问"""
+    __slots__ = ()
+    FIELDS = ("id", "timestamp", "cycle_number", "data", "channel", "time_us")
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self.FIELDS.index(key)
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self.FIELDS[:len(self)])
+
+
+class CycleLogStore:
+    """追加写入的周期日志存储"""
+    def __init__(self, base_dir, points=None, value_dtype="float64", read_only=False, raw_compression=None,
+                 rollups=True):
+        """初始化周期日志
+
+        Args:
+            base_dir: 日志文件所在目录
+            points: 每条记录的点数，None表示使用已有日志的设置（新日志取第一个周期的点数）
+            value_dtype: 新日志的周期数据保存类型，"float64"（无损）或 "float32"（体积减半）
+            read_only: 只读模式（Web服务使用），不创建目录和文件
+            raw_compression: 原始数据的压缩方式，传给保存原始数据的DatabaseManager
+            rollups: 写入周期数据时是否同时更新预聚合表
+        """
+        if value_dtype not in LOG_DTYPES:
+            raise ValueError(f"不支持的周期日志数据类型: {value_dtype}")
+        self.base_dir = base_dir
+        self.db_path = base_dir
+        self.read_only = read_only
+        self.rollups = rollups
+        self.points = None
+        self.value_dtype = value_dtype
+        self.channels = []
+        self.dtype = None
+
+        self.meta_path = os.path.join(base_dir, META_FILE)
+        self.records_path = os.path.join(base_dir, RECORDS_FILE)
+        self.index_path = os.path.join(base_dir, INDEX_FILE)
+        self.log_db_path = os.path.join(base_dir, LOG_DB_FILE)
+
+        # 写入和刷新内存中的索引统计都需持有该锁
+        self.lock = threading.RLock()
+        self.db = None
+        self._records_file = None
+        self._index_file = None
+        self._reset_index()
+
+        self.connected = True
+        try:
+            if os.path.exists(self.meta_path):
+                self._load_meta()
+                if points is not None and points != self.points:
+                    print(f"周期日志已有的点数为 {self.points}，忽略指定的点数 {points}")
+            elif points is not None and not read_only:
+                self.points, self.dtype = points, record_dtype(points, value_dtype)
+            if not read_only:
+                os.makedirs(base_dir, exist_ok=True)
+                if self.dtype is not None:
+                    self._save_meta()
+                    self._open_files()
+                # 原始数据、预聚合表和原始数据的统计表保存在SQLite中
+                self.db = DatabaseManager(db_path=self.log_db_path, raw_compression=raw_compression,
+                                          rollups=False)
+                self.connected = self.db.connected
+        except (OSError, ValueError) as e:
+            print(f"打开周期日志错误: {str(e)}")
+            self.connected = False
+            return
+        print(f"周期日志目录: {self.base_dir}")
+
+    # ---------- 文件管理 ----------
+
+    def _reset_index(self):
+        """清空内存中的索引统计"""
+        self._rows = 0
+        self._block_min = np.empty(0, dtype=np.int64)
+        self._block_max = np.empty(0, dtype=np.int64)
+        # 通道序号 -> [行数, 最早time_us, 最晚time_us, 最大id]
+        self._channel_stats = {}
+        self._index_map = None
+        self._records_map = None
+
+    def _load_meta(self):
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != LOG_FORMAT_VERSION:
+            raise ValueError(f"不支持的周期日志格式版本: {meta.get('format_version')}")
+        self.points = meta["points"]
+        self.value_dtype = meta["value_dtype"]
+        self.channels = meta["channels"]
+        self.dtype = record_dtype(self.points, self.value_dtype)
+
+    def _save_meta(self):
+        """写入元数据（先写临时文件再替换，读取端不会读到写了一半的文件）"""
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "format_version": LOG_FORMAT_VERSION,
+                "points": self.points,
+                "value_dtype": self.value_dtype,
+                "channels": self.channels,
+            }, f, ensure_ascii=False)
+        os.replace(temp_path, self.meta_path)
+
+    def _open_files(self):
+        """打开追加写入的文件，修复异常退出时不完整的记录和索引"""
+        record_rows = 0
+        if os.path.exists(self.records_path):
+            size = os.path.getsize(self.records_path)
+            record_rows = size // self.dtype.itemsize
+            if size % self.dtype.itemsize:
+                print(f"截断周期日志末尾不完整的记录: {size % self.dtype.itemsize} 字节")
+                os.truncate(self.records_path, record_rows * self.dtype.itemsize)
+        index_rows = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize if os.path.exists(self.index_path) else 0
+        if index_rows > record_rows:
+            index_rows = record_rows
+        if os.path.exists(self.index_path):
+            os.truncate(self.index_path, index_rows * INDEX_DTYPE.itemsize)
+
+        self._records_file = open(self.records_path, "ab")
+        self._index_file = open(self.index_path, "ab")
+        if index_rows < record_rows:
+            # 记录已写入而索引没有写入的部分，由记录文件补齐
+            print(f"根据周期记录补齐时间索引: {record_rows - index_rows} 条")
+            records = np.memmap(self.records_path, dtype=self.dtype, mode="r", shape=(record_rows,))
+            missing = np.empty(record_rows - index_rows, dtype=INDEX_DTYPE)
+            missing["time_us"] = records["time_us"][index_rows:]
+            missing["channel"] = records["channel"][index_rows:]
+            del records
+            self._index_file.write(missing.tobytes())
+            self._index_file.flush()
+
+    def _indexed_rows(self):
+        """读取端可见的记录数（以索引为准）"""
+        try:
+            return os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+        except OSError:
+            return 0
+
+    def _refresh(self):
+        """读取索引中新增的条目，更新按块统计的时间范围和各通道的统计，返回记录数"""
+        with self.lock:
+            if self.dtype is None:
+                if not os.path.exists(self.meta_path):
+                    return 0
+                self._load_meta()
+            rows = self._indexed_rows()
+            if rows < self._rows:
+                # 日志文件被替换（例如重新创建），重新读取全部索引
+                self._reset_index()
+            if rows == self._rows:
+                return rows
+
+            index = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode="r", shape=(rows,))
+            # 从最后一个不完整的块开始重新统计
+            first = self._rows // INDEX_BLOCK
+            times = index["time_us"][first * INDEX_BLOCK:rows]
+            offsets = np.arange(0, len(times), INDEX_BLOCK)
+            self._block_min = np.concatenate([self._block_min[:first], np.minimum.reduceat(times, offsets)])
+            self._block_max = np.concatenate([self._block_max[:first], np.maximum.reduceat(times, offsets)])
+
+            new = index[self._rows:rows]
+            ids = np.arange(self._rows + 1, rows + 1)
+            for channel in np.unique(new["channel"]).tolist():
+                mask = new["channel"] == channel
+                channel_times = new["time_us"][mask]
+                entry = self._channel_stats.get(channel)
+                count, first_us, last_us = int(mask.sum()), int(channel_times.min()), int(channel_times.max())
+                last_id = int(ids[mask][-1])
+                if entry is None:
+                    self._channel_stats[channel] = [count, first_us, last_us, last_id]
+                else:
+                    entry[0] += count
+                    entry[1] = min(entry[1], first_us)
+                    entry[2] = max(entry[2], last_us)
+                    entry[3] = last_id
+            if max(self._channel_stats) >= len(self.channels):
+                # 其他进程写入了新的通道
+                self._load_meta()
+
+            self._rows = rows
+            self._index_map = index
+            self._records_map = np.memmap(self.records_path, dtype=self.dtype, mode="r", shape=(rows,))
+            return rows
+
+    def _channel_index(self, channel):
+        """通道名称对应的序号，新通道追加到元数据中"""
+        try:
+            return self.channels.index(channel)
+        except ValueError:
+            self.channels.append(channel)
+            self._save_meta()
+            return len(self.channels) - 1
+
+    # ---------- 写入 ----------
+
+    def save_cycle_data(self, cycle_number, data, timestamp=None, channel=""):
+        """保存周期数据"""
+        return self.write_batch([(timestamp, cycle_number, data, channel)], [])
+
+    def save_raw_data(self, broker, topic, raw_data, timestamp=None, channel=""):
+        """保存原始数据"""
+        return self.write_batch([], [(timestamp, broker, topic, raw_data, channel)])
+
+    def save_cycle_batch(self, records):
+        """批量保存周期数据"""
+        return self.write_batch(records, [])
+
+    def save_raw_batch(self, records):
+        """批量保存原始数据"""
+        return self.write_batch([], records)
+
+    def write_batch(self, cycle_records, raw_records):
+        """追加周期记录，原始数据和预聚合数据在SQLite中一个事务提交
+
+        Args:
+            cycle_records: (timestamp, cycle_number, data, channel) 元组列表
+            raw_records: (timestamp, broker, topic, raw_data, channel) 元组列表
+        """
+        if self.read_only or not self.connected:
+            return False
+        if not cycle_records and not raw_records:
+            return True
+
+        now = format_timestamp()
+        rollup_records = []
+        if cycle_records:
+            with self.lock:
+                try:
+                    rollup_records = self._append_cycles(cycle_records, now)
+                except (OSError, ValueError) as e:
+                    print(f"写入周期日志错误: {str(e)}")
+                    return False
+        if not rollup_records and not raw_records:
+            return True
+        # SQLite事务只持有数据库的写入锁，提交期间周期日志的查询不被阻塞
+        with self.db.lock:
+            try:
+                if rollup_records:
+                    update_rollups(self.db.conn, rollup_records)
+                if raw_records:
+                    # write_batch在同一个事务中提交预聚合数据
+                    return self.db.write_batch([], raw_records)
+                self.db.conn.commit()
+                return True
+            except sqlite3.Error as e:
+                print(f"保存预聚合数据错误: {str(e)}")
+                self.db.conn.rollback()
+                return False
+
+    def _append_cycles(self, cycle_records, now):
+        """追加一批周期记录和索引，返回用于更新预聚合表的 (time_us, channel, data) 列表"""
+        values = [np.asarray(data, dtype=np.float64) for _, _, data, _ in cycle_records]
+        if self.dtype is None:
+            # 新日志：点数取第一个周期的点数
+            self.points = len(values[0])
+            self.dtype = record_dtype(self.points, self.value_dtype)
+            self._save_meta()
+            self._open_files()
+
+        # 同一批中的时间戳大多相同，缓存转换结果
+        time_us_cache = {}
+        for timestamp, _, _, _ in cycle_records:
+            timestamp = timestamp or now
+            if timestamp not in time_us_cache:
+                time_us_cache[timestamp] = timestamp_to_us(timestamp)
+
+        records = np.empty(len(cycle_records), dtype=self.dtype)
+        records["time_us"] = [time_us_cache[timestamp or now] for timestamp, _, _, _ in cycle_records]
+        records["cycle_number"] = [cycle_number for _, cycle_number, _, _ in cycle_records]
+        records["channel"] = [self._channel_index(channel) for _, _, _, channel in cycle_records]
+        records["length"] = [len(cycle) for cycle in values]
+        data = records["data"]
+        data[:] = np.nan
+        for i, cycle in enumerate(values):
+            n = min(len(cycle), self.points)
+            data[i, :n] = cycle[:n]
+
+        index = np.empty(len(records), dtype=INDEX_DTYPE)
+        index["time_us"] = records["time_us"]
+        index["channel"] = records["channel"]
+        # 先写记录再写索引，读取端以索引的条数为准
+        self._records_file.write(records.tobytes())
+        self._records_file.flush()
+        self._index_file.write(index.tobytes())
+        self._index_file.flush()
+
+        if not self.rollups:
+            return []
+        return [(time_us, channel, cycle) for time_us, (_, _, _, channel), cycle
+                in zip(records["time_us"].tolist(), cycle_records, values)]
+
+    # ---------- 查询 ----------
+
+    def _select(self, start_us=_MIN_US, end_us=_MAX_US, channel=None, order=OLDEST_FIRST, limit=None, after=None):
+        """按 (time_us, id) 排序查找满足条件的记录，返回记录位置数组（id为位置加1）
+
+        Args:
+            start_us, end_us: 时间范围（闭区间）
+            channel: 通道ID，None表示所有通道
+            order: NEWEST_FIRST 或 OLDEST_FIRST
+            limit: 最多返回的记录数，None表示不限制
+            after: 从该 (time_us, id) 之后开始（不包含），用于分页
+        """
+        rows = self._refresh()
+        empty = np.empty(0, dtype=np.int64)
+        if rows == 0:
+            return empty
+        channel_index = None
+        if channel is not None:
+            if channel not in self.channels:
+                return empty
+            channel_index = self.channels.index(channel)
+        if after is not None:
+            if order == NEWEST_FIRST:
+                end_us = min(end_us, after[0])
+            else:
+                start_us = max(start_us, after[0])
+
+        with self.lock:
+            index, block_min, block_max = self._index_map, self._block_min, self._block_max
+        blocks = np.flatnonzero((block_max >= start_us) & (block_min <= end_us))
+        if limit is None:
+            # 相邻的块合并为一次切片读取
+            breaks = np.flatnonzero(np.diff(blocks) != 1) + 1
+            spans = [(run[0] * INDEX_BLOCK, min((run[-1] + 1) * INDEX_BLOCK, rows))
+                     for run in np.split(blocks, breaks) if len(run)]
+        elif order == NEWEST_FIRST:
+            # 最晚时间越晚的块越先读取，读够limit条后，最晚时间早于第limit条的块不必再读
+            blocks = blocks[np.lexsort((-blocks, -block_max[blocks]))]
+            spans = [(b * INDEX_BLOCK, min((b + 1) * INDEX_BLOCK, rows)) for b in blocks.tolist()]
+        else:
+            blocks = blocks[np.lexsort((blocks, block_min[blocks]))]
+            spans = [(b * INDEX_BLOCK, min((b + 1) * INDEX_BLOCK, rows)) for b in blocks.tolist()]
+
+        found_positions, found_times = [], []
+        total = 0
+        threshold = None
+        for lo, hi in spans:
+            if threshold is not None:
+                block = lo // INDEX_BLOCK
+                if order == NEWEST_FIRST and block_max[block] < threshold:
+                    break
+                if order != NEWEST_FIRST and block_min[block] > threshold:
+                    break
+            times = index["time_us"][lo:hi]
+            mask = (times >= start_us) & (times <= end_us)
+            if channel_index is not None:
+                mask &= index["channel"][lo:hi] == channel_index
+            if after is not None:
+                ids = np.arange(lo + 1, hi + 1)
+                if order == NEWEST_FIRST:
+                    mask &= (times < after[0]) | (ids < after[1])
+                else:
+                    mask &= (times > after[0]) | (ids > after[1])
+            positions = np.flatnonzero(mask)
+            if not len(positions):
+                continue
+            found_positions.append(positions + lo)
+            found_times.append(times[positions])
+            total += len(positions)
+            if limit is not None and total >= limit:
+                all_times = np.concatenate(found_times)
+                if order == NEWEST_FIRST:
+                    threshold = np.partition(all_times, total - limit)[total - limit]
+                else:
+                    threshold = np.partition(all_times, limit - 1)[limit - 1]
+
+        if not found_positions:
+            return empty
+        positions = np.concatenate(found_positions)
+        times = np.concatenate(found_times)
+        # 写入顺序基本按时间，已经有序时不需要排序
+        if len(times) > 1 and not (np.all(np.diff(times) >= 0)):
+            sort = np.lexsort((positions, times))
+            positions = positions[sort]
+        if order == NEWEST_FIRST:
+            positions = positions[::-1]
+        return positions[:limit] if limit is not None else positions
+
+    def _cycle_rows(self, positions, with_time=False):
+        """将记录位置转换为 (id, timestamp, cycle_number, data, channel[, time_us]) 行"""
+        with self.lock:
+            records, channels = self._records_map, list(self.channels)
+        if not len(positions):
+            return []
+        fields = records[["time_us", "cycle_number", "channel", "length"]][positions]
+        data = records["data"]
+        # 同一秒内的时间戳只有微秒部分不同，按秒缓存"YYYY-MM-DD HH:MM:SS"部分
+        second_cache = {}
+        result = []
+        for position, time_us, cycle_number, channel, length in zip(
+                positions.tolist(), fields["time_us"].tolist(), fields["cycle_number"].tolist(),
+                fields["channel"].tolist(), fields["length"].tolist()):
+            seconds, micros = divmod(time_us, 1000000)
+            prefix = second_cache.get(seconds)
+            if prefix is None:
+                prefix = second_cache[seconds] = us_to_timestamp(seconds * 1000000)[:-7]
+            # data为memmap视图，不复制
+            row = (position + 1, f"{prefix}.{micros:06d}", cycle_number,
+                   data[position, :min(length, self.points)], channels[channel])
+            result.append(CycleRow(row + (time_us,) if with_time else row))
+        return result
+
+    def _query(self, sql, params=()):
+        """在原始数据库上执行只读查询（原始数据库不存在时返回空列表）"""
+        if not os.path.exists(self.log_db_path):
+            return []
+        conn = connect(self.log_db_path, read_only=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def get_cycle_data(self, limit=100, offset=0, channel=None):
+        """获取周期数据（按时间倒序）"""
+        try:
+            positions = self._select(channel=channel, order=NEWEST_FIRST, limit=limit + offset)
+            return self._cycle_rows(positions[offset:])
+        except (OSError, ValueError) as e:
+            print(f"获取周期数据错误: {str(e)}")
+            return []
+
+    def get_raw_data(self, limit=100, offset=0, channel=None):
+        """获取原始数据（按时间倒序）"""
+        try:
+            where, params = ("WHERE channel = ?", (channel,)) if channel is not None else ("", ())
+            return self._query(
+                f"SELECT {RAW_COLUMNS} FROM raw_data {where} ORDER BY time_us DESC, id DESC LIMIT ? OFFSET ?",
+                params + (limit, offset)
+            )
+        except sqlite3.Error as e:
+            print(f"获取原始数据错误: {str(e)}")
+            return []
+
+    def get_cycle_page(self, after=None, limit=100, channel=None, order=NEWEST_FIRST, time_range=None):
+        """按游标分页获取周期数据，返回 (rows, next_cursor)（见DatabaseManager.get_cycle_page）"""
+        try:
+            position = None
+            if after:
+                time_us, row_id, order = decode_cursor(after)
+                position = (time_us, row_id)
+            start_us, end_us = time_range if time_range is not None else (_MIN_US, _MAX_US)
+            positions = self._select(start_us, end_us, channel=channel, order=order, limit=limit + 1, after=position)
+            return split_page(self._cycle_rows(positions, with_time=True), limit, order)
+        except (OSError, ValueError) as e:
+            print(f"分页获取周期数据错误: {str(e)}")
+            return [], None
+
+    def get_raw_page(self, after=None, limit=100, channel=None, order=NEWEST_FIRST):
+        """按游标分页获取原始数据，返回 (rows, next_cursor)"""
+        try:
+            position = None
+            if after:
+                time_us, row_id, order = decode_cursor(after)
+                position = (time_us, row_id)
+            sql, params = page_query("raw_data", RAW_COLUMNS, position, order, channel, limit)
+            return split_page(self._query(sql, params), limit, order)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"分页获取原始数据错误: {str(e)}")
+            return [], None
+
+    def get_latest_cycle_data(self, count=1, channel=None):
+        """获取最新的周期数据"""
+        return self.get_cycle_data(count, 0, channel)
+
+    def get_cycles_after(self, last_id, limit=1000, channel=None):
+        """获取id大于last_id的周期数据（按id升序，见DatabaseManager.get_cycles_after）
+
+        第i条记录的id为i+1，不过滤通道时直接切片；过滤通道时按块扫描索引，找够limit条即停止
+        """
+        try:
+            rows = self._refresh()
+            start = max(0, int(last_id))
+            if channel is None:
+                return self._cycle_rows(np.arange(start, min(rows, start + limit)))
+            if channel not in self.channels:
+                return []
+            channel_index = self.channels.index(channel)
+            with self.lock:
+                index = self._index_map
+            found, total = [], 0
+            for lo in range(start, rows, INDEX_BLOCK):
+                hi = min(lo + INDEX_BLOCK, rows)
+                positions = np.flatnonzero(index["channel"][lo:hi] == channel_index) + lo
+                found.append(positions)
+                total += len(positions)
+                if total >= limit:
+                    break
+            if not found:
+                return []
+            return self._cycle_rows(np.concatenate(found)[:limit])
+        except (OSError, ValueError) as e:
+            print(f"获取新周期数据错误: {str(e)}")
+            return []
+
+    def get_cycle_data_by_time(self, start_time, end_time, channel=None):
+        """根据时间范围获取周期数据（按时间升序）"""
+        try:
+            positions = self._select(timestamp_to_us(start_time), timestamp_to_us(end_time), channel)
+            return self._cycle_rows(positions)
+        except (OSError, ValueError) as e:
+            print(f"根据时间范围获取周期数据错误: {str(e)}")
+            return []
+
+    def get_cycle_matrix(self, start_time, end_time, channel=None):
+        """按时间范围读取周期数据矩阵
+
+        返回 (time_us, data)：time_us为int64数组，data为 (周期数, 点数) 的数组（不足的点为NaN）。
+        记录按时间顺序写入且不过滤通道时，data是日志文件的memmap视图，不复制数据。
+        """
+        try:
+            positions = self._select(timestamp_to_us(start_time), timestamp_to_us(end_time), channel)
+            with self.lock:
+                records = self._records_map
+            if not len(positions):
+                return np.empty(0, dtype=np.int64), np.empty((0, self.points or 0))
+            if positions[-1] - positions[0] + 1 == len(positions):
+                # 连续的记录直接切片
+                selected = records[positions[0]:positions[-1] + 1]
+            else:
+                selected = records[positions]
+            return selected["time_us"], selected["data"]
+        except (OSError, ValueError) as e:
+            print(f"读取周期数据矩阵错误: {str(e)}")
+            return np.empty(0, dtype=np.int64), np.empty((0, self.points or 0))
+
+    def get_rollup(self, start_time, end_time, channel=None, points=500, resolution=None):
+        """查询时间范围内的预聚合数据（见DatabaseManager.get_rollup）"""
+        try:
+            start_us, end_us = timestamp_to_us(start_time), timestamp_to_us(end_time)
+            resolution = resolution or choose_resolution(start_us, end_us, points)
+            if not os.path.exists(self.log_db_path):
+                return merge_rollup_rows([], resolution)
+            conn = connect(self.log_db_path, read_only=True)
+            try:
+                rows = fetch_rollup_rows(conn, resolution, start_us, end_us, channel)
+            finally:
+                conn.close()
+            return merge_rollup_rows(rows, resolution)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"查询预聚合数据错误: {str(e)}")
+            return None
+
+    def get_stats(self, channel=None):
+        """统计信息（见DatabaseManager.get_stats）：周期数据的统计由内存中的索引统计得到，
+        原始数据读取原始数据库的统计表，出错时返回None"""
+        try:
+            self._refresh()
+            with self.lock:
+                rows = [
+                    ("cycle_data", self.channels[index], count, first_us, us_to_timestamp(first_us),
+                     last_us, us_to_timestamp(last_us), last_id)
+                    for index, (count, first_us, last_us, last_id) in self._channel_stats.items()
+                ]
+            if os.path.exists(self.log_db_path):
+                conn = connect(self.log_db_path, read_only=True)
+                try:
+                    rows.extend(row for row in read_stats_rows(conn) if row[0] == "raw_data")
+                finally:
+                    conn.close()
+            return merge_stats(rows, channel)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"获取统计信息错误: {str(e)}")
+            return None
+
+    def get_cycle_count(self, channel=None):
+        """获取周期数据总数"""
+        stats = self.get_stats(channel)
+        return stats["cycle_count"] if stats else 0
+
+    def get_raw_count(self, channel=None):
+        """获取原始数据总数"""
+        stats = self.get_stats(channel)
+        return stats["raw_count"] if stats else 0
+
+    def get_channels(self):
+        """获取周期数据中出现过的通道ID列表"""
+        try:
+            self._refresh()
+            with self.lock:
+                return sorted(self.channels[index] for index in self._channel_stats)
+        except (OSError, ValueError) as e:
+            print(f"获取通道列表错误: {str(e)}")
+            return []
+
+    def get_time_bounds(self):
+        """获取最早和最晚的周期数据时间戳，没有数据时为None"""
+        stats = self.get_stats()
+        if not stats:
+            return None, None
+        return stats["earliest_cycle"], stats["latest_cycle"]
+
+    def close(self):
+        """关闭日志文件和原始数据库"""
+        with self.lock:
+            for f in (self._records_file, self._index_file):
+                if f is not None:
+                    f.close()
+            self._records_file = self._index_file = None
+            self._index_map = self._records_map = None
+            if self.db is not None:
+                self.db.close()
+        self.connected = False
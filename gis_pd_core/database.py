@@ -0,0 +1,485 @@
+"""数据库管理模块（不依赖Qt），负责SQLite数据库的连接、建表、数据存储和查询"""
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+
+from .codec import encode_cycle, encode_raw, CYCLE_CODECS, DEFAULT_CYCLE_CODEC
+from .pagination import NEWEST_FIRST, decode_cursor, page_query, split_page
+from .rollups import update_rollups, fetch_rollup_rows, merge_rollup_rows, choose_resolution
+from .sqlite_config import connect
+from .stats import update_stats, read_stats
+from .schema import (ensure_schema, get_setting, set_setting, CYCLE_COLUMNS, RAW_COLUMNS, DEFAULT_CHANNEL,
+                     CYCLE_CODEC_SETTING)
+
+# 时间戳格式
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# 通道列表：递归查询在(channel, time_us)索引上逐个查找下一个更大的通道ID（跳跃扫描），
+# 每个通道只访问一次索引，不随行数增长（SELECT DISTINCT会扫描整个索引）
+CHANNELS_SQL = """
+WITH RECURSIVE channels(channel) AS (
+    SELECT MIN(channel) FROM cycle_data
+    UNION ALL
+    SELECT (SELECT MIN(channel) FROM cycle_data WHERE channel > channels.channel)
+    FROM channels WHERE channels.channel IS NOT NULL
+)
+SELECT channel FROM channels WHERE channel IS NOT NULL
+"""
+
+
+def get_application_path():
+    """获取应用程序根目录（数据库文件所在目录）"""
+    try:
+        if getattr(sys, 'frozen', False):
+            # 如果是打包后的应用程序，使用可执行文件所在目录
+            # 注意：不使用sys._MEIPASS，因为那是临时目录，应用关闭后会被删除
+            return os.path.dirname(sys.executable)
+        # 如果是普通Python脚本，使用项目根目录（本包的上一级目录）
+        return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    except Exception as e:
+        # 如果出错，回退到当前工作目录
+        print(f"获取应用路径出错，使用当前工作目录: {os.getcwd()}, 错误: {str(e)}")
+        return os.getcwd()
+
+
+def format_timestamp(dt=None):
+    """将datetime格式化为数据库使用的时间戳字符串，默认为当前时间"""
+    if dt is None:
+        dt = datetime.datetime.now()
+    return dt.strftime(TIMESTAMP_FORMAT)
+
+
+def timestamp_to_us(value):
+    """将时间戳字符串（或datetime）转换为time_us列使用的epoch微秒整数
+
+    字符串按本地时间解析，支持数据库时间戳格式以及"YYYY-MM-DD HH:MM:SS"、"YYYY-MM-DDTHH:MM"等ISO格式。
+    与schema.TIME_US_SQL的计算结果一致。
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    # 整秒部分和微秒部分分开计算，避免浮点误差
+    return int(value.replace(microsecond=0).timestamp()) * 1000000 + value.microsecond
+
+
+def us_to_timestamp(time_us):
+    """将epoch微秒整数转换为数据库时间戳字符串（本地时间）"""
+    seconds, micros = divmod(time_us, 1000000)
+    return format_timestamp(datetime.datetime.fromtimestamp(seconds).replace(microsecond=micros))
+
+
+class DatabaseManager:
+    """数据库管理类，负责数据库的连接、创建表和数据存储"""
+    def __init__(self, db_name="gis_pd_data.db", db_path=None, raw_compression=None, rollups=True,
+                 cycle_codec=None, read_only=False):
+        """初始化数据库连接
+
+        Args:
+            db_name: 数据库文件名，保存在应用程序目录下
+            db_path: 数据库文件完整路径，指定时忽略db_name
+            raw_compression: 原始数据的压缩方式，None（不压缩）或 "zlib"
+            rollups: 写入周期数据时是否同时更新预聚合表（见rollups模块）
+            cycle_codec: 周期数据的编码方式（codec.CYCLE_CODECS中的名称），指定时保存为数据库设置；
+                None表示使用数据库中已保存的设置（默认不压缩）
+            read_only: 只读模式（Web服务使用），不升级表结构、不能写入（数据库文件必须已存在）；
+                两种模式下查询都使用每个线程各自的只读连接，多个线程的查询可以并行执行
+        """
+        # 数据库文件路径
+        self.db_path = db_path if db_path else os.path.join(get_application_path(), db_name)
+        print(f"数据库路径: {self.db_path}")
+        
+        self.raw_compression = raw_compression
+        self.rollups = rollups
+        self.read_only = read_only
+        self.cycle_codec = DEFAULT_CYCLE_CODEC
+        self.conn = None
+        self.cursor = None
+        self.connected = False
+        # 写入连接在写库线程和主线程之间共享，写入操作都需持有该锁
+        self.lock = threading.RLock()
+        # 每个线程各自的只读连接：查询不使用写入连接也不持有写入锁，
+        # 写库线程提交事务期间GUI和Web的查询不会被阻塞（WAL模式允许读写并发）
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        
+        if read_only:
+            try:
+                self._reader()
+                self.connected = True
+                print(f"数据库只读连接成功: {self.db_path}")
+            except sqlite3.Error as e:
+                print(f"数据库连接错误: {str(e)}")
+            return
+        
+        # 创建数据库连接（WAL模式，见sqlite_config），使用check_same_thread=False允许在不同线程中使用
+        try:
+            self.conn = connect(self.db_path, check_same_thread=False)
+            self.cursor = self.conn.cursor()
+            self.connected = True
+            
+            # 创建数据表
+            self.create_tables()
+            self.set_cycle_codec(cycle_codec)
+            
+            print(f"数据库连接成功: {self.db_path}")
+        except sqlite3.Error as e:
+            print(f"数据库连接错误: {str(e)}")
+    
+    def create_tables(self):
+        """创建必要的数据表（并升级旧版本的表结构）"""
+        if not self.connected:
+            return
+            
+        try:
+            ensure_schema(self.conn)
+        except sqlite3.Error as e:
+            print(f"创建数据表错误: {str(e)}")
+    
+    def set_cycle_codec(self, codec=None):
+        """设置新写入的周期数据的编码方式并保存为数据库设置，codec为None时读取已保存的设置"""
+        if not self.connected:
+            return
+        if codec is not None and codec not in CYCLE_CODECS:
+            print(f"不支持的周期数据编码方式: {codec}，使用数据库中保存的设置")
+            codec = None
+        
+        try:
+            with self.lock:
+                if codec is None:
+                    codec = get_setting(self.conn, CYCLE_CODEC_SETTING, DEFAULT_CYCLE_CODEC)
+                elif codec != get_setting(self.conn, CYCLE_CODEC_SETTING, DEFAULT_CYCLE_CODEC):
+                    set_setting(self.conn, CYCLE_CODEC_SETTING, codec)
+        except sqlite3.Error as e:
+            print(f"设置周期数据编码方式错误: {str(e)}")
+            return
+        if codec not in CYCLE_CODECS:
+            print(f"数据库设置的周期数据编码方式无法识别: {codec}，使用 {DEFAULT_CYCLE_CODEC}")
+            codec = DEFAULT_CYCLE_CODEC
+        self.cycle_codec = codec
+    
+    def save_cycle_data(self, cycle_number, data, timestamp=None, channel=DEFAULT_CHANNEL):
+        """保存周期数据
+
+        Args:
+            cycle_number: 周期编号
+            data: 周期数据
+            timestamp: 时间戳字符串，默认为当前时间
+            channel: 通道ID
+        """
+        return self.save_cycle_batch([(timestamp, cycle_number, data, channel)])
+    
+    def save_raw_data(self, broker, topic, raw_data, timestamp=None, channel=DEFAULT_CHANNEL):
+        """保存原始数据（raw_data为原始负载bytes，也接受旧版本的十六进制字符串）"""
+        return self.save_raw_batch([(timestamp, broker, topic, raw_data, channel)])
+    
+    def save_cycle_batch(self, records):
+        """在一个事务中批量保存周期数据
+
+        Args:
+            records: (timestamp, cycle_number, data, channel) 元组列表，timestamp为None时使用当前时间
+        """
+        return self.write_batch(records, [])
+    
+    def save_raw_batch(self, records):
+        """在一个事务中批量保存原始数据
+
+        Args:
+            records: (timestamp, broker, topic, raw_data, channel) 元组列表，timestamp为None时使用当前时间
+        """
+        return self.write_batch([], records)
+    
+    def write_batch(self, cycle_records, raw_records):
+        """在同一个事务中批量保存周期数据和原始数据（只提交一次）
+
+        Args:
+            cycle_records: (timestamp, cycle_number, data, channel) 元组列表
+            raw_records: (timestamp, broker, topic, raw_data, channel) 元组列表
+        """
+        if not self.connected or self.read_only:
+            return False
+        if not cycle_records and not raw_records:
+            return True
+            
+        now = format_timestamp()
+        # 同一批中的时间戳大多相同，缓存转换结果
+        time_us_cache = {}
+        
+        def to_us(timestamp):
+            if timestamp not in time_us_cache:
+                time_us_cache[timestamp] = timestamp_to_us(timestamp)
+            return time_us_cache[timestamp]
+        
+        cycle_rows = [
+            # 将数据编码为二进制存储（见codec模块）
+            (timestamp or now, to_us(timestamp or now), cycle_number, encode_cycle(data, self.cycle_codec), channel)
+            for timestamp, cycle_number, data, channel in cycle_records
+        ]
+        raw_rows = [
+            # 保存原始负载字节（按raw_compression压缩，见codec模块）
+            (timestamp or now, to_us(timestamp or now), broker, topic,
+             encode_raw(raw_data, self.raw_compression), channel)
+            for timestamp, broker, topic, raw_data, channel in raw_records
+        ]
+        
+        with self.lock:
+            try:
+                if cycle_rows:
+                    self.cursor.executemany(
+                        "INSERT INTO cycle_data (timestamp, time_us, cycle_number, data, channel) VALUES (?, ?, ?, ?, ?)",
+                        cycle_rows
+                    )
+                    if self.rollups:
+                        # 在同一个事务中增量更新预聚合表
+                        update_rollups(self.conn, [
+                            (row[1], channel, data)
+                            for row, (_, _, data, channel) in zip(cycle_rows, cycle_records)
+                        ])
+                if raw_rows:
+                    self.cursor.executemany(
+                        "INSERT INTO raw_data (timestamp, time_us, broker, topic, raw_data, channel) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        raw_rows
+                    )
+                # 在同一个事务中更新行数和时间范围统计
+                update_stats(self.conn, "cycle_data", [(row[0], row[1], row[-1]) for row in cycle_rows])
+                update_stats(self.conn, "raw_data", [(row[0], row[1], row[-1]) for row in raw_rows])
+                self.conn.commit()
+                return True
+            except sqlite3.Error as e:
+                print(f"批量保存数据错误: {str(e)}")
+                self.conn.rollback()
+                return False
+    
+    def _reader(self):
+        """当前线程的只读连接（第一次使用时创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path, read_only=True, check_same_thread=False)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+    
+    def _read(self, query):
+        """在当前线程的只读连接上执行query(conn)，只能看到已提交的数据，不持有写入锁"""
+        return query(self._reader())
+    
+    def _fetchall(self, sql, params=()):
+        """执行查询并返回全部结果（使用独立游标）"""
+        return self._read(lambda conn: conn.execute(sql, params).fetchall())
+    
+    @staticmethod
+    def _channel_filter(channel, prefix="WHERE"):
+        """生成通道过滤条件，channel为None时不过滤"""
+        if channel is None:
+            return "", ()
+        return f"{prefix} channel = ?", (channel,)
+    
+    def get_cycle_data(self, limit=100, offset=0, channel=None):
+        """获取周期数据
+
+        返回 (id, timestamp, cycle_number, data, channel) 元组列表，channel为None时返回所有通道的数据；
+        data为二进制编码（或旧版本的文本），使用codec.decode_cycle解码。
+        offset较大时需要先跳过前面的行，连续翻页请使用get_cycle_page
+        """
+        if not self.connected:
+            return []
+            
+        try:
+            where, params = self._channel_filter(channel)
+            return self._fetchall(
+                f"SELECT {CYCLE_COLUMNS} FROM cycle_data {where} ORDER BY time_us DESC, id DESC LIMIT ? OFFSET ?",
+                params + (limit, offset)
+            )
+        except sqlite3.Error as e:
+            print(f"获取周期数据错误: {str(e)}")
+            return []
+    
+    def get_raw_data(self, limit=100, offset=0, channel=None):
+        """获取原始数据
+
+        返回 (id, timestamp, broker, topic, raw_data, channel) 元组列表；
+        raw_data为带版本号的二进制（或旧版本的十六进制文本），使用codec.decode_raw解码
+        """
+        if not self.connected:
+            return []
+            
+        try:
+            where, params = self._channel_filter(channel)
+            return self._fetchall(
+                f"SELECT {RAW_COLUMNS} FROM raw_data {where} ORDER BY time_us DESC, id DESC LIMIT ? OFFSET ?",
+                params + (limit, offset)
+            )
+        except sqlite3.Error as e:
+            print(f"获取原始数据错误: {str(e)}")
+            return []
+    
+    def _page(self, table, columns, after, limit, channel, order, time_range=None):
+        """按游标读取一页数据，游标中的排序方向优先于order参数"""
+        position = None
+        if after:
+            time_us, row_id, order = decode_cursor(after)
+            position = (time_us, row_id)
+        sql, params = page_query(table, columns, position, order, channel, limit, time_range)
+        return split_page(self._fetchall(sql, params), limit, order)
+    
+    def get_cycle_page(self, after=None, limit=100, channel=None, order=NEWEST_FIRST, time_range=None):
+        """按游标分页获取周期数据（每页耗时与页码无关）
+
+        Args:
+            after: 上一页返回的游标，None表示第一页
+            limit: 每页行数
+            channel: 通道ID，None表示所有通道
+            order: 第一页的排序方向（pagination.NEWEST_FIRST / OLDEST_FIRST），之后的页沿用游标中的方向
+            time_range: (start_us, end_us) 闭区间，只读取该时间范围内的周期（每一页都需传入），None表示不限制
+
+        Returns:
+            (rows, next_cursor)：rows为 (id, timestamp, cycle_number, data, channel, time_us) 元组列表，
+            没有更多数据时next_cursor为None
+        """
+        if not self.connected:
+            return [], None
+            
+        try:
+            return self._page("cycle_data", CYCLE_COLUMNS, after, limit, channel, order, time_range)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"分页获取周期数据错误: {str(e)}")
+            return [], None
+    
+    def get_raw_page(self, after=None, limit=100, channel=None, order=NEWEST_FIRST):
+        """按游标分页获取原始数据
+
+        返回 (rows, next_cursor)，rows为 (id, timestamp, broker, topic, raw_data, channel, time_us) 元组列表
+        """
+        if not self.connected:
+            return [], None
+            
+        try:
+            return self._page("raw_data", RAW_COLUMNS, after, limit, channel, order)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"分页获取原始数据错误: {str(e)}")
+            return [], None
+    
+    def get_stats(self, channel=None):
+        """读取统计表（写入时增量更新，不扫描数据表）
+
+        返回包含cycle_count、raw_count、earliest_cycle、latest_cycle、earliest_raw、latest_raw、
+        last_cycle_id、last_raw_id的字典（见stats.merge_stats），出错时返回None
+        """
+        if not self.connected:
+            return None
+            
+        try:
+            return self._read(lambda conn: read_stats(conn, channel))
+        except sqlite3.Error as e:
+            print(f"获取统计信息错误: {str(e)}")
+            return None
+    
+    def get_cycle_count(self, channel=None):
+        """获取周期数据总数（读取统计表）"""
+        stats = self.get_stats(channel)
+        return stats["cycle_count"] if stats else 0
+    
+    def get_raw_count(self, channel=None):
+        """获取原始数据总数（读取统计表）"""
+        stats = self.get_stats(channel)
+        return stats["raw_count"] if stats else 0
+    
+    def get_channels(self):
+        """获取周期数据中出现过的通道ID列表（按通道ID排序，见CHANNELS_SQL）"""
+        if not self.connected:
+            return []
+            
+        try:
+            rows = self._fetchall(CHANNELS_SQL)
+            return [row[0] for row in rows]
+        except sqlite3.Error as e:
+            print(f"获取通道列表错误: {str(e)}")
+            return []
+    
+    def get_latest_cycle_data(self, count=1, channel=None):
+        """获取最新的周期数据"""
+        if not self.connected:
+            return []
+            
+        try:
+            where, params = self._channel_filter(channel)
+            return self._fetchall(
+                f"SELECT {CYCLE_COLUMNS} FROM cycle_data {where} ORDER BY time_us DESC, id DESC LIMIT ?",
+                params + (count,)
+            )
+        except sqlite3.Error as e:
+            print(f"获取最新周期数据错误: {str(e)}")
+            return []
+    
+    def get_cycles_after(self, last_id, limit=1000, channel=None):
+        """获取id大于last_id的周期数据（按id升序，即写入顺序），用于增量读取新数据
+
+        时间戳可能乱序（多通道分批提交、各通道时钟不同），按时间倒序读取最新数据再按id过滤会漏掉周期，
+        按id读取不会遗漏：调用方以最后一行的id作为下一次的last_id
+        """
+        if not self.connected:
+            return []
+            
+        try:
+            where, params = self._channel_filter(channel, "AND")
+            return self._fetchall(
+                f"SELECT {CYCLE_COLUMNS} FROM cycle_data WHERE id > ? {where} ORDER BY id LIMIT ?",
+                (last_id,) + params + (limit,)
+            )
+        except sqlite3.Error as e:
+            print(f"获取新周期数据错误: {str(e)}")
+            return []
+    
+    def get_cycle_data_by_time(self, start_time, end_time, channel=None):
+        """根据时间范围获取周期数据（start_time/end_time为时间戳字符串、datetime或epoch微秒）"""
+        if not self.connected:
+            return []
+            
+        try:
+            where, params = self._channel_filter(channel, "AND")
+            return self._fetchall(
+                f"SELECT {CYCLE_COLUMNS} FROM cycle_data WHERE time_us BETWEEN ? AND ? {where} "
+                f"ORDER BY time_us, id",
+                (timestamp_to_us(start_time), timestamp_to_us(end_time)) + params
+            )
+        except (sqlite3.Error, ValueError) as e:
+            print(f"根据时间范围获取周期数据错误: {str(e)}")
+            return []
+    
+    def get_rollup(self, start_time, end_time, channel=None, points=500, resolution=None):
+        """查询时间范围内的预聚合数据
+
+        根据points选择时间桶数不超过该值的最细分辨率（见rollups.choose_resolution），
+        返回包含time_us、cycle_count、pulse_count和bin_max/bin_mean/bin_count数组的字典
+        """
+        try:
+            start_us, end_us = timestamp_to_us(start_time), timestamp_to_us(end_time)
+            resolution = resolution or choose_resolution(start_us, end_us, points)
+            if not self.connected:
+                return merge_rollup_rows([], resolution)
+            rows = self._read(lambda conn: fetch_rollup_rows(conn, resolution, start_us, end_us, channel))
+            return merge_rollup_rows(rows, resolution)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"查询预聚合数据错误: {str(e)}")
+            return None
+    
+    def close(self):
+        """关闭数据库连接"""
+        if self.connected:
+            try:
+                with self._readers_lock:
+                    for conn in self._readers:
+                        conn.close()
+                    self._readers.clear()
+                with self.lock:
+                    if self.conn is not None:
+                        self.conn.close()
+                self.connected = False
+                print("数据库连接已关闭")
+            except sqlite3.Error as e:
+                print(f"关闭数据库连接错误: {str(e)}")
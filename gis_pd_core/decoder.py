@@ -0,0 +1,62 @@
+"""MQTT负载解码模块
+
+传感器负载为连续的大端16位ADC码，每个码按 码值 * 3.3 / 4096 转换为毫伏值并保留两位小数，
+前4个和最后1个数据为帧头/帧尾。本模块不依赖Qt，GUI与无界面采集程序共用同一解码路径。
+"""
+import numpy as np
+
+# ADC满量程参数
+ADC_REFERENCE = 3.3
+ADC_RESOLUTION = 4096
+
+# 帧头、帧尾包含的数据个数
+HEADER_SAMPLES = 4
+TRAILER_SAMPLES = 1
+
+
+def _build_mv_table():
+    """构建16位码值到毫伏值的查找表
+
+    直接使用与原逐点解析完全相同的表达式 round(码值 * 3.3 / 4096, 2) 生成，
+    因此查表结果与原实现逐位一致（numpy的round与Python内置round舍入方式不同，不能混用）。
+    """
+    return np.array(
+        [round(code * ADC_REFERENCE / ADC_RESOLUTION, 2) for code in range(65536)],
+        dtype=np.float64,
+    )
+
+
+# 码值 -> 毫伏值 查找表（65536项，约512KB）
+MV_TABLE = _build_mv_table()
+MV_TABLE.setflags(write=False)
+
+
+def payload_to_codes(payload):
+    """将原始负载转换为去掉帧头帧尾后的uint16码值数组
+
+    Args:
+        payload: MQTT消息负载(bytes/bytearray/memoryview)
+
+    Returns:
+        np.ndarray: 大端解析后的码值数组(dtype=uint16)，奇数长度负载的最后一个字节被忽略
+    """
+    count = len(payload) // 2
+    codes = np.frombuffer(payload, dtype='>u2', count=count)
+    return codes[HEADER_SAMPLES:count - TRAILER_SAMPLES].astype(np.uint16)
+
+
+def codes_to_mv(codes):
+    """将码值数组转换为毫伏值数组（保留两位小数）"""
+    return MV_TABLE[np.asarray(codes, dtype=np.uint16)]
+
+
+def decode_payload(payload):
+    """解码一条MQTT消息负载为一个周期的毫伏值数组
+
+    Args:
+        payload: MQTT消息负载(bytes)
+
+    Returns:
+        np.ndarray: 周期数据(dtype=float64)，与原十六进制逐点解析结果逐位一致
+    """
+    return codes_to_mv(payload_to_codes(payload))
@@ -0,0 +1,168 @@
+"""周期数据批量导出
+
+将一个时间范围内的周期数据导出为一个NumPy .npy文件，数组的每个元素是一条记录
+（结构化数组），字段为：
+
+    id            int64   数据库中的id
+    time_us       int64   时间（epoch微秒）
+    cycle_number  int64   周期编号
+    channel       S64     通道ID（UTF-8编码）
+    length        int32   原周期的采样点数
+    data          float64/float32 (points,)  周期数据，点数不足时以NaN补齐，超出时截断
+
+.npy文件可以直接内存映射，几GB的导出文件也不需要读入内存：
+
+    arr = np.load("export.npy", mmap_mode="r")
+    cycles = arr["data"]        # (周期数, 点数) 的二维数组视图
+    times = arr["time_us"]
+
+导出时先统计行数确定数组形状，再按 (time_us, id) 分块读取和写入，内存占用只与块大小有关。
+"""
+import io
+
+import numpy as np
+
+from .codec import decode_cycles
+from .pagination import OLDEST_FIRST, page_query
+from .sqlite_config import connect
+
+# 每块读取的周期数
+EXPORT_CHUNK_SIZE = 5000
+# 通道ID字段的字节数
+CHANNEL_BYTES = 64
+# 周期数据可选的保存类型
+EXPORT_DTYPES = ("float64", "float32")
+
+
+def export_dtype(points, value_dtype="float64"):
+    """导出文件的记录类型"""
+    return np.dtype([
+        ("id", "<i8"),
+        ("time_us", "<i8"),
+        ("cycle_number", "<i8"),
+        ("channel", f"S{CHANNEL_BYTES}"),
+        ("length", "<i4"),
+        ("data", np.dtype(value_dtype).newbyteorder("<"), (points,)),
+    ])
+
+
+class CycleExport:
+    """一次周期数据导出（按时间顺序读取一个或多个数据库文件）"""
+    def __init__(self, db_paths, start_us, end_us, channel=None, points=None, value_dtype="float64",
+                 chunk_size=EXPORT_CHUNK_SIZE):
+        """统计导出的行数并确定每个周期的点数
+
+        Args:
+            db_paths: 数据库文件路径列表，按时间升序（分区存储传入与时间范围重叠的分区）
+            start_us, end_us: 时间范围（epoch微秒，闭区间）
+            channel: 通道ID，None表示所有通道
+            points: 每个周期的点数，None表示使用时间范围内第一个周期的点数
+            value_dtype: 周期数据的保存类型，"float64" 或 "float32"
+        """
+        if value_dtype not in EXPORT_DTYPES:
+            raise ValueError(f"不支持的导出数据类型: {value_dtype}")
+        self.db_paths = list(db_paths)
+        self.time_range = (start_us, end_us)
+        self.channel = channel
+        self.chunk_size = chunk_size
+        self.count = 0
+        where = "WHERE time_us BETWEEN ? AND ?"
+        params = self.time_range
+        if channel is not None:
+            where += " AND channel = ?"
+            params += (channel,)
+        first = None
+        for path in self.db_paths:
+            conn = connect(path, read_only=True)
+            try:
+                self.count += conn.execute(f"SELECT COUNT(*) FROM cycle_data {where}", params).fetchone()[0]
+                if first is None and points is None:
+                    first = conn.execute(
+                        f"SELECT data FROM cycle_data {where} ORDER BY time_us, id LIMIT 1", params
+                    ).fetchone()
+            finally:
+                conn.close()
+        if points is None:
+            points = len(decode_cycles([first[0]])[0]) if first else 0
+        self.points = points
+        self.dtype = export_dtype(points, value_dtype)
+
+    @property
+    def nbytes(self):
+        """导出文件的总字节数"""
+        return len(self.header()) + self.count * self.dtype.itemsize
+
+    def header(self):
+        """.npy文件头"""
+        buffer = io.BytesIO()
+        np.lib.format.write_array_header_1_0(buffer, {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (self.count,),
+        })
+        return buffer.getvalue()
+
+    def _rows(self):
+        """按 (time_us, id) 顺序分块读取，每次产生一块数据库行"""
+        for path in self.db_paths:
+            conn = connect(path, read_only=True)
+            try:
+                position = None
+                while True:
+                    sql, params = page_query("cycle_data", "id, cycle_number, channel, data", position,
+                                             OLDEST_FIRST, self.channel, self.chunk_size, self.time_range)
+                    rows = conn.execute(sql, params).fetchall()[:self.chunk_size]
+                    if not rows:
+                        break
+                    yield rows
+                    if len(rows) < self.chunk_size:
+                        break
+                    position = (rows[-1][-1], rows[-1][0])
+            finally:
+                conn.close()
+
+    def chunks(self):
+        """按块产生导出记录（结构化数组），总行数不超过统计的行数"""
+        written = 0
+        for rows in self._rows():
+            rows = rows[:self.count - written]
+            if not rows:
+                break
+            chunk = np.zeros(len(rows), dtype=self.dtype)
+            chunk["id"] = [row[0] for row in rows]
+            chunk["cycle_number"] = [row[1] for row in rows]
+            chunk["channel"] = [row[2].encode("utf-8")[:CHANNEL_BYTES] for row in rows]
+            chunk["time_us"] = [row[4] for row in rows]
+            data = chunk["data"]
+            data[:] = np.nan
+            for i, values in enumerate(decode_cycles([row[3] for row in rows])):
+                chunk["length"][i] = len(values)
+                n = min(len(values), self.points)
+                data[i, :n] = values[:n]
+            written += len(rows)
+            yield chunk
+        if written < self.count:
+            # 导出过程中有数据被删除（例如分区过期），剩余记录保持为0
+            print(f"导出的周期数少于统计值: {written} < {self.count}")
+
+    def write(self, out_path):
+        """写入.npy文件（内存映射方式逐块写入），返回导出的周期数"""
+        array = np.lib.format.open_memmap(out_path, mode="w+", dtype=self.dtype, shape=(self.count,))
+        offset = 0
+        for chunk in self.chunks():
+            array[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        array.flush()
+        del array
+        return offset
+
+    def stream(self):
+        """按块产生.npy文件的字节内容（Web接口流式下载使用）"""
+        yield self.header()
+        written = 0
+        for chunk in self.chunks():
+            written += len(chunk)
+            yield chunk.tobytes()
+        if written < self.count:
+            # 补齐文件头中声明的长度
+            yield bytes((self.count - written) * self.dtype.itemsize)
@@ -0,0 +1,125 @@
+"""WebSocket二进制帧
+
+实时推送时把一批周期数据编码为一个二进制消息，代替每个采样点一个JSON数字的格式：
+采样点按float32（每点4字节）或uint16（每点2字节）连续存放，浏览器用类型化数组直接读取，不需要JSON.parse。
+
+帧格式（小端；每一段的起始位置按8字节对齐，浏览器可直接在ArrayBuffer上创建类型化数组视图）：
+
+    头部(40字节)   magic "GPD1"、version(u8)、sample_type(u8)、flags(u8)、保留(u8)、
+                  count(u32) 周期数、points(u32) 每周期点数、channels_bytes(u32) 通道表字节数、保留(4字节)、
+                  scale(f64)、offset(f64)
+    time_us        float64[count]  时间（epoch微秒，2^53以内为精确整数）
+    ids            float64[count]
+    cycle_numbers  float64[count]
+    lengths        uint32[count]   每个周期的实际点数（不足points的部分为NaN或NO_DATA）
+    channels       uint16[count]   通道在通道表中的序号
+    samples        float32[count * points] 或 uint16[count * points]
+    channel_table  UTF-8编码的JSON字符串数组
+
+sample_type为SAMPLE_UINT16时按帧内的最小值和最大值线性量化：值 = offset + code * scale，
+code为NO_DATA表示没有数据；量化误差不超过 (最大值 - 最小值) / 131068。
+flags的最低位为has_new_data。解码方法见decode_frame和static/js/main.js中的decodeCycleFrame。
+"""
+import json
+import struct
+
+import numpy as np
+
+from .database import timestamp_to_us
+
+FRAME_MAGIC = b"GPD1"
+FRAME_VERSION = 1
+SAMPLE_FLOAT32 = 0
+SAMPLE_UINT16 = 1
+# 采样点类型名称（WebSocket连接参数samples的取值）
+SAMPLE_TYPES = {"float32": SAMPLE_FLOAT32, "uint16": SAMPLE_UINT16}
+# uint16格式中表示没有数据的值
+NO_DATA = 0xFFFF
+FLAG_NEW_DATA = 0x01
+
+_HEADER = struct.Struct("<4sBBBBIII4xdd")
+
+
+def _pad(parts, size):
+    """补齐到8字节边界"""
+    if size % 8:
+        parts.append(bytes(8 - size % 8))
+        size += 8 - size % 8
+    return size
+
+
+def encode_frame(batch, sample_type="float32", has_new_data=False):
+    """将一批周期数据（query.CycleBatch）编码为二进制帧
+
+    Args:
+        batch: CycleBatch
+        sample_type: "float32" 或 "uint16"
+        has_new_data: 是否为新数据推送（初始数据为False）
+    """
+    if sample_type not in SAMPLE_TYPES:
+        raise ValueError(f"不支持的采样点类型: {sample_type}")
+    matrix = batch.matrix()
+    count, points = matrix.shape
+    scale, offset = 1.0, 0.0
+    if sample_type == "uint16":
+        valid = ~np.isnan(matrix)
+        if valid.any():
+            offset = float(matrix[valid].min())
+            scale = (float(matrix[valid].max()) - offset) / (NO_DATA - 1) or 1.0
+        samples = np.full(matrix.shape, NO_DATA, dtype="<u2")
+        samples[valid] = np.rint((matrix[valid] - offset) / scale)
+    else:
+        samples = matrix.astype("<f4")
+
+    channel_table = list(dict.fromkeys(batch.channels))
+    channel_index = {channel: i for i, channel in enumerate(channel_table)}
+    table_bytes = json.dumps(channel_table, ensure_ascii=False).encode("utf-8")
+
+    parts = [_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, SAMPLE_TYPES[sample_type],
+                          FLAG_NEW_DATA if has_new_data else 0, 0, count, points, len(table_bytes), scale, offset)]
+    size = _HEADER.size
+    for array in (
+        np.array([timestamp_to_us(t) for t in batch.timestamps], dtype="<f8"),
+        batch.ids.astype("<f8"),
+        batch.cycle_numbers.astype("<f8"),
+        np.array([len(values) for values in batch.values], dtype="<u4"),
+        np.array([channel_index[channel] for channel in batch.channels], dtype="<u2"),
+        samples,
+    ):
+        data = array.tobytes()
+        parts.append(data)
+        size = _pad(parts, size + len(data))
+    parts.append(table_bytes)
+    return b"".join(parts)
+
+
+def decode_frame(frame):
+    """解码二进制帧，返回字典：time_us、ids、cycle_numbers、lengths（数组）、channels（列表）、
+    values（(count, points) 的float64矩阵，没有数据的点为NaN）、has_new_data"""
+    magic, version, sample_type, flags, _, count, points, table_size, scale, offset = _HEADER.unpack_from(frame)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("无效的二进制帧")
+    position = _HEADER.size
+    arrays = []
+    sample_dtype = "<f4" if sample_type == SAMPLE_FLOAT32 else "<u2"
+    for dtype, n in (("<f8", count), ("<f8", count), ("<f8", count), ("<u4", count), ("<u2", count),
+                     (sample_dtype, count * points)):
+        arrays.append(np.frombuffer(frame, dtype=dtype, count=n, offset=position))
+        position += arrays[-1].nbytes
+        position += -position % 8
+    time_us, ids, cycle_numbers, lengths, channel_index, samples = arrays
+    channel_table = json.loads(bytes(frame[position:position + table_size]).decode("utf-8"))
+    if sample_type == SAMPLE_UINT16:
+        values = offset + samples.astype(np.float64) * scale
+        values[samples == NO_DATA] = np.nan
+    else:
+        values = samples.astype(np.float64)
+    return {
+        "time_us": time_us.astype(np.int64),
+        "ids": ids.astype(np.int64),
+        "cycle_numbers": cycle_numbers.astype(np.int64),
+        "lengths": lengths,
+        "channels": [channel_table[i] for i in channel_index],
+        "values": values.reshape(count, points),
+        "has_new_data": bool(flags & FLAG_NEW_DATA),
+    }
@@ -0,0 +1,244 @@
+"""数据库维护工具（不依赖PySide6）
+
+用法：
+    python gis_pd_maintenance.py migrate-cycles --db gis_pd_data.db --vacuum
+    python gis_pd_maintenance.py migrate-cycles --codec delta-zlib --vacuum
+    python gis_pd_maintenance.py migrate-raw --compression zlib --vacuum
+    python gis_pd_maintenance.py backfill-time
+    python gis_pd_maintenance.py rebuild-rollups
+    python gis_pd_maintenance.py repair-stats
+    python gis_pd_maintenance.py export --start "2024-01-01 00:00:00" --end "2024-01-02 00:00:00" --out cycles.npy
+
+子命令：
+    migrate-cycles  将旧版本以逗号分隔文本保存的周期数据就地转换为二进制格式，
+                    指定--codec时同时将全部周期数据转换为该编码方式，并保存为数据库设置
+    migrate-raw     将旧版本以十六进制文本保存的原始数据转换为字节格式，可同时更改压缩方式
+    backfill-time   为升级前写入的数据回填整数时间列time_us（程序打开旧数据库时也会自动回填）
+    rebuild-rollups 根据周期数据重新生成1秒/1分钟/1小时预聚合表（旧数据库升级后运行一次）
+    repair-stats    重新计算行数和时间范围统计表（统计值与数据不一致时使用）
+    export          将时间范围内的周期数据导出为可内存映射的.npy文件（只读，不修改数据库）
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from .codec import (encode_cycle, decode_cycles, cycle_codec_of, encode_raw, decode_raw,
+                    CYCLE_CODECS, RAW_COMPRESSIONS, RAW_MAGIC)
+from .database import get_application_path, timestamp_to_us
+from .export import CycleExport, EXPORT_CHUNK_SIZE, EXPORT_DTYPES
+from .partitions import PartitionedStore, PERIODS
+from .rollups import rebuild_rollups
+from .schema import ensure_schema, backfill_time_us, set_setting, CYCLE_CODEC_SETTING
+from .stats import rebuild_stats
+from .sqlite_config import connect
+
+
+def open_database(db_path):
+    """打开数据库并升级表结构（time_us由backfill-time子命令分块回填）"""
+    conn = connect(db_path)
+    ensure_schema(conn, backfill=False)
+    return conn
+
+
+def vacuum(conn):
+    """重写数据库文件，回收已释放的空间"""
+    print("正在整理数据库文件（VACUUM）...")
+    conn.execute("VACUUM")
+
+
+def migrate_cycles(conn, chunk_size=1000, codec=None):
+    """将文本格式的周期数据就地转换为二进制格式
+
+    按id分块处理，每块一个事务，中断后重新运行会从未转换的数据继续。
+
+    Args:
+        codec: 目标编码方式（codec.CYCLE_CODECS中的名称），指定时转换所有编码方式不同的数据，
+            并保存为数据库设置；None时只转换文本格式的数据（使用不压缩的二进制格式）
+
+    Returns:
+        转换的行数
+    """
+    if codec is not None:
+        set_setting(conn, CYCLE_CODEC_SETTING, codec)
+    target = codec or "none"
+    # 只转换文本数据时利用typeof过滤，不读取已是二进制的数据
+    text_only = "" if codec else "AND typeof(data) = 'text'"
+    converted = 0
+    last_id = 0
+    start = time.monotonic()
+    while True:
+        rows = conn.execute(
+            f"SELECT id, data FROM cycle_data WHERE id > ? {text_only} ORDER BY id LIMIT ?",
+            (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        rows = [(row_id, data) for row_id, data in rows if cycle_codec_of(data) != target]
+        if rows:
+            values = decode_cycles([data for _, data in rows])
+            conn.executemany(
+                "UPDATE cycle_data SET data = ? WHERE id = ?",
+                [(encode_cycle(data, target), row_id) for data, (row_id, _) in zip(values, rows)]
+            )
+            conn.commit()
+            converted += len(rows)
+            print(f"已转换 {converted} 条周期数据（id <= {last_id}）")
+    print(f"周期数据转换完成: {converted} 条, 耗时 {time.monotonic() - start:.1f} 秒")
+    return converted
+
+
+def _raw_needs_rewrite(blob, method):
+    """判断原始数据是否需要重写（旧版本文本格式或压缩方式不同）"""
+    if isinstance(blob, str) or bytes(blob[:2]) != RAW_MAGIC:
+        return True
+    return blob[3] != method
+
+
+def migrate_raw(conn, compression=None, chunk_size=1000):
+    """将原始数据就地转换为字节格式，并统一为指定的压缩方式
+
+    按id分块处理，每块一个事务，已是目标格式的行不会重写。
+
+    Returns:
+        转换的行数
+    """
+    method = RAW_COMPRESSIONS[compression]
+    converted = 0
+    last_id = 0
+    start = time.monotonic()
+    while True:
+        rows = conn.execute(
+            "SELECT id, raw_data FROM raw_data WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = [
+            (encode_raw(decode_raw(blob), compression), row_id)
+            for row_id, blob in rows if _raw_needs_rewrite(blob, method)
+        ]
+        if updates:
+            conn.executemany("UPDATE raw_data SET raw_data = ? WHERE id = ?", updates)
+            conn.commit()
+            converted += len(updates)
+            print(f"已转换 {converted} 条原始数据（id <= {last_id}）")
+    print(f"原始数据转换完成: {converted} 条, 耗时 {time.monotonic() - start:.1f} 秒")
+    return converted
+
+
+def export_cycles(db_path, args):
+    """export子命令：只读打开数据库（或分区目录），导出时间范围内的周期数据"""
+    try:
+        start_us, end_us = timestamp_to_us(args.start), timestamp_to_us(args.end)
+    except ValueError as e:
+        print(f"时间格式错误: {str(e)}")
+        return 1
+    if args.partition:
+        store = PartitionedStore(db_path, args.partition, read_only=True)
+        paths = [p.path for p in store.partitions_for_range(start_us, end_us)]
+    else:
+        paths = [db_path]
+    try:
+        start = time.monotonic()
+        export = CycleExport(paths, start_us, end_us, args.channel, args.points, args.dtype, args.chunk_size)
+        print(f"导出 {export.count} 个周期 x {export.points} 点（{args.dtype}），"
+              f"文件大小 {export.nbytes / 1024 / 1024:.2f} MB")
+        count = export.write(args.out)
+        print(f"导出完成: {args.out}，{count} 个周期, 耗时 {time.monotonic() - start:.1f} 秒")
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"导出周期数据错误: {str(e)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GIS局部放电数据库维护工具")
+    parser.add_argument("--db", default=None, help="数据库文件路径（默认为程序目录下的gis_pd_data.db）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate-cycles", help="将文本格式的周期数据转换为二进制格式")
+    migrate_parser.add_argument("--chunk-size", type=int, default=1000, help="每个事务转换的行数")
+    migrate_parser.add_argument("--codec", default=None, choices=tuple(CYCLE_CODECS),
+                                help="转换为指定的编码方式，并作为之后写入数据的编码方式")
+    migrate_parser.add_argument("--vacuum", action="store_true", help="转换后整理数据库文件以回收空间")
+
+    raw_parser = subparsers.add_parser("migrate-raw", help="将十六进制文本格式的原始数据转换为字节格式并压缩")
+    raw_parser.add_argument("--compression", default=None, choices=("zlib",), help="原始数据的压缩方式（默认不压缩）")
+    raw_parser.add_argument("--chunk-size", type=int, default=1000, help="每个事务转换的行数")
+    raw_parser.add_argument("--vacuum", action="store_true", help="转换后整理数据库文件以回收空间")
+
+    backfill_parser = subparsers.add_parser("backfill-time", help="为旧数据回填整数时间列time_us")
+    backfill_parser.add_argument("--chunk-size", type=int, default=50000, help="每个事务回填的行数")
+    backfill_parser.add_argument("--vacuum", action="store_true", help="回填后整理数据库文件")
+
+    rollup_parser = subparsers.add_parser("rebuild-rollups", help="重新生成预聚合表")
+    rollup_parser.add_argument("--chunk-size", type=int, default=2000, help="每个事务处理的周期数")
+
+    subparsers.add_parser("repair-stats", help="重新计算行数和时间范围统计表")
+
+    export_parser = subparsers.add_parser("export", help="将时间范围内的周期数据导出为.npy文件")
+    export_parser.add_argument("--start", required=True, help="开始时间，如 \"2024-01-01 00:00:00\"")
+    export_parser.add_argument("--end", required=True, help="结束时间（包含）")
+    export_parser.add_argument("--out", required=True, help="导出文件路径（.npy）")
+    export_parser.add_argument("--channel", default=None, help="只导出指定通道")
+    export_parser.add_argument("--points", type=int, default=None,
+                               help="每个周期的点数（默认使用第一个周期的点数，不足补NaN，超出截断）")
+    export_parser.add_argument("--dtype", default="float64", choices=EXPORT_DTYPES, help="周期数据的保存类型")
+    export_parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="每次读取的周期数")
+    export_parser.add_argument("--partition", default=None, choices=PERIODS,
+                               help="--db为分区存储目录时指定分区周期")
+
+    args = parser.parse_args(argv)
+    db_path = args.db or os.path.join(get_application_path(), "gis_pd_data.db")
+    if not os.path.exists(db_path):
+        print(f"数据库文件不存在: {db_path}")
+        return 1
+    if args.command == "export":
+        return export_cycles(db_path, args)
+
+    conn = open_database(db_path)
+    try:
+        size_before = os.path.getsize(db_path)
+        if args.command == "migrate-cycles":
+            migrate_cycles(conn, args.chunk_size, args.codec)
+        elif args.command == "migrate-raw":
+            migrate_raw(conn, args.compression, args.chunk_size)
+        elif args.command == "backfill-time":
+            start = time.monotonic()
+            for table in ("cycle_data", "raw_data"):
+                count = backfill_time_us(conn, table, args.chunk_size)
+                print(f"{table}: 回填 {count} 行")
+            # 统计表中的时间范围依赖time_us列
+            rebuild_stats(conn)
+            print(f"回填完成, 耗时 {time.monotonic() - start:.1f} 秒")
+        elif args.command == "rebuild-rollups":
+            start = time.monotonic()
+            # 聚合依赖time_us列，先完成回填
+            for table in ("cycle_data", "raw_data"):
+                backfill_time_us(conn, table)
+            count = rebuild_rollups(conn, decode_cycles, args.chunk_size)
+            print(f"预聚合表生成完成: {count} 个周期, 耗时 {time.monotonic() - start:.1f} 秒")
+        elif args.command == "repair-stats":
+            start = time.monotonic()
+            for table in ("cycle_data", "raw_data"):
+                backfill_time_us(conn, table)
+            for row in rebuild_stats(conn):
+                print(f"{row[0]} 通道 {row[1] or '(未标记)'}: {row[2]} 行, {row[4]} ~ {row[6]}, 最大id {row[7]}")
+            print(f"统计表重新计算完成, 耗时 {time.monotonic() - start:.1f} 秒")
+        if getattr(args, "vacuum", False):
+            vacuum(conn)
+        size_after = os.path.getsize(db_path)
+        print(f"数据库文件大小: {size_before / 1024 / 1024:.2f} MB -> {size_after / 1024 / 1024:.2f} MB")
+    except sqlite3.Error as e:
+        print(f"数据库维护错误: {str(e)}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,227 @@
+"""MQTT数据接收模块（不依赖Qt）
+
+封装paho客户端的创建、连接、订阅和消息解码。可同时订阅多个主题（支持+/#通配符），
+每条消息按主题映射到一个通道，解码后的周期数据写入该通道独立的环形缓冲区，
+由GUI定时器或无界面采集程序批量取出。断线后由paho网络循环按退避间隔自动重连，
+重连成功后在on_connect中重新订阅。
+"""
+import collections
+import datetime
+import threading
+
+import paho.mqtt.client as mqtt
+
+from .decoder import decode_payload
+from .ring_buffer import RingBuffer, DROP_OLDEST
+
+# 接收到的一个周期：接收时间(datetime)、通道ID、主题、周期数据(毫伏值数组，float64)
+ReceivedCycle = collections.namedtuple("ReceivedCycle", ["timestamp", "channel", "topic", "data"])
+
+
+class MQTTIngestClient:
+    """MQTT接收客户端
+
+    回调属性（均在paho网络线程中调用）：
+        on_status(connected, message): 连接状态变化
+        on_raw(broker, topic, payload, timestamp, channel): 收到原始负载(bytes)
+    """
+    def __init__(self, broker_address="192.168.16.135", broker_port=1883, topics=("pub1",), qos=1,
+                 queue_size=1000, overflow_policy=DROP_OLDEST, block_timeout=0.5, channel_map=None):
+        """初始化接收客户端
+
+        Args:
+            broker_address: Broker地址
+            broker_port: Broker端口
+            topics: 订阅的主题列表，支持MQTT通配符
+            qos: 订阅的QoS等级
+            queue_size: 每个通道的周期数据环形缓冲区容量
+            overflow_policy: 缓冲区满时的策略
+            block_timeout: 阻塞策略下的最长等待时间(秒)
+            channel_map: 主题到通道ID的映射，未映射的主题以主题名作为通道ID
+        """
+        self.broker_address = broker_address
+        self.broker_port = int(broker_port)
+        self.topics = list(topics)
+        self.qos = qos
+        self.connected = False
+
+        self.channel_map = dict(channel_map or {})
+
+        # 每个通道一个环形缓冲区，收到该通道的第一条消息时创建
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.buffers = {}
+        self._buffers_lock = threading.Lock()
+        self._closed = False
+
+        self.on_status = None
+        self.on_raw = None
+
+        self.client = self._create_client()
+
+    def _create_client(self):
+        """创建paho客户端并绑定回调"""
+        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        client.on_connect = self._on_connect
+        client.on_message = self._on_message
+        client.on_disconnect = self._on_disconnect
+        # 断线后由网络循环自动重连，重连间隔在1~30秒之间指数退避
+        client.reconnect_delay_set(min_delay=1, max_delay=30)
+        return client
+
+    def connect(self, broker_address=None, broker_port=None, topics=None, blocking=True):
+        """连接到Broker（每次连接都重新创建paho客户端，确保状态干净）
+
+        Args:
+            blocking: 为True时立即同步连接，连接失败抛出异常；
+                      为False时只记录连接参数，由网络循环异步连接并在失败后持续重试
+        """
+        if broker_address is not None:
+            self.broker_address = broker_address
+        if broker_port is not None:
+            self.broker_port = int(broker_port)
+        if topics is not None:
+            self.topics = list(topics)
+
+        if not self.topics:
+            raise ValueError("至少需要订阅一个主题")
+
+        self.client = self._create_client()
+        with self._buffers_lock:
+            self._closed = False
+            for buffer in self.buffers.values():
+                buffer.reopen()
+        if blocking:
+            self.client.connect(self.broker_address, self.broker_port)
+        else:
+            self.client.connect_async(self.broker_address, self.broker_port)
+        return self.client
+
+    def loop_forever(self):
+        """在当前线程运行网络循环，直到调用disconnect()"""
+        self.client.loop_forever(retry_first_connection=True)
+
+    def loop_start(self):
+        """在paho后台线程中运行网络循环"""
+        self.client.loop_start()
+
+    def disconnect(self):
+        """断开连接并停止网络循环，唤醒可能因阻塞策略而等待的网络线程"""
+        self.connected = False
+        with self._buffers_lock:
+            self._closed = True
+            for buffer in self.buffers.values():
+                buffer.close()
+        try:
+            self.client.disconnect()
+        finally:
+            self.client.loop_stop()
+
+    def channel_for_topic(self, topic):
+        """获取主题对应的通道ID"""
+        return self.channel_map.get(topic, topic)
+
+    def get_buffer(self, channel):
+        """获取通道的环形缓冲区，不存在时创建"""
+        buffer = self.buffers.get(channel)
+        if buffer is None:
+            with self._buffers_lock:
+                buffer = self.buffers.get(channel)
+                if buffer is None:
+                    buffer = RingBuffer(self.queue_size, self.overflow_policy, self.block_timeout)
+                    if self._closed:
+                        buffer.close()
+                    self.buffers[channel] = buffer
+        return buffer
+
+    def get_channels(self):
+        """获取已收到数据的通道ID列表"""
+        with self._buffers_lock:
+            return list(self.buffers.keys())
+
+    def drain(self, channel=None, max_items=None):
+        """批量取出已接收的周期数据
+
+        Args:
+            channel: 通道ID，None表示取出所有通道的数据
+            max_items: 每个通道最多取出的条数，None表示全部取出
+
+        Returns:
+            list: ReceivedCycle列表，同一通道内按接收顺序排列
+        """
+        if channel is not None:
+            buffer = self.buffers.get(channel)
+            return buffer.drain(max_items) if buffer is not None else []
+
+        batch = []
+        with self._buffers_lock:
+            buffers = list(self.buffers.values())
+        for buffer in buffers:
+            batch.extend(buffer.drain(max_items))
+        return batch
+
+    def clear(self):
+        """清空所有通道的缓冲区"""
+        with self._buffers_lock:
+            for buffer in self.buffers.values():
+                buffer.clear()
+
+    def get_queue_stats(self):
+        """获取缓冲区统计信息（所有通道汇总）"""
+        stats = {
+            "depth": 0,
+            "capacity": 0,
+            "peak_depth": 0,
+            "put_count": 0,
+            "dropped_count": 0,
+            "overflow_policy": self.overflow_policy,
+            "channels": {},
+        }
+        with self._buffers_lock:
+            buffers = dict(self.buffers)
+        for channel, buffer in buffers.items():
+            channel_stats = buffer.get_stats()
+            stats["channels"][channel] = channel_stats
+            stats["depth"] += channel_stats["depth"]
+            stats["capacity"] += channel_stats["capacity"]
+            stats["peak_depth"] = max(stats["peak_depth"], channel_stats["peak_depth"])
+            stats["put_count"] += channel_stats["put_count"]
+            stats["dropped_count"] += channel_stats["dropped_count"]
+        return stats
+
+    def _emit_status(self, connected, message):
+        if self.on_status is not None:
+            self.on_status(connected, message)
+
+    def _on_connect(self, client, userdata, flags, rc, properties):
+        """连接回调函数，每次（重新）连接成功后重新订阅全部主题"""
+        if rc == 0:
+            self.connected = True
+            client.subscribe([(topic, self.qos) for topic in self.topics])
+            self._emit_status(True, f"已连接到 {self.broker_address}:{self.broker_port}")
+        else:
+            self.connected = False
+            self._emit_status(False, f"连接失败，返回码: {rc}")
+
+    def _on_disconnect(self, client, userdata, rc, properties=None, *args):
+        """断开连接回调函数"""
+        self.connected = False
+        self._emit_status(False, "已断开连接")
+
+    def _on_message(self, client, userdata, msg):
+        """消息接收回调函数"""
+        try:
+            timestamp = datetime.datetime.now()
+            channel = self.channel_for_topic(msg.topic)
+            if self.on_raw is not None:
+                self.on_raw(self.broker_address, msg.topic, msg.payload, timestamp, channel)
+
+            # 向量化解码：按大端uint16读取负载，查表转换为毫伏值并去掉帧头帧尾；
+            # 数组直接交给写库线程编码，不再转换为Python列表
+            data = decode_payload(msg.payload)
+
+            # 写入该通道的缓冲区，缓冲区满时按溢出策略处理，丢弃数量记录在统计信息中
+            self.get_buffer(channel).put(ReceivedCycle(timestamp, channel, msg.topic, data))
+        except Exception as e:
+            print(f"消息处理错误: {str(e)}")
@@ -0,0 +1,72 @@
+"""新数据通知
+
+写入端（GUI、采集程序）每提交一批数据后向本机UDP端口发送一个很小的数据报，Web服务监听该端口，
+收到后立即读取新数据并推送给浏览器，不必等待下一次轮询。数据报只是提示：没有监听者时直接丢弃，
+丢失时Web服务仍按轮询间隔检查新数据（兜底），所以通知不影响数据的正确性。
+
+使用回环地址上的UDP而不是Unix数据报套接字或命名管道，Windows和Linux上用法相同。
+端口由环境变量GIS_PD_NOTIFY_PORT指定（写入端和Web服务需一致），0表示不发送/不监听。
+"""
+import asyncio
+import os
+import socket
+
+NOTIFY_HOST = "127.0.0.1"
+NOTIFY_PORT = 47651
+NOTIFY_ENV = "GIS_PD_NOTIFY_PORT"
+# 数据报内容（监听端忽略其他内容的数据报）
+NOTIFY_MESSAGE = b"gis_pd:commit"
+
+
+def notify_port(port=None):
+    """通知端口：port为None时读取环境变量GIS_PD_NOTIFY_PORT，未设置时为NOTIFY_PORT；0表示不通知"""
+    if port is None:
+        port = os.environ.get(NOTIFY_ENV, NOTIFY_PORT)
+    return int(port)
+
+
+class ChangeNotifier:
+    """写入端：提交数据后发送通知数据报（非阻塞，发送失败时忽略）"""
+    def __init__(self, port=None, host=NOTIFY_HOST):
+        self.address = (host, notify_port(port))
+        self.sock = None
+        if self.address[1]:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.setblocking(False)
+
+    def notify(self):
+        if self.sock is None:
+            return
+        try:
+            self.sock.sendto(NOTIFY_MESSAGE, self.address)
+        except OSError:
+            # 没有监听者、发送缓冲区已满等情况下丢弃通知，Web服务按轮询间隔兜底
+            pass
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class ChangeListener(asyncio.DatagramProtocol):
+    """监听端：收到通知数据报时调用callback()（在事件循环中调用）"""
+    def __init__(self, callback):
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        if data == NOTIFY_MESSAGE:
+            self.callback()
+
+
+async def listen(callback, port=None, host=NOTIFY_HOST):
+    """开始监听通知，返回transport（停止时调用transport.close()）；端口为0时返回None
+
+    端口已被占用（例如另一个Web服务进程）时抛出OSError。
+    """
+    port = notify_port(port)
+    if not port:
+        return None
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: ChangeListener(callback), local_addr=(host, port))
+    return transport
@@ -0,0 +1,87 @@
+"""基于 (time_us, id) 的游标分页（keyset pagination）
+
+LIMIT/OFFSET分页需要先跳过前面的offset行，翻到第N页的耗时随N线性增长。
+游标分页记住上一页最后一行的 (time_us, id)，下一页直接在 (time_us) 或
+(channel, time_us) 索引上从该位置继续读取，每一页的耗时与页码无关。
+
+游标是不透明的字符串（URL安全的base64），包含格式版本、排序方向和最后一行的
+(time_us, id)，客户端只需原样传回。id全局唯一（分区存储中跨分区也不重复），
+因此time_us相同的行也能准确地从上次的位置继续。
+"""
+import base64
+import binascii
+import struct
+
+# 排序方向
+NEWEST_FIRST = "desc"
+OLDEST_FIRST = "asc"
+ORDERS = (NEWEST_FIRST, OLDEST_FIRST)
+
+CURSOR_VERSION = 1
+# 游标内容：格式版本、排序方向（0为倒序，1为正序）、time_us、id
+_CURSOR = struct.Struct("<BBqq")
+
+
+def encode_cursor(time_us, row_id, order=NEWEST_FIRST):
+    """将一行的位置编码为游标字符串"""
+    packed = _CURSOR.pack(CURSOR_VERSION, ORDERS.index(order), time_us, row_id)
+    return base64.urlsafe_b64encode(packed).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """解析游标字符串，返回 (time_us, id, order)，游标无效时抛出ValueError"""
+    try:
+        packed = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        version, order, time_us, row_id = _CURSOR.unpack(packed)
+    except (binascii.Error, struct.error, UnicodeEncodeError):
+        raise ValueError(f"无效的分页游标: {cursor}")
+    if version != CURSOR_VERSION or order >= len(ORDERS):
+        raise ValueError(f"不支持的分页游标: {cursor}")
+    return time_us, row_id, ORDERS[order]
+
+
+def page_query(table, columns, after=None, order=NEWEST_FIRST, channel=None, limit=100, time_range=None):
+    """生成一页数据的查询语句
+
+    多查询一行用于判断是否还有下一页；结果的最后一列为time_us，供split_page生成游标。
+
+    Args:
+        table: 表名
+        columns: 查询的列（第一列必须为id）
+        after: 上一页最后一行的 (time_us, id)，None表示第一页
+        order: NEWEST_FIRST 或 OLDEST_FIRST
+        channel: 通道ID，None表示所有通道
+        time_range: (start_us, end_us) 闭区间，None表示不限制时间
+
+    Returns:
+        (sql, params)
+    """
+    if order not in ORDERS:
+        raise ValueError(f"不支持的排序方向: {order}")
+    conditions, params = [], []
+    if channel is not None:
+        conditions.append("channel = ?")
+        params.append(channel)
+    if time_range is not None:
+        conditions.append("time_us BETWEEN ? AND ?")
+        params += list(time_range)
+    if after is not None:
+        # 第一个条件可直接用于索引范围查找，第二个条件排除time_us相同但已经读过的行
+        op = "<" if order == NEWEST_FIRST else ">"
+        time_us, row_id = after
+        conditions.append(f"time_us {op}= ? AND (time_us {op} ? OR id {op} ?)")
+        params += [time_us, time_us, row_id]
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    direction = "DESC" if order == NEWEST_FIRST else "ASC"
+    sql = (f"SELECT {columns}, time_us FROM {table} {where} "
+           f"ORDER BY time_us {direction}, id {direction} LIMIT ?")
+    return sql, tuple(params) + (limit + 1,)
+
+
+def split_page(rows, limit, order=NEWEST_FIRST):
+    """截取一页数据并生成下一页的游标（没有更多数据时游标为None）"""
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    last = rows[-1]
+    return rows, encode_cursor(last[-1], last[0], order)
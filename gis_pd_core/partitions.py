@@ -0,0 +1,592 @@
+"""按时间分区的数据库存储
+
+数据按天或按周写入独立的SQLite文件（分区），文件名中包含分区的起始日期：
+
+    gis_pd_20240501.db      按天分区
+    gis_pd_2024-W18.db      按周分区（ISO周）
+
+每个分区都是表结构完整的普通数据库，可以单独拷贝和查看。按时间范围查询时只打开
+与范围重叠的分区；超过保留期的数据直接删除整个分区文件，不需要DELETE和VACUUM，
+数据库运行一年后写入延迟和查询耗时也不会变化。
+
+PartitionedStore提供与DatabaseManager相同的写入和查询方法，可直接交给BatchWriter、
+采集程序和Web服务使用。跨分区的id保持递增且不重复（新分区的自增序列从已有的最大id继续）。
+"""
+import datetime
+import glob
+import os
+import re
+import sqlite3
+import threading
+
+from .database import DatabaseManager, format_timestamp, timestamp_to_us, CHANNELS_SQL
+from .pagination import NEWEST_FIRST, decode_cursor, page_query, split_page
+from .rollups import fetch_rollup_rows, merge_rollup_rows, choose_resolution
+from .schema import CYCLE_COLUMNS, RAW_COLUMNS, CYCLE_CODEC_SETTING, get_setting
+from .stats import STATS_TABLES, read_stats_rows, merge_stats
+from .sqlite_config import connect
+
+# 分区周期
+DAY = "day"
+WEEK = "week"
+PERIODS = (DAY, WEEK)
+
+# 分区文件名前缀
+PARTITION_PREFIX = "gis_pd_"
+
+# 同时保持打开的写入分区数（当前分区和前一个分区，用于接收跨越分区边界的数据）
+MAX_OPEN_WRITERS = 2
+
+_PATTERNS = {
+    DAY: re.compile(r"^%s(\d{8})\.db$" % PARTITION_PREFIX),
+    WEEK: re.compile(r"^%s(\d{4})-W(\d{2})\.db$" % PARTITION_PREFIX),
+}
+
+
+class Partition:
+    """一个分区文件及其覆盖的时间范围 [start_us, end_us)"""
+    def __init__(self, key, path, start, end):
+        self.key = key
+        self.path = path
+        self.start = start
+        self.end = end
+        self.start_us = timestamp_to_us(start)
+        self.end_us = timestamp_to_us(end)
+
+    def overlaps(self, start_us, end_us):
+        """判断分区是否与闭区间 [start_us, end_us] 重叠"""
+        return self.start_us <= end_us and self.end_us > start_us
+
+    def __repr__(self):
+        return f"Partition({self.key!r})"
+
+
+def partition_start(dt, period):
+    """获取时间所在分区的起始时间"""
+    day = datetime.datetime(dt.year, dt.month, dt.day)
+    if period == WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def partition_key(dt, period):
+    """获取时间所在分区的键（即文件名中的日期部分）"""
+    if period == WEEK:
+        year, week, _ = dt.isocalendar()
+        return f"{year}-W{week:02d}"
+    return dt.strftime("%Y%m%d")
+
+
+class PartitionedStore:
+    """按时间分区的数据库存储"""
+    def __init__(self, base_dir, period=DAY, retention_days=None, read_only=False, raw_compression=None,
+                 cycle_codec=None):
+        """初始化分区存储
+
+        Args:
+            base_dir: 分区文件所在目录
+            period: 分区周期，DAY或WEEK
+            retention_days: 数据保留天数，None表示永久保留
+            read_only: 只读模式（Web服务使用），不创建目录和分区
+            raw_compression: 原始数据的压缩方式，传给每个分区的DatabaseManager
+            cycle_codec: 周期数据的编码方式，保存为每个新分区的数据库设置；
+                None表示新分区沿用最新分区的设置
+        """
+        if period not in PERIODS:
+            raise ValueError(f"不支持的分区周期: {period}")
+        self.base_dir = base_dir
+        self.db_path = base_dir
+        self.period = period
+        self.retention_days = retention_days
+        self.read_only = read_only
+        self.raw_compression = raw_compression
+        self.cycle_codec = cycle_codec
+
+        self.lock = threading.RLock()
+        # 已打开的写入分区 {分区键: DatabaseManager}，按最近使用的顺序排列
+        self.writers = {}
+        # 所有分区中已使用的最大id，新分区的自增序列从这里继续
+        self.last_ids = {"cycle_data": 0, "raw_data": 0}
+        # 不再写入的分区的查询结果 {(分区文件, 类型): (文件状态, 结果)}，见_cached
+        self.partition_cache = {}
+        self.cache_lock = threading.Lock()
+
+        self.connected = True
+        if not read_only:
+            try:
+                os.makedirs(base_dir, exist_ok=True)
+            except OSError as e:
+                print(f"创建分区目录错误: {str(e)}")
+                self.connected = False
+                return
+            self._load_last_ids()
+            self.apply_retention()
+        print(f"分区存储目录: {self.base_dir}（按{'天' if period == DAY else '周'}分区）")
+
+    # ---------- 分区管理 ----------
+
+    def _partition_for_key(self, key, start):
+        end = start + datetime.timedelta(days=7 if self.period == WEEK else 1)
+        path = os.path.join(self.base_dir, f"{PARTITION_PREFIX}{key}.db")
+        return Partition(key, path, start, end)
+
+    def list_partitions(self):
+        """列出目录中已有的分区（按时间升序）"""
+        partitions = []
+        pattern = _PATTERNS[self.period]
+        for path in glob.glob(os.path.join(self.base_dir, f"{PARTITION_PREFIX}*.db")):
+            match = pattern.match(os.path.basename(path))
+            if not match:
+                continue
+            if self.period == WEEK:
+                year, week = int(match.group(1)), int(match.group(2))
+                start = datetime.datetime.combine(datetime.date.fromisocalendar(year, week, 1), datetime.time())
+            else:
+                start = datetime.datetime.strptime(match.group(1), "%Y%m%d")
+            partitions.append(self._partition_for_key(match.group(0)[len(PARTITION_PREFIX):-3], start))
+        partitions.sort(key=lambda p: p.start_us)
+        return partitions
+
+    def partitions_for_range(self, start_time, end_time):
+        """列出与时间范围重叠的分区"""
+        start_us, end_us = timestamp_to_us(start_time), timestamp_to_us(end_time)
+        return [p for p in self.list_partitions() if p.overlaps(start_us, end_us)]
+
+    def current_partition(self):
+        """获取最新的分区，没有分区时返回None"""
+        partitions = self.list_partitions()
+        return partitions[-1] if partitions else None
+
+    def _open_keys(self, partitions):
+        """仍在写入的分区键：最新的分区和本进程打开写入的分区"""
+        with self.lock:
+            keys = set(self.writers)
+        if partitions:
+            keys.add(partitions[-1].key)
+        return keys
+
+    @staticmethod
+    def _file_state(partition):
+        """分区数据库文件和WAL文件的修改时间和大小"""
+        state = []
+        for suffix in ("", "-wal"):
+            try:
+                st = os.stat(partition.path + suffix)
+                state.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                state.append(None)
+        return tuple(state)
+
+    def _cached(self, partition, kind, loader):
+        """读取不再写入的分区的loader(partition)结果，按文件状态缓存
+
+        只对不是最新、也没有打开写入的分区调用；迟到的数据写入较早的分区（包括其他进程写入）时
+        文件状态改变，下次调用时重新读取
+        """
+        key = (partition.path, kind)
+        state = self._file_state(partition)
+        with self.cache_lock:
+            entry = self.partition_cache.get(key)
+        if entry is not None and entry[0] == state:
+            return entry[1]
+        value = loader(partition)
+        with self.cache_lock:
+            self.partition_cache[key] = (state, value)
+        return value
+
+    def _load_last_ids(self):
+        """读取所有分区中已使用的最大id
+
+        迟到的数据按时间戳写入较早的分区，较早分区的自增序列可能大于最新的分区，
+        因此读取所有分区，不能只读取最新的分区（否则新数据会使用重复的id）
+        """
+        for partition in self.list_partitions():
+            try:
+                conn = connect(partition.path, read_only=True)
+                try:
+                    for table, seq in conn.execute("SELECT name, seq FROM sqlite_sequence"):
+                        if table in self.last_ids:
+                            self.last_ids[table] = max(self.last_ids[table], seq)
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"读取分区 {partition.key} 错误: {str(e)}")
+
+    def apply_retention(self, now=None):
+        """删除超过保留期的分区文件，返回删除的分区列表"""
+        if self.retention_days is None or self.read_only:
+            return []
+        now = now or datetime.datetime.now()
+        cutoff_us = timestamp_to_us(now - datetime.timedelta(days=self.retention_days))
+        removed = []
+        with self.lock:
+            for partition in self.list_partitions():
+                if partition.end_us > cutoff_us:
+                    break
+                writer = self.writers.pop(partition.key, None)
+                if writer is not None:
+                    writer.close()
+                try:
+                    # WAL模式的数据库由三个文件组成
+                    for suffix in ("", "-wal", "-shm"):
+                        if os.path.exists(partition.path + suffix):
+                            os.remove(partition.path + suffix)
+                    removed.append(partition)
+                    with self.cache_lock:
+                        for key in [key for key in self.partition_cache if key[0] == partition.path]:
+                            del self.partition_cache[key]
+                    print(f"已删除超过保留期的分区: {partition.key}")
+                except OSError as e:
+                    # Windows下文件被其他进程打开时无法删除，下次轮换时重试
+                    print(f"删除分区 {partition.key} 错误: {str(e)}")
+        return removed
+
+    def _get_writer(self, key, start):
+        """获取分区的写入DatabaseManager，必要时创建分区并关闭较旧的分区"""
+        writer = self.writers.pop(key, None)
+        if writer is not None:
+            # 重新插入，使writers按最近使用的顺序排列
+            self.writers[key] = writer
+            return writer
+        partition = self._partition_for_key(key, start)
+        if not os.path.exists(partition.path):
+            # 轮换到新分区时清理过期分区
+            print(f"创建新分区: {key}")
+            self.apply_retention()
+        writer = DatabaseManager(db_path=partition.path, raw_compression=self.raw_compression,
+                                 cycle_codec=self.cycle_codec or self._latest_cycle_codec())
+        if not writer.connected:
+            return None
+        self.writers[key] = writer
+
+        # 只保持最近使用的几个分区打开
+        for old_key in list(self.writers)[:-MAX_OPEN_WRITERS]:
+            self.writers.pop(old_key).close()
+        return writer
+
+    def _latest_cycle_codec(self):
+        """最新分区中保存的周期数据编码方式（没有分区时为None）"""
+        partitions = self.list_partitions()
+        if not partitions:
+            return None
+        conn = connect(partitions[-1].path, read_only=True)
+        try:
+            return get_setting(conn, CYCLE_CODEC_SETTING)
+        finally:
+            conn.close()
+
+    def _sync_sequence(self, writer):
+        """使分区的自增序列不小于所有分区中已使用的最大id"""
+        for table, last_id in self.last_ids.items():
+            writer.conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, 0 "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (table, table)
+            )
+            writer.conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?",
+                                (last_id, table, last_id))
+
+    def _update_last_ids(self, writer):
+        for table, seq in writer.conn.execute("SELECT name, seq FROM sqlite_sequence"):
+            if table in self.last_ids:
+                self.last_ids[table] = max(self.last_ids[table], seq)
+
+    # ---------- 写入 ----------
+
+    def save_cycle_data(self, cycle_number, data, timestamp=None, channel=""):
+        """保存周期数据"""
+        return self.write_batch([(timestamp, cycle_number, data, channel)], [])
+
+    def save_raw_data(self, broker, topic, raw_data, timestamp=None, channel=""):
+        """保存原始数据"""
+        return self.write_batch([], [(timestamp, broker, topic, raw_data, channel)])
+
+    def save_cycle_batch(self, records):
+        """批量保存周期数据"""
+        return self.write_batch(records, [])
+
+    def save_raw_batch(self, records):
+        """批量保存原始数据"""
+        return self.write_batch([], records)
+
+    def write_batch(self, cycle_records, raw_records):
+        """按时间戳将数据分配到各个分区，每个分区一个事务"""
+        if self.read_only or not self.connected:
+            return False
+        if not cycle_records and not raw_records:
+            return True
+
+        now = format_timestamp()
+        groups = {}
+        # 时间戳格式固定，按天分区时直接取日期部分作为分区键
+        for timestamp, *rest in cycle_records:
+            groups.setdefault(self._record_key(timestamp or now), ([], []))[0].append((timestamp or now, *rest))
+        for timestamp, *rest in raw_records:
+            groups.setdefault(self._record_key(timestamp or now), ([], []))[1].append((timestamp or now, *rest))
+
+        ok = True
+        with self.lock:
+            for (key, start), (cycles, raws) in sorted(groups.items()):
+                writer = self._get_writer(key, start)
+                if writer is None:
+                    ok = False
+                    continue
+                with writer.lock:
+                    try:
+                        self._sync_sequence(writer)
+                    except sqlite3.Error as e:
+                        print(f"同步分区 {key} 自增序列错误: {str(e)}")
+                        writer.conn.rollback()
+                        ok = False
+                        continue
+                    if writer.write_batch(cycles, raws):
+                        self._update_last_ids(writer)
+                    else:
+                        ok = False
+        return ok
+
+    def _record_key(self, timestamp):
+        if self.period == DAY and isinstance(timestamp, str):
+            # "YYYY-MM-DD ..." -> "YYYYMMDD"
+            key = timestamp[0:4] + timestamp[5:7] + timestamp[8:10]
+            return key, datetime.datetime(int(key[0:4]), int(key[4:6]), int(key[6:8]))
+        dt = datetime.datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp
+        return partition_key(dt, self.period), partition_start(dt, self.period)
+
+    # ---------- 查询 ----------
+
+    def _query(self, partition, sql, params=()):
+        """在一个分区上执行只读查询"""
+        conn = connect(partition.path, read_only=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _channel_filter(channel, prefix="WHERE"):
+        if channel is None:
+            return "", ()
+        return f"{prefix} channel = ?", (channel,)
+
+    def _latest(self, table, columns, limit, offset, channel):
+        """从最新的分区开始倒序读取，直到取够limit条"""
+        where, params = self._channel_filter(channel)
+        result = []
+        for partition in reversed(self.list_partitions()):
+            if offset > 0:
+                # 整个分区都在offset之内时根据统计表跳过
+                stats = merge_stats(self._stats_rows(partition), channel)
+                count = stats[f"{STATS_TABLES[table]}_count"]
+                if count <= offset:
+                    offset -= count
+                    continue
+            rows = self._query(
+                partition,
+                f"SELECT {columns} FROM {table} {where} ORDER BY time_us DESC, id DESC LIMIT ? OFFSET ?",
+                params + (limit - len(result), offset)
+            )
+            offset = 0
+            result.extend(rows)
+            if len(result) >= limit:
+                break
+        return result
+
+    def get_cycle_data(self, limit=100, offset=0, channel=None):
+        """获取周期数据（按时间倒序）"""
+        try:
+            return self._latest("cycle_data", CYCLE_COLUMNS, limit, offset, channel)
+        except sqlite3.Error as e:
+            print(f"获取周期数据错误: {str(e)}")
+            return []
+
+    def get_raw_data(self, limit=100, offset=0, channel=None):
+        """获取原始数据（按时间倒序）"""
+        try:
+            return self._latest("raw_data", RAW_COLUMNS, limit, offset, channel)
+        except sqlite3.Error as e:
+            print(f"获取原始数据错误: {str(e)}")
+            return []
+
+    def _page(self, table, columns, after, limit, channel, order, time_range=None):
+        """按游标读取一页数据，从游标所在的分区开始依次读取相邻分区（只读取与time_range重叠的分区）"""
+        position = None
+        if after:
+            time_us, row_id, order = decode_cursor(after)
+            position = (time_us, row_id)
+        partitions = self.list_partitions()
+        if order == NEWEST_FIRST:
+            partitions.reverse()
+        rows = []
+        for partition in partitions:
+            if time_range is not None and not partition.overlaps(*time_range):
+                continue
+            # 跳过游标之前已经读完的分区
+            if position is not None:
+                if order == NEWEST_FIRST and partition.start_us > position[0]:
+                    continue
+                if order != NEWEST_FIRST and partition.end_us <= position[0]:
+                    continue
+            sql, params = page_query(table, columns, position, order, channel, limit - len(rows), time_range)
+            rows.extend(self._query(partition, sql, params))
+            if len(rows) > limit:
+                break
+        return split_page(rows, limit, order)
+
+    def get_cycle_page(self, after=None, limit=100, channel=None, order=NEWEST_FIRST, time_range=None):
+        """按游标分页获取周期数据，返回 (rows, next_cursor)（见DatabaseManager.get_cycle_page）"""
+        try:
+            return self._page("cycle_data", CYCLE_COLUMNS, after, limit, channel, order, time_range)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"分页获取周期数据错误: {str(e)}")
+            return [], None
+
+    def get_raw_page(self, after=None, limit=100, channel=None, order=NEWEST_FIRST):
+        """按游标分页获取原始数据，返回 (rows, next_cursor)"""
+        try:
+            return self._page("raw_data", RAW_COLUMNS, after, limit, channel, order)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"分页获取原始数据错误: {str(e)}")
+            return [], None
+
+    def get_latest_cycle_data(self, count=1, channel=None):
+        """获取最新的周期数据"""
+        return self.get_cycle_data(count, 0, channel)
+
+    def get_cycles_after(self, last_id, limit=1000, channel=None):
+        """获取id大于last_id的周期数据（按id升序，见DatabaseManager.get_cycles_after）
+
+        id在所有分区中连续递增，但数据按时间戳分配到分区，时间较早的新数据可能写入较早的分区，
+        因此查找所有最大id大于last_id的分区（主键查找，不扫描数据），再合并取id最小的limit条。
+        不再写入的分区的最大id按文件状态缓存，实时推送每次检查时不需要打开所有分区
+        """
+        try:
+            where, params = self._channel_filter(channel, "AND")
+            partitions = self.list_partitions()
+            open_keys = self._open_keys(partitions)
+            rows = []
+            for partition in partitions:
+                if partition.key not in open_keys:
+                    if self._cached(partition, "max_cycle_id", self._max_cycle_id) <= last_id:
+                        continue
+                rows.extend(self._query(
+                    partition,
+                    f"SELECT {CYCLE_COLUMNS} FROM cycle_data WHERE id > ? {where} ORDER BY id LIMIT ?",
+                    (last_id,) + params + (limit,)
+                ))
+            rows.sort(key=lambda row: row[0])
+            return rows[:limit]
+        except sqlite3.Error as e:
+            print(f"获取新周期数据错误: {str(e)}")
+            return []
+
+    def _max_cycle_id(self, partition):
+        """读取一个分区中周期数据的最大id，没有数据时为0"""
+        return self._query(partition, "SELECT COALESCE(MAX(id), 0) FROM cycle_data")[0][0]
+
+    def get_cycle_data_by_time(self, start_time, end_time, channel=None):
+        """根据时间范围获取周期数据，只打开与时间范围重叠的分区"""
+        try:
+            start_us, end_us = timestamp_to_us(start_time), timestamp_to_us(end_time)
+            where, params = self._channel_filter(channel, "AND")
+            result = []
+            # 分区之间的时间范围互不重叠，按分区顺序拼接即为整体的时间顺序
+            for partition in self.list_partitions():
+                if not partition.overlaps(start_us, end_us):
+                    continue
+                result.extend(self._query(
+                    partition,
+                    f"SELECT {CYCLE_COLUMNS} FROM cycle_data WHERE time_us BETWEEN ? AND ? {where} "
+                    f"ORDER BY time_us, id",
+                    (start_us, end_us) + params
+                ))
+            return result
+        except (sqlite3.Error, ValueError) as e:
+            print(f"根据时间范围获取周期数据错误: {str(e)}")
+            return []
+
+    def get_rollup(self, start_time, end_time, channel=None, points=500, resolution=None):
+        """查询时间范围内的预聚合数据（合并所有重叠分区中的聚合行）"""
+        try:
+            start_us, end_us = timestamp_to_us(start_time), timestamp_to_us(end_time)
+            resolution = resolution or choose_resolution(start_us, end_us, points)
+            rows = []
+            for partition in self.list_partitions():
+                if not partition.overlaps(start_us, end_us):
+                    continue
+                conn = connect(partition.path, read_only=True)
+                try:
+                    rows.extend(fetch_rollup_rows(conn, resolution, start_us, end_us, channel))
+                finally:
+                    conn.close()
+            return merge_rollup_rows(rows, resolution)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"查询预聚合数据错误: {str(e)}")
+            return None
+
+    def _stats_rows(self, partition):
+        """读取一个分区的统计行"""
+        conn = connect(partition.path, read_only=True)
+        try:
+            return read_stats_rows(conn)
+        finally:
+            conn.close()
+
+    def _each_partition(self, kind, loader):
+        """对每个分区读取loader(partition)，不再写入的分区使用缓存，只重新读取仍在写入的分区"""
+        partitions = self.list_partitions()
+        open_keys = self._open_keys(partitions)
+        return [loader(partition) if partition.key in open_keys else self._cached(partition, kind, loader)
+                for partition in partitions]
+
+    def _channel_list(self, partition):
+        """读取一个分区中出现过的通道ID"""
+        return [row[0] for row in self._query(partition, CHANNELS_SQL)]
+
+    def get_stats(self, channel=None):
+        """合并所有分区的统计表（见DatabaseManager.get_stats），出错时返回None"""
+        try:
+            rows = []
+            for partition_rows in self._each_partition("stats", self._stats_rows):
+                rows.extend(partition_rows)
+            return merge_stats(rows, channel)
+        except sqlite3.Error as e:
+            print(f"获取统计信息错误: {str(e)}")
+            return None
+
+    def get_cycle_count(self, channel=None):
+        """获取所有分区的周期数据总数"""
+        stats = self.get_stats(channel)
+        return stats["cycle_count"] if stats else 0
+
+    def get_raw_count(self, channel=None):
+        """获取所有分区的原始数据总数"""
+        stats = self.get_stats(channel)
+        return stats["raw_count"] if stats else 0
+
+    def get_channels(self):
+        """获取所有分区中出现过的通道ID列表（每个分区按索引跳跃查找，见database.CHANNELS_SQL）"""
+        try:
+            channels = set()
+            for partition_channels in self._each_partition("channels", self._channel_list):
+                channels.update(partition_channels)
+            return sorted(channels)
+        except sqlite3.Error as e:
+            print(f"获取通道列表错误: {str(e)}")
+            return []
+
+    def get_time_bounds(self):
+        """获取最早和最晚的周期数据时间戳，没有数据时为None"""
+        stats = self.get_stats()
+        if not stats:
+            return None, None
+        return stats["earliest_cycle"], stats["latest_cycle"]
+
+    def close(self):
+        """关闭所有写入分区"""
+        with self.lock:
+            for writer in self.writers.values():
+                writer.close()
+            self.writers.clear()
+        self.connected = False
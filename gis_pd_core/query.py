@@ -0,0 +1,199 @@
+"""统一的周期数据查询层
+
+GUI、Web服务和db_utils都通过CycleQuery读取周期数据。底层可以是任意存储后端（见storage模块），
+查询结果是NumPy数组（CycleBatch），不再逐点转换为Python float列表；周期数据只经过
+decode_rows一个解码入口（内部批量调用codec.decode_cycles）。
+
+解码后的周期按id保存在LRU缓存（CycleCache）中，实时刷新、翻页和图表重绘时反复读取的
+最新数据不再重复解码。缓存中的数组是只读的，调用方需要修改时先复制。
+一次读取的周期数超过缓存容量的一半时（长时间范围查询）不放入缓存，避免挤出热点数据。
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .codec import decode_cycles
+from .pagination import NEWEST_FIRST
+
+# 缓存的周期数（360点的float64周期约2.9KB，20000个约56MB）
+DEFAULT_CACHE_SIZE = 20000
+
+
+class CycleCache:
+    """解码后周期数据的LRU缓存（线程安全），键为周期数据的id"""
+    def __init__(self, max_cycles=DEFAULT_CACHE_SIZE):
+        self.max_cycles = max(0, int(max_cycles))
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_many(self, ids):
+        """按id查找，返回与ids顺序一致的列表，未缓存的为None"""
+        result = []
+        with self._lock:
+            for row_id in ids:
+                values = self._items.get(row_id)
+                if values is None:
+                    self.misses += 1
+                else:
+                    self._items.move_to_end(row_id)
+                    self.hits += 1
+                result.append(values)
+        return result
+
+    def put_many(self, ids, arrays):
+        """放入一批解码结果（数组设为只读），超出容量时淘汰最久未使用的周期"""
+        if len(ids) > self.max_cycles // 2:
+            return
+        with self._lock:
+            for row_id, values in zip(ids, arrays):
+                values.flags.writeable = False
+                self._items[row_id] = values
+                self._items.move_to_end(row_id)
+            while len(self._items) > self.max_cycles:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def get_stats(self):
+        """缓存统计：周期数、命中次数和未命中次数"""
+        with self._lock:
+            return {"cycles": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+def decode_rows(rows, cache=None):
+    """解码查询结果行 (id, timestamp, cycle_number, data, channel, ...) 中的周期数据
+
+    Args:
+        rows: 任意存储后端返回的周期数据行
+        cache: CycleCache，None表示不使用缓存
+
+    Returns:
+        与rows顺序一致的float64数组列表
+    """
+    if cache is None:
+        return decode_cycles([row[3] for row in rows])
+    values = cache.get_many([row[0] for row in rows])
+    # 周期日志返回的已是数组（memmap视图），不需要解码，也不放入缓存
+    missing = [i for i, cached in enumerate(values)
+               if cached is None and not isinstance(rows[i][3], np.ndarray)]
+    if missing:
+        decoded = decode_cycles([rows[i][3] for i in missing])
+        cache.put_many([rows[i][0] for i in missing], decoded)
+        for i, data in zip(missing, decoded):
+            values[i] = data
+    arrays = [i for i, cached in enumerate(values) if cached is None]
+    for i, data in zip(arrays, decode_cycles([rows[i][3] for i in arrays])):
+        values[i] = data
+    return values
+
+
+class CycleBatch:
+    """一批周期数据（保持查询结果的顺序）
+
+    Attributes:
+        ids: int64数组
+        timestamps: 时间戳字符串列表
+        cycle_numbers: int64数组
+        channels: 通道ID列表
+        values: float64数组列表（每个周期一个，长度可以不同）
+    """
+    def __init__(self, ids, timestamps, cycle_numbers, channels, values):
+        self.ids = ids
+        self.timestamps = timestamps
+        self.cycle_numbers = cycle_numbers
+        self.channels = channels
+        self.values = values
+
+    @classmethod
+    def from_rows(cls, rows, cache=None):
+        """由存储后端返回的周期数据行创建"""
+        return cls(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            [row[1] for row in rows],
+            np.array([row[2] for row in rows], dtype=np.int64),
+            [row[4] for row in rows],
+            decode_rows(rows, cache),
+        )
+
+    def __len__(self):
+        return len(self.values)
+
+    def reversed(self):
+        """顺序相反的一批数据（倒序查询的结果转换为从旧到新）"""
+        return CycleBatch(self.ids[::-1], self.timestamps[::-1], self.cycle_numbers[::-1],
+                          self.channels[::-1], self.values[::-1])
+
+    def take(self, indices):
+        """按序号选取部分周期"""
+        indices = np.asarray(indices, dtype=np.intp)
+        return CycleBatch(self.ids[indices], [self.timestamps[i] for i in indices], self.cycle_numbers[indices],
+                          [self.channels[i] for i in indices], [self.values[i] for i in indices])
+
+    def matrix(self, points=None):
+        """(周期数, 点数) 的float64矩阵，points默认为最长周期的点数，不足的点为NaN"""
+        if points is None:
+            points = max((len(values) for values in self.values), default=0)
+        result = np.full((len(self.values), points), np.nan)
+        for i, values in enumerate(self.values):
+            n = min(len(values), points)
+            result[i, :n] = values[:n]
+        return result
+
+    def to_dicts(self):
+        """转换为字典列表（Web接口的JSON格式）"""
+        return [
+            {
+                "id": row_id,
+                "timestamp": timestamp,
+                "cycle_number": cycle_number,
+                "channel": channel,
+                "data": values.tolist()
+            }
+            for row_id, timestamp, cycle_number, channel, values in zip(
+                self.ids.tolist(), self.timestamps, self.cycle_numbers.tolist(), self.channels, self.values)
+        ]
+
+
+class CycleQuery:
+    """周期数据查询（任意存储后端 + 解码缓存）"""
+    def __init__(self, store, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            store: DatabaseManager、PartitionedStore或CycleLogStore
+            cache_size: 解码缓存的周期数，0表示不缓存
+        """
+        self.store = store
+        self.cache = CycleCache(cache_size) if cache_size else None
+
+    def batch(self, rows):
+        """将存储后端返回的周期数据行转换为CycleBatch（使用解码缓存）"""
+        return CycleBatch.from_rows(rows, self.cache)
+
+    def latest(self, count=1, channel=None):
+        """最新的count个周期（按时间倒序）"""
+        return self.batch(self.store.get_latest_cycle_data(count, channel=channel))
+
+    def recent(self, limit=100, offset=0, channel=None):
+        """跳过最新的offset个周期后的limit个周期（按时间倒序）"""
+        return self.batch(self.store.get_cycle_data(limit, offset, channel=channel))
+
+    def by_time(self, start_time, end_time, channel=None):
+        """时间范围内的周期（按时间升序）"""
+        return self.batch(self.store.get_cycle_data_by_time(start_time, end_time, channel=channel))
+
+    def after(self, last_id, limit=1000, channel=None):
+        """id大于last_id的周期（按id升序，即写入顺序），用于增量读取新数据"""
+        return self.batch(self.store.get_cycles_after(last_id, limit, channel=channel))
+
+    def page(self, after=None, limit=100, channel=None, order=NEWEST_FIRST):
+        """按游标分页读取，返回 (CycleBatch, next_cursor)"""
+        rows, next_cursor = self.store.get_cycle_page(after, limit, channel=channel, order=order)
+        return self.batch(rows), next_cursor
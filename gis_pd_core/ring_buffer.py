@@ -0,0 +1,132 @@
+"""有界环形缓冲区，用于MQTT网络线程与消费线程之间的批量数据交接"""
+import threading
+import time
+from collections import deque
+
+# 缓冲区满时的处理策略
+DROP_OLDEST = "drop_oldest"  # 丢弃最早的数据，保留最新数据
+DROP_NEWEST = "drop_newest"  # 丢弃新到达的数据
+BLOCK = "block"              # 阻塞生产者，直到有空位或超时
+
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class RingBuffer:
+    """线程安全的有界环形缓冲区
+
+    生产者(MQTT线程)逐条写入，消费者(界面定时器或写库线程)每次批量取出全部积压数据，
+    并统计入队、丢弃数量和当前/峰值深度。
+    """
+    def __init__(self, capacity=1000, overflow_policy=DROP_OLDEST, block_timeout=None):
+        """初始化缓冲区
+
+        Args:
+            capacity: 最大容量
+            overflow_policy: 缓冲区满时的策略，取值见OVERFLOW_POLICIES
+            block_timeout: BLOCK策略下的最长等待时间(秒)，None表示一直等待，超时后丢弃新数据
+        """
+        if capacity <= 0:
+            raise ValueError("capacity必须大于0")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow_policy}")
+
+        self.capacity = capacity
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+
+        # 统计计数
+        self.put_count = 0
+        self.dropped_count = 0
+        self.peak_depth = 0
+
+    def put(self, item):
+        """写入一条数据
+
+        Returns:
+            bool: 数据是否被写入（DROP_OLDEST策略下总是写入，但可能挤掉最早的数据）
+        """
+        with self._lock:
+            if len(self._items) >= self.capacity:
+                if self.overflow_policy == DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped_count += 1
+                elif self.overflow_policy == DROP_NEWEST:
+                    self.dropped_count += 1
+                    return False
+                else:
+                    if not self._wait_not_full():
+                        self.dropped_count += 1
+                        return False
+
+            self._items.append(item)
+            self.put_count += 1
+            if len(self._items) > self.peak_depth:
+                self.peak_depth = len(self._items)
+            return True
+
+    def _wait_not_full(self):
+        """BLOCK策略下等待空位（调用时必须持有锁）"""
+        deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+        while len(self._items) >= self.capacity and not self._closed:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._not_full.wait(remaining)
+        return not self._closed
+
+    def drain(self, max_items=None):
+        """批量取出缓冲区中的数据（按写入顺序）
+
+        Args:
+            max_items: 最多取出的条数，None表示全部取出
+
+        Returns:
+            list: 取出的数据列表，缓冲区为空时返回空列表
+        """
+        with self._lock:
+            if max_items is None or max_items >= len(self._items):
+                batch = list(self._items)
+                self._items.clear()
+            else:
+                batch = [self._items.popleft() for _ in range(max_items)]
+            if batch:
+                self._not_full.notify_all()
+            return batch
+
+    def clear(self):
+        """清空缓冲区"""
+        with self._lock:
+            self._items.clear()
+            self._not_full.notify_all()
+
+    def close(self):
+        """关闭缓冲区，唤醒所有阻塞的生产者（之后的阻塞写入直接丢弃）"""
+        with self._lock:
+            self._closed = True
+            self._not_full.notify_all()
+
+    def reopen(self):
+        """重新打开已关闭的缓冲区"""
+        with self._lock:
+            self._closed = False
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def get_stats(self):
+        """获取缓冲区统计信息"""
+        with self._lock:
+            return {
+                "depth": len(self._items),
+                "capacity": self.capacity,
+                "peak_depth": self.peak_depth,
+                "put_count": self.put_count,
+                "dropped_count": self.dropped_count,
+                "overflow_policy": self.overflow_policy,
+            }
@@ -0,0 +1,271 @@
+"""预聚合（rollup）表
+
+写入周期数据时，在同一个事务中按1秒、1分钟、1小时三种分辨率增量更新聚合表。
+每个聚合行对应一个通道的一个时间桶，包含：
+
+    cycle_count   桶内的周期数
+    pulse_count   桶内超过脉冲阈值的采样点数
+    bin_max       每个相位区间的最大值（float64数组）
+    bin_sum       每个相位区间的采样值之和（float64数组，除以bin_count即为均值）
+    bin_count     每个相位区间的采样点数（int64数组）
+
+相位区间按采样点在周期内的相对位置划分为PHASE_BINS个，与周期的采样点数无关。
+长时间范围的趋势查询读取聚合表，query_rollup()根据点数需求选择分辨率。
+"""
+import numpy as np
+
+# 相位区间数（每个区间10度）
+PHASE_BINS = 36
+# 判定为脉冲的幅值阈值（与周期数据单位相同）
+PULSE_THRESHOLD = 1.0
+
+# 聚合分辨率（从细到粗）：名称 -> 时间桶长度(微秒)
+RESOLUTIONS = {
+    "1s": 1000000,
+    "1m": 60 * 1000000,
+    "1h": 3600 * 1000000,
+}
+
+
+def rollup_table(resolution):
+    """获取聚合分辨率对应的表名"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"不支持的聚合分辨率: {resolution}")
+    return f"rollup_{resolution}"
+
+
+def create_rollup_tables(cursor):
+    """创建聚合表（由schema.ensure_schema调用）"""
+    for resolution in RESOLUTIONS:
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {rollup_table(resolution)} (
+                channel TEXT NOT NULL,
+                bucket_us INTEGER NOT NULL,
+                cycle_count INTEGER NOT NULL,
+                pulse_count INTEGER NOT NULL,
+                bin_max BLOB NOT NULL,
+                bin_sum BLOB NOT NULL,
+                bin_count BLOB NOT NULL,
+                PRIMARY KEY (channel, bucket_us)
+            )
+        ''')
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{rollup_table(resolution)}_time ON {rollup_table(resolution)} (bucket_us)"
+        )
+
+
+def phase_bin_stats(cycles, bins=PHASE_BINS, pulse_threshold=PULSE_THRESHOLD):
+    """计算每个周期各相位区间的最大值、和、采样点数以及脉冲数
+
+    Args:
+        cycles: 周期数据列表，各周期的采样点数可以不同
+
+    Returns:
+        (bin_max, bin_sum, bin_count, pulses)，前三个形状为 (周期数, bins)，pulses形状为 (周期数,)
+    """
+    count = len(cycles)
+    bin_max = np.full((count, bins), -np.inf)
+    bin_sum = np.zeros((count, bins))
+    bin_count = np.zeros((count, bins), dtype=np.int64)
+    pulses = np.zeros(count, dtype=np.int64)
+
+    # 采样点数相同的周期一起计算
+    groups = {}
+    for i, data in enumerate(cycles):
+        values = np.asarray(data, dtype=np.float64)
+        groups.setdefault(values.size, []).append((i, values))
+    for n, members in groups.items():
+        if n == 0:
+            continue
+        rows = np.array([i for i, _ in members])
+        matrix = np.vstack([values for _, values in members])
+        bin_index = (np.arange(n) * bins) // n
+        pulses[rows] = np.count_nonzero(matrix > pulse_threshold, axis=1)
+        counts = np.bincount(bin_index, minlength=bins)
+        bin_count[rows] = counts
+        if n >= bins:
+            # 每个区间至少有一个采样点，可以使用reduceat
+            starts = np.searchsorted(bin_index, np.arange(bins))
+            bin_max[rows] = np.maximum.reduceat(matrix, starts, axis=1)
+            bin_sum[rows] = np.add.reduceat(matrix, starts, axis=1)
+        else:
+            for column, b in enumerate(bin_index):
+                bin_max[rows, b] = np.maximum(bin_max[rows, b], matrix[:, column])
+                bin_sum[rows, b] += matrix[:, column]
+    return bin_max, bin_sum, bin_count, pulses
+
+
+def _to_blob(array, dtype):
+    return np.ascontiguousarray(array, dtype=dtype).tobytes()
+
+
+def update_rollups(conn, records, bins=PHASE_BINS, pulse_threshold=PULSE_THRESHOLD):
+    """将一批周期数据合并到各分辨率的聚合表（不提交，由调用方在写入事务中提交）
+
+    Args:
+        conn: 数据库连接
+        records: (time_us, channel, data) 元组列表
+    """
+    if not records:
+        return
+    bin_max, bin_sum, bin_count, pulses = phase_bin_stats(
+        [data for _, _, data in records], bins, pulse_threshold
+    )
+    times = np.array([time_us for time_us, _, _ in records], dtype=np.int64)
+    channels = [channel for _, channel, _ in records]
+
+    for resolution, bucket_size in RESOLUTIONS.items():
+        table = rollup_table(resolution)
+        buckets = times - times % bucket_size
+        groups = {}
+        for i, key in enumerate(zip(channels, buckets.tolist())):
+            groups.setdefault(key, []).append(i)
+
+        rows = []
+        for (channel, bucket_us), members in groups.items():
+            members = np.array(members)
+            new_max = bin_max[members].max(axis=0)
+            new_sum = bin_sum[members].sum(axis=0)
+            new_count = bin_count[members].sum(axis=0)
+            cycle_count = len(members)
+            pulse_count = int(pulses[members].sum())
+
+            existing = conn.execute(
+                f"SELECT cycle_count, pulse_count, bin_max, bin_sum, bin_count FROM {table} "
+                f"WHERE channel = ? AND bucket_us = ?",
+                (channel, bucket_us)
+            ).fetchone()
+            if existing is not None and len(existing[2]) == bins * 8:
+                cycle_count += existing[0]
+                pulse_count += existing[1]
+                new_max = np.maximum(new_max, np.frombuffer(existing[2], dtype=np.float64))
+                new_sum = new_sum + np.frombuffer(existing[3], dtype=np.float64)
+                new_count = new_count + np.frombuffer(existing[4], dtype=np.int64)
+            rows.append((channel, bucket_us, cycle_count, pulse_count,
+                         _to_blob(new_max, "<f8"), _to_blob(new_sum, "<f8"), _to_blob(new_count, "<i8")))
+
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} "
+            f"(channel, bucket_us, cycle_count, pulse_count, bin_max, bin_sum, bin_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+
+def choose_resolution(start_us, end_us, points):
+    """选择时间桶数不超过points的最细分辨率；时间范围太长、任何分辨率都超过时使用最粗的分辨率"""
+    span = max(0, end_us - start_us)
+    for resolution, bucket_size in sorted(RESOLUTIONS.items(), key=lambda item: item[1]):
+        if -(-span // bucket_size) <= points:
+            return resolution
+    return max(RESOLUTIONS, key=RESOLUTIONS.get)
+
+
+def empty_rollup(resolution, bins=PHASE_BINS):
+    """空的聚合查询结果"""
+    return {
+        "resolution": resolution,
+        "bucket_us": RESOLUTIONS[resolution],
+        "time_us": np.empty(0, dtype=np.int64),
+        "cycle_count": np.empty(0, dtype=np.int64),
+        "pulse_count": np.empty(0, dtype=np.int64),
+        "bin_max": np.empty((0, bins)),
+        "bin_mean": np.empty((0, bins)),
+        "bin_count": np.empty((0, bins), dtype=np.int64),
+    }
+
+
+def merge_rollup_rows(rows, resolution):
+    """将聚合行合并为按时间排序的数组（不同通道或不同分区中的同一时间桶合并为一行）
+
+    Args:
+        rows: (bucket_us, cycle_count, pulse_count, bin_max, bin_sum, bin_count) 行列表
+    """
+    if not rows:
+        return empty_rollup(resolution)
+    bins = len(rows[0][3]) // 8
+    times = np.array([row[0] for row in rows], dtype=np.int64)
+    unique_times, index = np.unique(times, return_inverse=True)
+    size = unique_times.size
+
+    cycle_count = np.zeros(size, dtype=np.int64)
+    pulse_count = np.zeros(size, dtype=np.int64)
+    np.add.at(cycle_count, index, np.array([row[1] for row in rows], dtype=np.int64))
+    np.add.at(pulse_count, index, np.array([row[2] for row in rows], dtype=np.int64))
+
+    bin_max = np.full((size, bins), -np.inf)
+    bin_sum = np.zeros((size, bins))
+    bin_count = np.zeros((size, bins), dtype=np.int64)
+    np.maximum.at(bin_max, index, np.frombuffer(b"".join(row[3] for row in rows), dtype="<f8").reshape(-1, bins))
+    np.add.at(bin_sum, index, np.frombuffer(b"".join(row[4] for row in rows), dtype="<f8").reshape(-1, bins))
+    np.add.at(bin_count, index, np.frombuffer(b"".join(row[5] for row in rows), dtype="<i8").reshape(-1, bins))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bin_mean = np.where(bin_count > 0, bin_sum / bin_count, np.nan)
+    bin_max[bin_count == 0] = np.nan
+    return {
+        "resolution": resolution,
+        "bucket_us": RESOLUTIONS[resolution],
+        "time_us": unique_times,
+        "cycle_count": cycle_count,
+        "pulse_count": pulse_count,
+        "bin_max": bin_max,
+        "bin_mean": bin_mean,
+        "bin_count": bin_count,
+    }
+
+
+def fetch_rollup_rows(conn, resolution, start_us, end_us, channel=None):
+    """读取时间范围内的聚合行"""
+    table = rollup_table(resolution)
+    sql = (f"SELECT bucket_us, cycle_count, pulse_count, bin_max, bin_sum, bin_count FROM {table} "
+           f"WHERE bucket_us BETWEEN ? AND ?")
+    params = (start_us - start_us % RESOLUTIONS[resolution], end_us)
+    if channel is not None:
+        sql += " AND channel = ?"
+        params += (channel,)
+    return conn.execute(sql + " ORDER BY bucket_us", params).fetchall()
+
+
+def query_rollup(conn, start_us, end_us, channel=None, points=500, resolution=None):
+    """按点数需求查询聚合数据
+
+    Args:
+        start_us, end_us: 时间范围（epoch微秒）
+        channel: 通道ID，None表示合并所有通道
+        points: 最多返回的时间桶数，选择桶数不超过该值的最细分辨率
+        resolution: 指定分辨率，指定时忽略points
+
+    Returns:
+        字典：resolution、bucket_us、time_us、cycle_count、pulse_count、
+        bin_max/bin_mean/bin_count（形状为 (时间桶数, PHASE_BINS)）
+    """
+    resolution = resolution or choose_resolution(start_us, end_us, points)
+    return merge_rollup_rows(fetch_rollup_rows(conn, resolution, start_us, end_us, channel), resolution)
+
+
+def rebuild_rollups(conn, decode, chunk_size=2000):
+    """根据周期数据重新生成全部聚合表（用于旧数据库），返回处理的周期数
+
+    Args:
+        decode: 周期数据批量解码函数（codec.decode_cycles）
+    """
+    for resolution in RESOLUTIONS:
+        conn.execute(f"DELETE FROM {rollup_table(resolution)}")
+    total = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, time_us, channel, data FROM cycle_data WHERE id > ? AND time_us IS NOT NULL "
+            "ORDER BY id LIMIT ?",
+            (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            break
+        values = decode([data for _, _, _, data in rows])
+        update_rollups(conn, [(time_us, channel, data) for (_, time_us, channel, _), data in zip(rows, values)])
+        conn.commit()
+        total += len(rows)
+        last_id = rows[-1][0]
+        print(f"已聚合 {total} 个周期")
+    conn.commit()
+    return total
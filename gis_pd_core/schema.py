@@ -0,0 +1,138 @@
+"""数据库表结构定义与升级
+
+所有写入端和读取端在打开数据库时调用ensure_schema()，保证旧版本创建的数据库
+自动补齐新增的列和索引（ALTER TABLE ADD COLUMN只修改表定义，不重写数据）。
+"""
+import sqlite3
+
+from .rollups import create_rollup_tables
+from .stats import create_stats_table, stats_missing, rebuild_stats
+
+# 查询时使用的列顺序（GUI按索引访问查询结果，新增列只能追加在末尾）
+CYCLE_COLUMNS = "id, timestamp, cycle_number, data, channel"
+RAW_COLUMNS = "id, timestamp, broker, topic, raw_data, channel"
+
+# 未标记通道的数据（升级前写入的数据）使用的通道ID
+DEFAULT_CHANNEL = ""
+
+# 由timestamp文本（本地时间）计算epoch微秒的SQL表达式，与database.timestamp_to_us一致；
+# 无法解析的时间戳记为0，避免回填时反复处理同一行
+TIME_US_SQL = (
+    "COALESCE(CAST(strftime('%s', substr(timestamp, 1, 19), 'utc') AS INTEGER) * 1000000"
+    " + CAST(substr(timestamp, 21, 6) AS INTEGER), 0)"
+)
+
+# 升级时每个事务回填的行数
+BACKFILL_CHUNK_SIZE = 50000
+
+# 数据库设置：新写入的周期数据使用的编码方式（codec.CYCLE_CODECS中的名称）
+CYCLE_CODEC_SETTING = "cycle_codec"
+
+
+def get_table_columns(cursor, table):
+    """获取表的列名集合"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _add_column(cursor, table, column, definition):
+    """如果列不存在则添加"""
+    if column not in get_table_columns(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def get_setting(conn, key, default=None):
+    """读取数据库设置（保存在数据库文件中，所有写入端共用）"""
+    try:
+        row = conn.execute("SELECT value FROM db_settings WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        # 旧版本的只读数据库中没有设置表
+        return default
+    return row[0] if row else default
+
+
+def set_setting(conn, key, value):
+    """保存数据库设置并提交"""
+    conn.execute("INSERT OR REPLACE INTO db_settings (key, value) VALUES (?, ?)", (key, value))
+    conn.commit()
+
+
+def backfill_time_us(conn, table, chunk_size=BACKFILL_CHUNK_SIZE):
+    """为升级前写入的数据回填time_us列，分块提交，返回回填的行数"""
+    total = 0
+    while True:
+        cursor = conn.execute(
+            f"UPDATE {table} SET time_us = {TIME_US_SQL} "
+            f"WHERE id IN (SELECT id FROM {table} WHERE time_us IS NULL LIMIT ?)",
+            (chunk_size,)
+        )
+        conn.commit()
+        if cursor.rowcount <= 0:
+            break
+        total += cursor.rowcount
+        print(f"已回填 {table}.time_us: {total} 行")
+    return total
+
+
+def ensure_schema(conn, backfill=True):
+    """创建数据表，并将旧版本的表结构升级到当前版本
+
+    Args:
+        conn: 可写的数据库连接
+        backfill: 是否立即回填旧数据的time_us列（维护工具可改为分块单独执行）
+    """
+    cursor = conn.cursor()
+
+    # 创建周期数据表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cycle_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            cycle_number INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    ''')
+
+    # 创建原始数据表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            broker TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            raw_data BLOB NOT NULL
+        )
+    ''')
+
+    # 通道ID列：一个采集进程可同时接收多个传感器的数据
+    _add_column(cursor, "cycle_data", "channel", f"TEXT NOT NULL DEFAULT '{DEFAULT_CHANNEL}'")
+    _add_column(cursor, "raw_data", "channel", f"TEXT NOT NULL DEFAULT '{DEFAULT_CHANNEL}'")
+
+    # 整数时间列（epoch微秒）：所有按时间排序和范围查询都使用该列的索引，而不是文本时间戳
+    _add_column(cursor, "cycle_data", "time_us", "INTEGER")
+    _add_column(cursor, "raw_data", "time_us", "INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cycle_data_time ON cycle_data (time_us)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_raw_data_time ON raw_data (time_us)")
+    # 按通道查询的索引改为(channel, time_us)，替换旧版本的(channel, timestamp)索引
+    cursor.execute("DROP INDEX IF EXISTS idx_cycle_data_channel")
+    cursor.execute("DROP INDEX IF EXISTS idx_raw_data_channel")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cycle_data_channel_time ON cycle_data (channel, time_us)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_raw_data_channel_time ON raw_data (channel, time_us)")
+    conn.commit()
+
+    # 预聚合表（见rollups模块）
+    create_rollup_tables(cursor)
+    # 行数和时间范围统计表（见stats模块）
+    create_stats_table(cursor)
+    # 数据库设置
+    cursor.execute("CREATE TABLE IF NOT EXISTS db_settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.commit()
+
+    if backfill:
+        # 回填升级前写入的数据（只在第一次打开旧数据库时需要，time_us索引使查找未回填的行很快）
+        backfill_time_us(conn, "cycle_data")
+        backfill_time_us(conn, "raw_data")
+        # 旧数据库第一次打开时统计一次已有的数据，之后由写入事务增量更新
+        if stats_missing(conn):
+            print("正在统计已有数据...")
+            rebuild_stats(conn)
@@ -0,0 +1,111 @@
+"""SQLite连接配置（GUI、采集程序、维护工具和Web服务共用）
+
+写入端打开数据库时启用WAL日志模式：读连接不再阻塞写连接，写连接也不阻塞读连接；
+配合synchronous=NORMAL，每次提交只在检查点时同步磁盘。Web服务使用只读连接，
+避免只读请求意外持有写锁。所有连接都设置busy_timeout，遇到锁时等待而不是
+立即返回"database is locked"错误。
+
+只读连接可以限制查询时间：在query_deadline内执行的查询超时后被中断
+（sqlite3.OperationalError: interrupted），Web服务用它限制每个请求的数据库耗时。
+"""
+import contextlib
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+# 日志模式（WAL为持久设置，写入数据库文件后对之后的所有连接生效）
+JOURNAL_MODE = "WAL"
+# WAL模式下NORMAL可保证数据库不损坏，断电时最多丢失最后几个事务
+SYNCHRONOUS = "NORMAL"
+# 遇到锁时的最长等待时间(毫秒)
+BUSY_TIMEOUT_MS = 5000
+# 页缓存大小，负数表示KiB（64 MiB）
+CACHE_SIZE = -64 * 1024
+# 内存映射读取的最大字节数（256 MiB）
+MMAP_SIZE = 256 * 1024 * 1024
+# 只读连接每执行多少条虚拟机指令检查一次查询期限
+DEADLINE_CHECK_STEPS = 10000
+
+# 当前线程的查询期限（time.monotonic()），见query_deadline
+_deadline = threading.local()
+
+
+class QueryDeadline:
+    """query_deadline的状态，expired表示期限内的查询被中断过"""
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.until = time.monotonic() + seconds
+        self.expired = False
+
+
+@contextlib.contextmanager
+def query_deadline(seconds):
+    """限制当前线程中只读连接的查询时间
+
+    期限到达后，该线程中正在执行和之后执行的只读查询都被中断。存储对象通常捕获查询错误并返回空结果，
+    调用方应在退出后检查deadline.expired，而不是依赖异常。
+
+        with query_deadline(30) as deadline:
+            rows = store.get_cycle_data_by_time(start, end)
+        if deadline.expired:
+            raise TimeoutError
+    """
+    previous = getattr(_deadline, "current", None)
+    deadline = QueryDeadline(seconds)
+    _deadline.current = deadline
+    try:
+        yield deadline
+    finally:
+        _deadline.current = previous
+
+
+def _check_deadline():
+    """进度回调：当前线程的查询期限已过时返回1，SQLite中断正在执行的查询"""
+    deadline = getattr(_deadline, "current", None)
+    if deadline is not None and time.monotonic() > deadline.until:
+        deadline.expired = True
+        return 1
+    return 0
+
+
+def configure_connection(conn, read_only=False):
+    """为连接设置存储参数
+
+    Args:
+        conn: sqlite3连接
+        read_only: 是否为只读连接（只读连接不修改日志模式）
+    """
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = {CACHE_SIZE}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+        conn.set_progress_handler(_check_deadline, DEADLINE_CHECK_STEPS)
+    else:
+        conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    return conn
+
+
+def connect(db_path, read_only=False, check_same_thread=True):
+    """打开并配置数据库连接
+
+    Args:
+        db_path: 数据库文件路径
+        read_only: 以只读方式打开（数据库文件必须已存在）
+        check_same_thread: 是否只允许在创建连接的线程中使用
+    """
+    if read_only:
+        uri = pathlib.Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                               check_same_thread=check_same_thread)
+    else:
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                               check_same_thread=check_same_thread)
+    try:
+        return configure_connection(conn, read_only)
+    except sqlite3.Error:
+        conn.close()
+        raise
@@ -0,0 +1,164 @@
+"""数据统计表
+
+data_stats表按（表名, 通道）保存行数、最早/最晚的时间和最大id，写入数据时在同一个
+事务中增量更新。状态栏、/api/db_stats等只读取这张小表，不再在大数据库上反复执行
+COUNT(*)/MIN/MAX（数GB的数据库上每次需要数百毫秒）。
+
+统计值与数据不一致时（例如用其他工具删除过数据），用维护工具重新计算：
+
+    python gis_pd_maintenance.py repair-stats
+"""
+import sqlite3
+
+STATS_TABLE = "data_stats"
+# 维护统计值的数据表，以及统计结果中使用的名称
+STATS_TABLES = {
+    "cycle_data": "cycle",
+    "raw_data": "raw",
+}
+
+# 统计行的列顺序
+STATS_COLUMNS = ("table_name, channel, row_count, first_time_us, first_timestamp, "
+                 "last_time_us, last_timestamp, last_id")
+
+# 合并一批新数据的统计值（UPDATE中的表达式都使用更新前的值）
+_UPSERT_SQL = f'''
+    INSERT INTO {STATS_TABLE} ({STATS_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (table_name, channel) DO UPDATE SET
+        row_count = row_count + excluded.row_count,
+        first_timestamp = CASE WHEN first_time_us IS NULL OR excluded.first_time_us < first_time_us
+                               THEN excluded.first_timestamp ELSE first_timestamp END,
+        first_time_us = MIN(COALESCE(first_time_us, excluded.first_time_us), excluded.first_time_us),
+        last_timestamp = CASE WHEN last_time_us IS NULL OR excluded.last_time_us >= last_time_us
+                              THEN excluded.last_timestamp ELSE last_timestamp END,
+        last_time_us = MAX(COALESCE(last_time_us, excluded.last_time_us), excluded.last_time_us),
+        last_id = MAX(last_id, excluded.last_id)
+'''
+
+
+def create_stats_table(cursor):
+    """创建统计表（由schema.ensure_schema调用）"""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            table_name TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            first_time_us INTEGER,
+            first_timestamp TEXT,
+            last_time_us INTEGER,
+            last_timestamp TEXT,
+            last_id INTEGER NOT NULL,
+            PRIMARY KEY (table_name, channel)
+        )
+    ''')
+
+
+def stats_missing(conn):
+    """判断统计表是否需要初始化（旧数据库第一次打开时统计表为空而数据表中已有数据）"""
+    if conn.execute(f"SELECT 1 FROM {STATS_TABLE} LIMIT 1").fetchone():
+        return False
+    return any(conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in STATS_TABLES)
+
+
+def update_stats(conn, table, rows):
+    """合并刚插入的一批数据的统计值（不提交，由调用方在写入事务中提交）
+
+    Args:
+        conn: 数据库连接
+        table: 数据表名
+        rows: 按插入顺序排列的 (timestamp, time_us, channel) 元组列表，必须在INSERT之后调用
+    """
+    if not rows:
+        return
+    # 自增id连续分配，由插入后的序列值推算本批每一行的id
+    last_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()[0]
+    first_id = last_id - len(rows) + 1
+
+    summary = {}
+    for i, (timestamp, time_us, channel) in enumerate(rows):
+        entry = summary.get(channel)
+        if entry is None:
+            summary[channel] = [1, time_us, timestamp, time_us, timestamp, first_id + i]
+            continue
+        entry[0] += 1
+        if time_us < entry[1]:
+            entry[1], entry[2] = time_us, timestamp
+        if time_us >= entry[3]:
+            entry[3], entry[4] = time_us, timestamp
+        entry[5] = first_id + i
+    conn.executemany(_UPSERT_SQL, [(table, channel, *entry) for channel, entry in summary.items()])
+
+
+def compute_stats(conn):
+    """扫描数据表计算统计行（需要读取全部数据，只用于初始化和修复）"""
+    rows = []
+    for table in STATS_TABLES:
+        groups = conn.execute(
+            f"SELECT channel, COUNT(*), MIN(time_us), MAX(time_us), MAX(id) FROM {table} GROUP BY channel"
+        ).fetchall()
+        for channel, count, first_us, last_us, last_id in groups:
+            first = conn.execute(
+                f"SELECT timestamp FROM {table} WHERE channel = ? AND time_us = ? ORDER BY id LIMIT 1",
+                (channel, first_us)
+            ).fetchone()
+            last = conn.execute(
+                f"SELECT timestamp FROM {table} WHERE channel = ? AND time_us = ? ORDER BY id DESC LIMIT 1",
+                (channel, last_us)
+            ).fetchone()
+            rows.append((table, channel, count, first_us, first[0] if first else None,
+                         last_us, last[0] if last else None, last_id))
+    return rows
+
+
+def rebuild_stats(conn):
+    """根据数据表重新计算统计表并提交，返回统计行"""
+    rows = compute_stats(conn)
+    conn.execute(f"DELETE FROM {STATS_TABLE}")
+    conn.executemany(f"INSERT INTO {STATS_TABLE} ({STATS_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return rows
+
+
+def read_stats_rows(conn):
+    """读取统计行；数据库中还没有统计表时（旧版本的只读数据库）扫描数据表计算"""
+    try:
+        return conn.execute(f"SELECT {STATS_COLUMNS} FROM {STATS_TABLE}").fetchall()
+    except sqlite3.OperationalError:
+        return compute_stats(conn)
+
+
+def merge_stats(rows, channel=None):
+    """将统计行合并为统计结果（分区存储合并各分区的统计行）
+
+    Args:
+        rows: 统计行列表（列顺序见STATS_COLUMNS）
+        channel: 通道ID，None表示合并所有通道
+
+    Returns:
+        字典：cycle_count、raw_count、earliest_cycle、latest_cycle、earliest_raw、latest_raw
+        （时间戳字符串，没有数据时为None）、last_cycle_id、last_raw_id
+    """
+    result = {}
+    bounds = {}
+    for name in STATS_TABLES.values():
+        result.update({f"{name}_count": 0, f"earliest_{name}": None, f"latest_{name}": None, f"last_{name}_id": 0})
+        bounds[name] = [None, None]
+    for table, row_channel, count, first_us, first_timestamp, last_us, last_timestamp, last_id in rows:
+        if table not in STATS_TABLES or (channel is not None and row_channel != channel):
+            continue
+        name = STATS_TABLES[table]
+        result[f"{name}_count"] += count
+        result[f"last_{name}_id"] = max(result[f"last_{name}_id"], last_id or 0)
+        earliest, latest = bounds[name]
+        if first_us is not None and (earliest is None or first_us < earliest):
+            bounds[name][0] = first_us
+            result[f"earliest_{name}"] = first_timestamp
+        if last_us is not None and (latest is None or last_us >= latest):
+            bounds[name][1] = last_us
+            result[f"latest_{name}"] = last_timestamp
+    return result
+
+
+def read_stats(conn, channel=None):
+    """读取统计结果（见merge_stats）"""
+    return merge_stats(read_stats_rows(conn), channel)
@@ -0,0 +1,61 @@
+"""存储后端
+
+采集程序、GUI和Web服务只通过DatabaseManager的公开方法读写数据：
+
+    写入  save_cycle_data / save_raw_data / save_cycle_batch / save_raw_batch / write_batch
+    查询  get_cycle_data / get_raw_data / get_cycle_page / get_raw_page / get_latest_cycle_data /
+          get_cycle_data_by_time / get_cycles_after / get_rollup / get_stats / get_cycle_count /
+          get_raw_count / get_channels
+    其他  connected / db_path / close
+
+以下存储都实现了这组方法，可以互相替换：
+
+    sqlite     DatabaseManager，单个SQLite数据库文件（默认）
+    sqlite + --partition
+               PartitionedStore，按天或按周分区的SQLite文件，可按保留期删除整个分区
+    cycle-log  CycleLogStore，追加写入的固定长度周期记录，按时间范围读取时直接内存映射，
+               适合高频采集（原始数据和预聚合表仍保存在日志目录中的SQLite文件）
+
+查询结果中的周期数据可能是编码后的二进制（SQLite）或数组（周期日志），统一用
+codec.decode_cycle/decode_cycles转换为float64数组。
+"""
+import os
+
+from .cycle_log import CycleLogStore
+from .database import DatabaseManager, get_application_path
+from .partitions import PartitionedStore
+
+SQLITE = "sqlite"
+CYCLE_LOG = "cycle-log"
+BACKENDS = (SQLITE, CYCLE_LOG)
+
+# GUI和Web服务通过该环境变量使用周期日志存储（值为日志目录）
+CYCLE_LOG_ENV = "GIS_PD_CYCLE_LOG_DIR"
+
+
+def open_storage(backend=SQLITE, path=None, partition=None, retention_days=None, raw_compression=None,
+                 cycle_codec=None):
+    """创建写入端使用的存储对象
+
+    Args:
+        backend: SQLITE 或 CYCLE_LOG
+        path: 数据库文件路径，分区存储和周期日志为目录；None时使用程序目录下的默认位置
+        partition: 分区周期（partitions.DAY/WEEK），只用于SQLite
+        retention_days: 分区数据的保留天数，只用于分区存储
+        raw_compression: 原始数据的压缩方式
+        cycle_codec: 周期数据的编码方式，只用于SQLite（周期日志按固定长度的数组保存）
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的存储后端: {backend}")
+    if backend == CYCLE_LOG:
+        if partition or retention_days is not None or cycle_codec:
+            raise ValueError("周期日志存储不支持分区、保留期和周期数据编码方式")
+        return CycleLogStore(path or os.path.join(get_application_path(), "gis_pd_cycle_log"),
+                             raw_compression=raw_compression)
+    if partition:
+        return PartitionedStore(path or os.path.join(get_application_path(), "gis_pd_partitions"),
+                                partition, retention_days=retention_days,
+                                raw_compression=raw_compression, cycle_codec=cycle_codec)
+    if retention_days is not None:
+        raise ValueError("保留期需要与分区存储一起使用")
+    return DatabaseManager(db_path=path, raw_compression=raw_compression, cycle_codec=cycle_codec)
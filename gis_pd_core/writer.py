@@ -0,0 +1,191 @@
+"""分组提交写库线程
+
+调用方（GUI主线程、采集程序）只把待写入的行放入队列，由独立的写库线程
+攒够max_batch_rows行或等待超过max_delay_ms毫秒后，通过
+DatabaseManager.write_batch在一个事务中executemany并只提交一次，
+避免每条数据单独提交带来的磁盘同步开销阻塞界面。
+close()会先写入队列中剩余的全部数据再退出线程。
+每次提交成功后可以通知Web服务立即推送新数据（见notify模块）。
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .database import format_timestamp
+
+# 队列中的记录类型
+_CYCLE = "cycle"
+_RAW = "raw"
+_FLUSH = "flush"
+_STOP = "stop"
+
+# 默认每个事务最多写入的行数
+DEFAULT_MAX_BATCH_ROWS = 500
+# 默认攒批的最长等待时间(毫秒)：新数据最多延迟30毫秒写入数据库并通知Web服务推送，
+# 50Hz采集时每次提交约2行；GUI、采集程序和基准测试都使用这一默认值
+DEFAULT_MAX_DELAY_MS = 30
+
+
+class BatchWriter:
+    """分组提交写库线程"""
+    def __init__(self, db_manager, max_batch_rows=DEFAULT_MAX_BATCH_ROWS, max_delay_ms=DEFAULT_MAX_DELAY_MS,
+                 max_queue=100000, notifier=None):
+        """初始化写库线程
+
+        Args:
+            db_manager: 数据库管理器，需提供write_batch方法
+            max_batch_rows: 一次事务最多写入的行数，攒够即提交
+            max_delay_ms: 第一行入队后最长等待时间(毫秒)，超时即提交
+            max_queue: 队列容量，队列满时调用方阻塞等待（不丢数据）
+            notifier: 提交了周期数据后调用notifier.notify()（见notify.ChangeNotifier），None表示不通知
+        """
+        self.db_manager = db_manager
+        self.notifier = notifier
+        self.max_batch_rows = max(1, int(max_batch_rows))
+        self.max_delay = max(0.0, max_delay_ms / 1000.0)
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self.batch_count = 0
+        self.row_count = 0
+        self.failed_batches = 0
+        self.max_batch_size = 0
+        self.total_commit_time = 0.0
+        self.last_commit_time = 0.0
+        self.max_commit_time = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="BatchWriter", daemon=True)
+        self._thread.start()
+
+    def save_cycle(self, cycle_number, data, channel="", timestamp=None):
+        """将一条周期数据放入写库队列（时间戳在入队时确定），数据无法转换为数值时返回False"""
+        return self.save_cycle_batch([(timestamp or format_timestamp(), cycle_number, data, channel)])
+
+    def save_raw(self, broker, topic, raw_data, channel="", timestamp=None):
+        """将一条原始数据放入写库队列"""
+        return self._put((_RAW, (timestamp or format_timestamp(), broker, topic, raw_data, channel)))
+
+    def save_cycle_batch(self, records):
+        """批量放入周期数据，records为 (timestamp, cycle_number, data, channel) 元组列表
+
+        周期数据在调用方线程中转换为float64数组，无法转换时整批不入队并返回False，
+        错误的数据不会进入写库线程
+        """
+        try:
+            records = [(timestamp, cycle_number, np.asarray(data, dtype=np.float64), channel)
+                       for timestamp, cycle_number, data, channel in records]
+        except (TypeError, ValueError) as e:
+            print(f"周期数据格式错误，未保存: {str(e)}")
+            return False
+        for record in records:
+            if not self._put((_CYCLE, record)):
+                return False
+        return True
+
+    def save_raw_batch(self, records):
+        """批量放入原始数据，records为 (timestamp, broker, topic, raw_data, channel) 元组列表"""
+        for record in records:
+            if not self._put((_RAW, record)):
+                return False
+        return True
+
+    def _put(self, item):
+        if self._closed:
+            print("写库线程已关闭，数据未保存")
+            return False
+        self.queue.put(item)
+        return True
+
+    def flush(self, timeout=None):
+        """立即提交队列中已有的数据，并等待提交完成"""
+        if self._closed or not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self.queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """写入剩余的全部数据后停止写库线程"""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put((_STOP, None))
+        self._thread.join(timeout)
+
+    def _run(self):
+        """写库线程主循环"""
+        cycle_rows = []
+        raw_rows = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, payload = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                # 等待超时，提交当前批次
+                self._commit(cycle_rows, raw_rows)
+                cycle_rows, raw_rows, deadline = [], [], None
+                continue
+
+            if kind == _CYCLE:
+                cycle_rows.append(payload)
+            elif kind == _RAW:
+                raw_rows.append(payload)
+            else:
+                self._commit(cycle_rows, raw_rows)
+                cycle_rows, raw_rows, deadline = [], [], None
+                if kind == _FLUSH:
+                    payload.set()
+                    continue
+                break
+
+            if deadline is None:
+                deadline = time.monotonic() + self.max_delay
+            if len(cycle_rows) + len(raw_rows) >= self.max_batch_rows:
+                self._commit(cycle_rows, raw_rows)
+                cycle_rows, raw_rows, deadline = [], [], None
+
+    def _commit(self, cycle_rows, raw_rows):
+        """在一个事务中写入一批数据并记录提交耗时"""
+        size = len(cycle_rows) + len(raw_rows)
+        if size == 0:
+            return
+        start = time.perf_counter()
+        try:
+            ok = self.db_manager.write_batch(cycle_rows, raw_rows)
+        except Exception as e:
+            # 任何错误都只丢弃这一批，写库线程继续运行
+            print(f"写库线程提交错误: {str(e)}")
+            ok = False
+        elapsed = time.perf_counter() - start
+        if ok and cycle_rows and self.notifier is not None:
+            self.notifier.notify()
+        with self._stats_lock:
+            if not ok:
+                self.failed_batches += 1
+                return
+            self.batch_count += 1
+            self.row_count += size
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.total_commit_time += elapsed
+            self.last_commit_time = elapsed
+            self.max_commit_time = max(self.max_commit_time, elapsed)
+
+    def get_stats(self):
+        """获取写库统计信息（批大小、提交耗时(毫秒)、队列深度）"""
+        with self._stats_lock:
+            batches = self.batch_count
+            return {
+                "pending": self.queue.qsize(),
+                "batches": batches,
+                "rows": self.row_count,
+                "failed_batches": self.failed_batches,
+                "avg_batch_size": self.row_count / batches if batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "last_commit_ms": self.last_commit_time * 1000.0,
+                "avg_commit_ms": self.total_commit_time * 1000.0 / batches if batches else 0.0,
+                "max_commit_ms": self.max_commit_time * 1000.0,
+            }
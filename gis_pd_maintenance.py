@@ -0,0 +1,10 @@
+"""GIS局部放电数据库维护工具入口（数据格式转换、空间回收等）
+
+    python gis_pd_maintenance.py migrate-cycles --vacuum
+"""
+import sys
+
+from gis_pd_core.maintenance import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,5 @@
 import sys
 import numpy as np
-import paho.mqtt.client as mqtt
 import matplotlib
 # 在导入Figure前设置matplotlib使用PySide6后端
 matplotlib.use('QtAgg')
@@ -17,11 +16,14 @@ from PySide6.QtCore import Qt, QTimer, Signal, Slot, QThread, QMutex, QDateTime
 from matplotlib import rcParams
 from mpl_toolkits.mplot3d import Axes3D
 import time
-import queue
-import sqlite3
 import os
 import datetime
 import csv  # 导入csv模块用于保存CSV文件
+from gis_pd_core import DatabaseManager, BatchWriter, CycleQuery, DROP_OLDEST, decode_raw, format_timestamp
+from gis_pd_core.charts import prpd_edges, prpd_histogram, prps_matrix
+from gis_pd_core.mqtt_ingest import MQTTIngestClient
+from gis_pd_core.notify import ChangeNotifier
+from gis_pd_core.storage import open_storage, CYCLE_LOG, CYCLE_LOG_ENV
 
 # 设置matplotlib中文支持
 rcParams['font.sans-serif'] = ['SimHei']  # 设置中文字体支持
@@ -32,208 +34,25 @@ matplotlib.rcParams['path.simplify'] = True
 matplotlib.rcParams['path.simplify_threshold'] = 1.0
 matplotlib.rcParams['agg.path.chunksize'] = 10000
 
-class DatabaseManager:
-    """数据库管理类，负责数据库的连接、创建表和数据存储"""
-    def __init__(self, db_name="gis_pd_data.db"):
-        """初始化数据库连接"""
-        # 数据库文件路径
-        try:
-            # 获取应用程序根目录
-            if getattr(sys, 'frozen', False):
-                # 如果是打包后的应用程序，使用可执行文件所在目录
-                # 注意：不使用sys._MEIPASS，因为那是临时目录，应用关闭后会被删除
-                application_path = os.path.dirname(sys.executable)
-            else:
-                # 如果是普通Python脚本，使用脚本所在目录
-                application_path = os.path.dirname(os.path.abspath(__file__))
-            
-            # 数据库文件保存在应用程序目录下
-            self.db_path = os.path.join(application_path, db_name)
-            print(f"数据库路径: {self.db_path}")
-        except Exception as e:
-            # 如果出错，回退到当前工作目录
-            self.db_path = os.path.join(os.getcwd(), db_name)
-            print(f"获取应用路径出错，使用当前工作目录: {self.db_path}, 错误: {str(e)}")
-        
-        self.conn = None
-        self.cursor = None
-        self.connected = False
-        
-        # 创建数据库连接，使用check_same_thread=False允许在不同线程中使用
-        try:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.cursor = self.conn.cursor()
-            self.connected = True
-            
-            # 创建数据表
-            self.create_tables()
-            
-            print(f"数据库连接成功: {self.db_path}")
-        except sqlite3.Error as e:
-            print(f"数据库连接错误: {str(e)}")
-    
-    def create_tables(self):
-        """创建必要的数据表"""
-        if not self.connected:
-            return
-            
-        try:
-            # 创建周期数据表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS cycle_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    cycle_number INTEGER NOT NULL,
-                    data BLOB NOT NULL
-                )
-            ''')
-            
-            # 创建原始数据表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS raw_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    broker TEXT NOT NULL,
-                    topic TEXT NOT NULL,
-                    raw_data BLOB NOT NULL
-                )
-            ''')
-            
-            self.conn.commit()
-        except sqlite3.Error as e:
-            print(f"创建数据表错误: {str(e)}")
-    
-    def save_cycle_data(self, cycle_number, data):
-        """保存周期数据"""
-        if not self.connected:
-            return
-            
-        try:
-            # 将数据列表转换为字符串存储
-            data_str = ','.join(map(str, data))
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-            
-            self.cursor.execute(
-                "INSERT INTO cycle_data (timestamp, cycle_number, data) VALUES (?, ?, ?)",
-                (timestamp, cycle_number, data_str)
-            )
-            self.conn.commit()
-            return True
-        except sqlite3.Error as e:
-            print(f"保存周期数据错误: {str(e)}")
-            return False
-    
-    def save_raw_data(self, broker, topic, raw_data):
-        """保存原始数据"""
-        if not self.connected:
-            return
-            
-        try:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-            
-            self.cursor.execute(
-                "INSERT INTO raw_data (timestamp, broker, topic, raw_data) VALUES (?, ?, ?, ?)",
-                (timestamp, broker, topic, raw_data)
-            )
-            self.conn.commit()
-            return True
-        except sqlite3.Error as e:
-            print(f"保存原始数据错误: {str(e)}")
-            return False
-    
-    def get_cycle_data(self, limit=100, offset=0):
-        """获取周期数据"""
-        if not self.connected:
-            return []
-            
-        try:
-            self.cursor.execute(
-                "SELECT * FROM cycle_data ORDER BY timestamp DESC LIMIT ? OFFSET ?",
-                (limit, offset)
-            )
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print(f"获取周期数据错误: {str(e)}")
-            return []
-    
-    def get_raw_data(self, limit=100, offset=0):
-        """获取原始数据"""
-        if not self.connected:
-            return []
-            
-        try:
-            self.cursor.execute(
-                "SELECT * FROM raw_data ORDER BY timestamp DESC LIMIT ? OFFSET ?",
-                (limit, offset)
-            )
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print(f"获取原始数据错误: {str(e)}")
-            return []
-    
-    def get_cycle_count(self):
-        """获取周期数据总数"""
-        if not self.connected:
-            return 0
-            
-        try:
-            self.cursor.execute("SELECT COUNT(*) FROM cycle_data")
-            return self.cursor.fetchone()[0]
-        except sqlite3.Error as e:
-            print(f"获取周期数据总数错误: {str(e)}")
-            return 0
-    
-    def get_raw_count(self):
-        """获取原始数据总数"""
-        if not self.connected:
-            return 0
-            
-        try:
-            self.cursor.execute("SELECT COUNT(*) FROM raw_data")
-            return self.cursor.fetchone()[0]
-        except sqlite3.Error as e:
-            print(f"获取原始数据总数错误: {str(e)}")
-            return 0
-    
-    def get_latest_cycle_data(self, count=1):
-        """获取最新的周期数据"""
-        if not self.connected:
-            return []
-            
-        try:
-            self.cursor.execute(
-                "SELECT * FROM cycle_data ORDER BY timestamp DESC LIMIT ?",
-                (count,)
-            )
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print(f"获取最新周期数据错误: {str(e)}")
-            return []
-    
-    def get_cycle_data_by_time(self, start_time, end_time):
-        """根据时间范围获取周期数据"""
-        if not self.connected:
-            return []
-            
-        try:
-            self.cursor.execute(
-                "SELECT * FROM cycle_data WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp",
-                (start_time, end_time)
-            )
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print(f"根据时间范围获取周期数据错误: {str(e)}")
-            return []
-    
-    def close(self):
-        """关闭数据库连接"""
-        if self.connected:
-            try:
-                self.conn.close()
-                self.connected = False
-                print("数据库连接已关闭")
-            except sqlite3.Error as e:
-                print(f"关闭数据库连接错误: {str(e)}")
+def draw_prpd_density(axes, cycles, convert=None):
+    """绘制PRPD密度图（相位区间 x 幅值区间的采样点数，见gis_pd_core.charts），绘制时间与周期数无关
+
+    Args:
+        convert: 幅值单位转换函数，None表示使用毫伏
+
+    Returns:
+        (有采样点的幅值范围的下限, 上限)，没有数据时为None
+    """
+    counts = prpd_histogram(cycles)
+    phase_edges, amplitude_edges = prpd_edges()
+    if convert is not None:
+        amplitude_edges = convert(amplitude_edges)
+    # 没有采样点的单元不着色
+    axes.pcolormesh(phase_edges, amplitude_edges, np.ma.masked_equal(counts.T, 0), cmap='viridis')
+    occupied = np.flatnonzero(counts.sum(axis=0))
+    if not occupied.size:
+        return None
+    return amplitude_edges[occupied[0]], amplitude_edges[occupied[-1] + 1]
 
 class MplCanvas(FigureCanvas):
     """Matplotlib画布类，用于在Qt界面中嵌入matplotlib图形"""
@@ -266,54 +85,58 @@ class MplCanvas(FigureCanvas):
             self.surface = None
 
 class MQTTThread(QThread):
-    """MQTT处理线程，避免阻塞主线程"""
+    """MQTT处理线程，避免阻塞主线程
+
+    线程内运行paho的loop_forever：由套接字可读事件驱动，收到消息后立即回调，
+    空闲时阻塞在select上不占用CPU；断线后由paho按退避间隔自动重连。
+    """
     def __init__(self, client):
         super().__init__()
         self.client = client
-        self.running = True
-        self.mutex = QMutex()  # 添加互斥锁保护running变量
         
     def run(self):
-        while True:
-            self.mutex.lock()
-            if not self.running:
-                self.mutex.unlock()
-                break
-            self.mutex.unlock()
-            
-            try:
-                self.client.loop(0.1)  # 非阻塞处理MQTT消息
-            except Exception as e:
-                print(f"MQTT线程错误: {str(e)}")
-                
-            time.sleep(0.01)  # 避免CPU占用过高
+        try:
+            # 阻塞运行，直到调用client.disconnect()
+            self.client.loop_forever(retry_first_connection=True)
+        except Exception as e:
+            print(f"MQTT线程错误: {str(e)}")
             
     def stop(self):
-        self.mutex.lock()
-        self.running = False
-        self.mutex.unlock()
-        # 确保线程能够退出循环
-        self.client.loop_stop()
+        # 主动断开连接会唤醒select并使loop_forever返回
+        try:
+            self.client.disconnect()
+        except Exception as e:
+            print(f"停止MQTT线程错误: {str(e)}")
 
 class MQTTClient(QWidget):
-    """MQTT客户端类，处理MQTT连接和消息接收"""
-    message_received = Signal(list)  # 信号：接收到新消息时发出
+    """MQTT客户端类，处理MQTT连接和消息接收
+
+    连接、订阅和解码逻辑由gis_pd_core.MQTTIngestClient实现（与无界面采集程序共用），
+    本类负责在网络线程和Qt主线程之间通过信号传递数据。
+    """
+    message_received = Signal(list)  # 信号：接收到新消息时发出，传递一批(通道ID, 周期数据, 接收时间)元组
     connection_status = Signal(bool, str)  # 信号：连接状态变化时发出
-    raw_data_received = Signal(str, str, str)  # 信号：接收到原始数据时发出，传递broker、topic和数据
+    raw_data_received = Signal(str, str, object, str, str)  # 信号：接收到原始数据时发出，传递broker、topic、原始负载(bytes)、通道ID和接收时间戳
 
-    def __init__(self):
+    def __init__(self, queue_size=500, overflow_policy=DROP_OLDEST, block_timeout=0.5):
+        """初始化MQTT客户端
+
+        Args:
+            queue_size: 消息环形缓冲区容量（周期数）
+            overflow_policy: 缓冲区满时的策略：丢弃最早(drop_oldest)、丢弃最新(drop_newest)或阻塞(block)
+            block_timeout: 阻塞策略下MQTT线程的最长等待时间(秒)
+        """
         super().__init__()
-        self.client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
-        self.client.on_disconnect = self.on_disconnect
+        self.ingest = MQTTIngestClient(queue_size=queue_size, overflow_policy=overflow_policy,
+                                       block_timeout=block_timeout)
+        self.ingest.on_status = self.on_status
+        self.ingest.on_raw = self.on_raw
         
-        self.broker_address = "192.168.16.135"
-        self.broker_port = 1883
+        self.broker_address = self.ingest.broker_address
+        self.broker_port = self.ingest.broker_port
         self.topic = "pub1"
         self.connected = False
         self.mqtt_thread = None
-        self.message_queue = queue.Queue(maxsize=10)  # 限制队列大小，避免内存溢出
         
         # 数据库管理器
         self.db_manager = None
@@ -323,12 +146,21 @@ class MQTTClient(QWidget):
         self.queue_timer.timeout.connect(self.process_message_queue)
         self.queue_timer.start(50)  # 每50ms处理一次队列
 
+    @property
+    def client(self):
+        """当前的paho客户端"""
+        return self.ingest.client
+
     def set_database_manager(self, db_manager):
         """设置数据库管理器"""
         self.db_manager = db_manager
 
     def connect_to_broker(self, broker_address, broker_port, topic):
-        """连接到MQTT Broker"""
+        """连接到MQTT Broker
+
+        Args:
+            topic: 订阅的主题，多个主题用逗号分隔，支持+/#通配符，每个主题对应一个通道
+        """
         # 如果已经连接，先断开
         if self.connected:
             self.disconnect_from_broker()
@@ -338,14 +170,9 @@ class MQTTClient(QWidget):
         self.topic = topic
         
         try:
-            # 重新创建MQTT客户端，确保状态干净
-            self.client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
-            self.client.on_connect = self.on_connect
-            self.client.on_message = self.on_message
-            self.client.on_disconnect = self.on_disconnect
-            
-            # 连接到Broker
-            self.client.connect(self.broker_address, self.broker_port)
+            # 重新创建MQTT客户端并连接到Broker
+            topics = [t.strip() for t in self.topic.split(',') if t.strip()]
+            self.ingest.connect(self.broker_address, self.broker_port, topics)
             
             # 重新启动消息队列处理定时器
             if hasattr(self, 'queue_timer') and not self.queue_timer.isActive():
@@ -371,14 +198,6 @@ class MQTTClient(QWidget):
             if hasattr(self, 'queue_timer') and self.queue_timer.isActive():
                 self.queue_timer.stop()
             
-            # 清空消息队列
-            while not self.message_queue.empty():
-                try:
-                    self.message_queue.get_nowait()
-                    self.message_queue.task_done()
-                except queue.Empty:
-                    break
-            
             # 停止MQTT消息处理线程
             if self.mqtt_thread and self.mqtt_thread.isRunning():
                 self.mqtt_thread.stop()
@@ -387,14 +206,14 @@ class MQTTClient(QWidget):
                     print("MQTT线程停止超时")
                 self.mqtt_thread = None
             
-            # 断开MQTT连接，但不等待回调
+            # 断开MQTT连接，并唤醒可能因阻塞策略而等待的MQTT线程
             try:
-                if hasattr(self.client, '_sock') and self.client._sock:
-                    self.client.disconnect()
-                    # 确保完全断开连接
-                    self.client.loop_stop()
+                self.ingest.disconnect()
             except Exception as e:
                 print(f"断开MQTT连接时发生错误: {str(e)}")
+            
+            # 清空消息队列
+            self.ingest.clear()
                 
             # 发出连接状态信号
             self.connection_status.emit(False, "已断开连接")
@@ -403,66 +222,37 @@ class MQTTClient(QWidget):
             print(f"断开连接时发生错误: {str(e)}")
             self.connection_status.emit(False, f"断开连接失败: {str(e)}")
 
-    def on_connect(self, client, userdata, flags, rc, properties):
-        """连接回调函数"""
-        if rc == 0:
-            self.connected = True
-            client.subscribe(self.topic, qos=1)
-            self.connection_status.emit(True, f"已连接到 {self.broker_address}:{self.broker_port}")
-        else:
-            self.connected = False
-            self.connection_status.emit(False, f"连接失败，返回码: {rc}")
+    def on_status(self, connected, message):
+        """连接状态回调函数（在MQTT线程中调用，通过信号转发到主线程）"""
+        self.connected = connected
+        self.connection_status.emit(connected, message)
 
-    def on_disconnect(self, client, userdata, rc, properties=None, *args):
-        """断开连接回调函数"""
-        self.connected = False
-        self.connection_status.emit(False, "已断开连接")
+    def on_raw(self, broker, topic, payload, timestamp, channel):
+        """原始数据回调函数（在MQTT线程中调用）"""
+        # 发出原始数据信号，让主线程处理数据库保存
+        if self.db_manager is not None:
+            # 直接传递原始负载字节，不在接收路径上做十六进制转换
+            self.raw_data_received.emit(broker, topic, payload, channel, format_timestamp(timestamp))
 
     def process_message_queue(self):
-        """处理消息队列"""
-        if not self.message_queue.empty():
-            try:
-                data = self.message_queue.get_nowait()
-                self.message_received.emit(data)
-                self.message_queue.task_done()
-            except queue.Empty:
-                pass
+        """处理消息队列，每次批量取出所有通道积压的周期数据"""
+        batch = self.ingest.drain()
+        if batch:
+            # 保留MQTT线程中记录的接收时间，数据在队列中等待时不改变写入数据库的时间戳
+            self.message_received.emit([(cycle.channel, cycle.data, cycle.timestamp) for cycle in batch])
 
-    def on_message(self, client, userdata, msg):
-        """消息接收回调函数"""
-        try:
-            hex_message = msg.payload.hex()  # 解码消息内容为十六进制字符串
-            
-            # 发出原始数据信号，让主线程处理数据库保存
-            if hasattr(self, 'db_manager') and self.db_manager is not None:
-                # 使用信号将原始数据发送到主线程，而不是直接在MQTT线程中保存
-                self.raw_data_received.emit(self.broker_address, self.topic, hex_message)
-                
-            results = []
-            for i in range(0, len(hex_message), 4):  # 每4个字符解析为一个16进制数
-                if i + 4 <= len(hex_message):
-                    hex_value = hex_message[i:i+4]
-                    decimal_value = int(hex_value, 16)
-                    converted_value = decimal_value * 3.3 / 4096
-                    results.append(round(converted_value, 2))  # 保留两位小数
-            
-            meaningful_data = results[4:-1]  # 去掉前4个和最后一个数据
-            
-            # 将数据放入队列，而不是直接发送信号
-            # 如果队列已满，则丢弃这条消息，避免处理积压
-            try:
-                self.message_queue.put_nowait(meaningful_data)
-            except queue.Full:
-                pass
-                
-        except Exception as e:
-            print(f"消息处理错误: {str(e)}")
+    def get_queue_stats(self):
+        """获取消息队列统计信息（深度、丢弃数等）"""
+        return self.ingest.get_queue_stats()
 
 class DatabaseViewDialog(QDialog):
     """数据库查看对话框"""
-    def __init__(self, db_manager, parent=None):
+    def __init__(self, db_manager, parent=None, cycle_query=None):
         super().__init__(parent)
         self.db_manager = db_manager
+        # 周期数据查询层（主窗口共享解码缓存，重复查询最新数据时不再重复解码）
+        self.cycle_query = cycle_query or CycleQuery(db_manager)
+        self.query_batch = None
         self.setWindowTitle("数据库数据查看")
         self.setMinimumSize(800, 600)
         
@@ -514,11 +304,24 @@ class DatabaseViewDialog(QDialog):
         self.query_button.clicked.connect(self.query_data)
         query_layout.addWidget(self.query_button, 0, 5)
         
+        # 添加通道选择
+        query_layout.addWidget(QLabel("通道:"), 0, 6)
+        self.channel_combo = QComboBox()
+        self.channel_combo.addItem("全部通道")
+        for channel in self.db_manager.get_channels() if self.db_manager else []:
+            self.channel_combo.addItem(channel if channel else "(未标记)", channel)
+        query_layout.addWidget(self.channel_combo, 0, 7)
+        
         # 添加查看PRPD/PRPS图按钮 (只对周期数据有效)
         self.generate_prpd_button = QPushButton("查看PRPD/PRPS图")
         self.generate_prpd_button.clicked.connect(self.view_historical_charts)
         query_layout.addWidget(self.generate_prpd_button, 1, 6)
         
+        # 添加趋势图按钮（读取预聚合表，适合长时间范围）
+        self.trend_button = QPushButton("查看趋势图")
+        self.trend_button.clicked.connect(self.view_trend_chart)
+        query_layout.addWidget(self.trend_button, 1, 7)
+        
         query_group.setLayout(query_layout)
         layout.addWidget(query_group)
         
@@ -554,7 +357,25 @@ class DatabaseViewDialog(QDialog):
             return
         
         # 创建新的对话框显示历史数据可视化
-        dialog = HistoricalChartsDialog(self.query_results, self)
+        dialog = HistoricalChartsDialog(self.query_batch, self)
+        dialog.exec()
+    
+    def view_trend_chart(self):
+        """显示所选时间范围内的长时间趋势（预聚合数据）"""
+        if not self.db_manager or not self.db_manager.connected:
+            QMessageBox.warning(self, "无法生成趋势图", "数据库未连接")
+            return
+        
+        start_time = self.start_time_edit.dateTime().toString("yyyy-MM-dd hh:mm:ss")
+        end_time = self.end_time_edit.dateTime().toString("yyyy-MM-dd hh:mm:ss")
+        channel = self.channel_combo.currentData() if self.channel_combo.currentIndex() > 0 else None
+        
+        rollup = self.db_manager.get_rollup(start_time, end_time, channel=channel, points=500)
+        if rollup is None or not rollup["time_us"].size:
+            QMessageBox.warning(self, "无法生成趋势图", "所选时间范围内没有预聚合数据")
+            return
+        
+        dialog = TrendChartDialog(rollup, self)
         dialog.exec()
     
     def show_data_details(self, index):
@@ -576,9 +397,10 @@ class DatabaseViewDialog(QDialog):
         
         if data_type == "周期数据":
             # 显示周期数据详情
-            id_label = QLabel(f"ID: {data_row[0]}")
-            timestamp_label = QLabel(f"时间戳: {data_row[1]}")
-            cycle_label = QLabel(f"周期编号: {data_row[2]}")
+            batch = self.query_batch
+            id_label = QLabel(f"ID: {batch.ids[row]}")
+            timestamp_label = QLabel(f"时间戳: {batch.timestamps[row]}")
+            cycle_label = QLabel(f"周期编号: {batch.cycle_numbers[row]}")
             
             layout.addWidget(id_label)
             layout.addWidget(timestamp_label)
@@ -588,8 +410,7 @@ class DatabaseViewDialog(QDialog):
             data_group = QGroupBox("数据内容")
             data_layout = QVBoxLayout()
             
-            data_str = data_row[3]
-            data_points = data_str.split(',')
+            data_points = [str(point) for point in batch.values[row].tolist()]
             
             # 创建数据表格
             data_table = QTableWidget()
@@ -621,7 +442,7 @@ class DatabaseViewDialog(QDialog):
             data_group = QGroupBox("原始数据")
             data_layout = QVBoxLayout()
             
-            raw_data = str(data_row[4])
+            raw_data = decode_raw(data_row[4]).hex()
             data_text = QLabel(raw_data)
             data_text.setWordWrap(True)
             data_text.setTextInteractionFlags(Qt.TextSelectableByMouse)
@@ -657,6 +478,9 @@ class DatabaseViewDialog(QDialog):
         start_time = self.start_time_edit.dateTime().toString("yyyy-MM-dd hh:mm:ss")
         end_time = self.end_time_edit.dateTime().toString("yyyy-MM-dd hh:mm:ss")
         
+        # 获取通道过滤条件（None表示全部通道）
+        channel = self.channel_combo.currentData() if self.channel_combo.currentIndex() > 0 else None
+        
         # 清空表格和结果
         self.table.clear()
         self.table.setRowCount(0)
@@ -670,43 +494,42 @@ class DatabaseViewDialog(QDialog):
             # 根据数据类型查询
             if data_type == "周期数据":
                 # 设置表头
-                self.table.setColumnCount(4)
-                self.table.setHorizontalHeaderLabels(["ID", "时间戳", "周期编号", "数据(前10个点)"])
+                self.table.setColumnCount(5)
+                self.table.setHorizontalHeaderLabels(["ID", "时间戳", "周期编号", "数据(前10个点)", "通道"])
                 
                 # 查询数据
-                data = []
                 if query_type == "最新数据":
-                    data = self.db_manager.get_latest_cycle_data(limit)
+                    batch = self.cycle_query.latest(limit, channel=channel)
                 else:  # 按时间范围
-                    data = self.db_manager.get_cycle_data_by_time(start_time, end_time)
+                    batch = self.cycle_query.by_time(start_time, end_time, channel=channel)
                 
-                # 保存查询结果
-                self.query_results = data
+                # 保存查询结果（解码后的周期数据）
+                self.query_batch = batch
+                self.query_results = batch.values
                 
                 # 填充表格
-                self.table.setRowCount(len(data))
-                for i, row in enumerate(data):
-                    self.table.setItem(i, 0, QTableWidgetItem(str(row[0])))
-                    self.table.setItem(i, 1, QTableWidgetItem(str(row[1])))
-                    self.table.setItem(i, 2, QTableWidgetItem(str(row[2])))
+                self.table.setRowCount(len(batch))
+                for i, data_points in enumerate(batch.values):
+                    self.table.setItem(i, 0, QTableWidgetItem(str(batch.ids[i])))
+                    self.table.setItem(i, 1, QTableWidgetItem(str(batch.timestamps[i])))
+                    self.table.setItem(i, 2, QTableWidgetItem(str(batch.cycle_numbers[i])))
                     
                     # 显示数据的前10个点
-                    data_str = row[3]
-                    data_points = data_str.split(',')
-                    preview = ','.join(data_points[:10])
+                    preview = ','.join(map(str, data_points[:10].tolist()))
                     if len(data_points) > 10:
                         preview += "..."
                     self.table.setItem(i, 3, QTableWidgetItem(preview))
+                    self.table.setItem(i, 4, QTableWidgetItem(str(batch.channels[i])))
                 
-                self.status_label.setText(f"已查询到 {len(data)} 条周期数据")
+                self.status_label.setText(f"已查询到 {len(batch)} 条周期数据")
             
             else:  # 原始数据
                 # 设置表头
-                self.table.setColumnCount(5)
-                self.table.setHorizontalHeaderLabels(["ID", "时间戳", "Broker", "主题", "原始数据(前30个字符)"])
+                self.table.setColumnCount(6)
+                self.table.setHorizontalHeaderLabels(["ID", "时间戳", "Broker", "主题", "原始数据(前30个字符)", "通道"])
                 
                 # 查询数据
-                data = self.db_manager.get_raw_data(limit)
+                data = self.db_manager.get_raw_data(limit, channel=channel)
                 
                 # 保存查询结果
                 self.query_results = data
@@ -720,11 +543,12 @@ class DatabaseViewDialog(QDialog):
                     self.table.setItem(i, 3, QTableWidgetItem(str(row[3])))
                     
                     # 显示原始数据的前30个字符
-                    raw_data = str(row[4])
+                    raw_data = decode_raw(row[4]).hex()
                     preview = raw_data[:30]
                     if len(raw_data) > 30:
                         preview += "..."
                     self.table.setItem(i, 4, QTableWidgetItem(preview))
+                    self.table.setItem(i, 5, QTableWidgetItem(str(row[5])))
                 
                 self.status_label.setText(f"已查询到 {len(data)} 条原始数据")
             
@@ -734,9 +558,43 @@ class DatabaseViewDialog(QDialog):
         except Exception as e:
             self.status_label.setText(f"查询数据错误: {str(e)}")
 
+class TrendChartDialog(QDialog):
+    """长时间趋势对话框（每个时间桶的最大幅值和脉冲数）"""
+    def __init__(self, rollup, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"趋势图（分辨率 {rollup['resolution']}）")
+        self.setMinimumSize(900, 600)
+        
+        layout = QVBoxLayout(self)
+        self.figure = Figure(figsize=(10, 6), dpi=100)
+        self.canvas = FigureCanvas(self.figure)
+        layout.addWidget(NavigationToolbar(self.canvas, self))
+        layout.addWidget(self.canvas)
+        
+        times = [datetime.datetime.fromtimestamp(t / 1e6) for t in rollup["time_us"].tolist()]
+        # fmax忽略没有采样点的相位区间
+        bucket_max = np.fmax.reduce(rollup["bin_max"], axis=1)
+        
+        ax = self.figure.add_subplot(111)
+        ax.plot(times, bucket_max, color='tab:red', linewidth=1, label='最大幅值')
+        ax.set_xlabel('时间')
+        ax.set_ylabel('最大幅值 (mV)')
+        ax2 = ax.twinx()
+        ax2.plot(times, rollup["pulse_count"], color='tab:blue', linewidth=1, label='脉冲数')
+        ax2.set_ylabel('脉冲数')
+        ax.set_title(f"趋势图（{len(times)} 个时间桶，每桶 {rollup['resolution']}）")
+        self.figure.autofmt_xdate()
+        self.figure.tight_layout()
+        self.canvas.draw()
+        
+        close_button = QPushButton("关闭")
+        close_button.clicked.connect(self.accept)
+        layout.addWidget(close_button)
+
 class HistoricalChartsDialog(QDialog):
     """历史数据可视化对话框"""
     def __init__(self, data, parent=None):
+        """data为查询结果（gis_pd_core.query.CycleBatch）"""
         super().__init__(parent)
         self.setWindowTitle("历史数据可视化")
         self.setMinimumSize(1000, 700)  # 增加对话框尺寸以容纳3D图
@@ -759,7 +617,7 @@ class HistoricalChartsDialog(QDialog):
         # 添加图表类型选择
         settings_layout.addWidget(QLabel("图表类型:"), 0, 0)
         self.chart_type_combo = QComboBox()
-        self.chart_type_combo.addItems(["PRPD散点图", "PRPD线图", "PRPS三维图"])
+        self.chart_type_combo.addItems(["PRPD散点图", "PRPD线图", "PRPD密度图", "PRPS三维图"])
         self.chart_type_combo.currentIndexChanged.connect(self.update_chart)
         settings_layout.addWidget(self.chart_type_combo, 0, 1)
         
@@ -908,17 +766,11 @@ class HistoricalChartsDialog(QDialog):
         cycle_labels = []
         
         # 只使用最新的N个数据点（根据范围设置）
-        selected_data = self.data[-data_range:]
-        
-        for row in selected_data:
-            # 周期数据存储在第3列(索引为2)
-            cycle_number = row[2]
+        values = self.data.values[-data_range:]
+        cycle_numbers = self.data.cycle_numbers[-data_range:]
+        for cycle_number, data_points in zip(cycle_numbers, values):
             cycle_labels.append(f"周期 {cycle_number}")
-            
-            # 数据字符串存储在第4列(索引为3)
-            data_str = row[3]
-            data_points = [float(point) for point in data_str.split(',')]
-            all_data.append(data_points)
+            all_data.append(data_points.tolist())
         
         # 清除当前图表并重新创建
         self.figure.clear()
@@ -949,46 +801,52 @@ class HistoricalChartsDialog(QDialog):
         if not all_data:
             self.axes_2d.text(0.5, 0.5, "没有数据可显示", ha='center', va='center')
             return
-            
-        # 合并所有周期的数据用于绘图
-        flattened_data = []
-        x_data = []
-        
-        for i, cycle_data in enumerate(all_data):
-            cycle_phases = np.linspace(0, 360, len(cycle_data))
-            flattened_data.extend(cycle_data)
-            x_data.extend(cycle_phases)
         
-        # 根据当前单位设置转换数据
-        if self.use_dbm:
-            display_data = []
-            for cycle_data in all_data:
-                display_data.append([self.convert_unit(x, True) for x in cycle_data])
-            
-            # 合并所有周期的转换后数据
-            all_display_data = []
-            for cycle_data in display_data:
-                all_display_data.extend(cycle_data)
+        if chart_type == "PRPD密度图":
+            # 密度图按区间统计采样点数，不展开逐点数据
+            convert = (lambda values: self.convert_unit(values, True)) if self.use_dbm else None
+            value_range = draw_prpd_density(self.axes_2d, all_data, convert)
+            all_display_data = list(value_range) if value_range else []
         else:
-            display_data = all_data
-            all_display_data = flattened_data
-        
-        if chart_type == "PRPD散点图":
-            self.axes_2d.scatter(x_data, all_display_data, alpha=0.7, s=10)
-        elif chart_type == "PRPD线图":
-            # 对于线图，按周期分别绘制
-            for i, cycle_data in enumerate(display_data):
+            # 合并所有周期的数据用于绘图
+            flattened_data = []
+            x_data = []
+        
+            for i, cycle_data in enumerate(all_data):
                 cycle_phases = np.linspace(0, 360, len(cycle_data))
-                # 仅当周期数不多时显示图例
-                if len(display_data) <= 10:
-                    self.axes_2d.plot(cycle_phases, cycle_data, linewidth=1.0, 
-                              label=cycle_labels[i])
-                else:
-                    self.axes_2d.plot(cycle_phases, cycle_data, linewidth=1.0)
+                flattened_data.extend(cycle_data)
+                x_data.extend(cycle_phases)
+        
+            # 根据当前单位设置转换数据
+            if self.use_dbm:
+                display_data = []
+                for cycle_data in all_data:
+                    display_data.append([self.convert_unit(x, True) for x in cycle_data])
             
-            # 如果周期数较少，添加图例
-            if len(display_data) <= 10:
-                self.axes_2d.legend(loc='upper right')
+                # 合并所有周期的转换后数据
+                all_display_data = []
+                for cycle_data in display_data:
+                    all_display_data.extend(cycle_data)
+            else:
+                display_data = all_data
+                all_display_data = flattened_data
+        
+            if chart_type == "PRPD散点图":
+                self.axes_2d.scatter(x_data, all_display_data, alpha=0.7, s=10)
+            elif chart_type == "PRPD线图":
+                # 对于线图，按周期分别绘制
+                for i, cycle_data in enumerate(display_data):
+                    cycle_phases = np.linspace(0, 360, len(cycle_data))
+                    # 仅当周期数不多时显示图例
+                    if len(display_data) <= 10:
+                        self.axes_2d.plot(cycle_phases, cycle_data, linewidth=1.0, 
+                                  label=cycle_labels[i])
+                    else:
+                        self.axes_2d.plot(cycle_phases, cycle_data, linewidth=1.0)
+            
+                # 如果周期数较少，添加图例
+                if len(display_data) <= 10:
+                    self.axes_2d.legend(loc='upper right')
         
         # 绘制参考正弦波
         if show_sine_wave:
@@ -1036,40 +894,21 @@ class HistoricalChartsDialog(QDialog):
             # 如果移除失败，直接忽略
             pass
         
-        # 只使用PRPS需要的最新周期数
-        prps_data = all_data[-self.prps_max_cycles:] if len(all_data) > self.prps_max_cycles else all_data
-        
         # 准备数据
-        num_cycles = len(prps_data)
-        if num_cycles == 0:
+        if not all_data:
             return
-            
-        # 找到所有周期中最大的数据点数
-        max_points = max(len(cycle_data) for cycle_data in prps_data)
+        
+        # 所有周期重采样到最长周期的点数；周期数超过prps_max_cycles时相邻周期按最大值包络合并为一行
+        z_data, _ = prps_matrix(all_data, max_rows=self.prps_max_cycles)
+        num_cycles, max_points = z_data.shape
         
         # 创建规则网格
-        phase = np.linspace(0, 360, max_points)
+        phase = np.arange(max_points) * (360 / max_points)
         cycles = np.arange(1, num_cycles + 1)
         
-        # 创建空的Z值矩阵
-        z_data = np.zeros((num_cycles, max_points))
-        
-        # 填充Z值矩阵
-        for i, cycle_data in enumerate(prps_data):
-            # 对于每个周期，我们需要将数据重采样到max_points个点
-            if len(cycle_data) == max_points:
-                z_data[i, :] = cycle_data
-            else:
-                # 如果周期的数据点数不等于max_points，则需要重采样
-                cycle_phases = np.linspace(0, 360, len(cycle_data))
-                z_data[i, :] = np.interp(phase, cycle_phases, cycle_data)
-        
         # 根据当前单位设置转换数据
         if self.use_dbm:
-            # 转换z_data中的每个值
-            for i in range(z_data.shape[0]):
-                for j in range(z_data.shape[1]):
-                    z_data[i, j] = self.convert_unit(z_data[i, j], True)
+            z_data = self.convert_unit(z_data, True)
         
         # 创建网格
         X, Y = np.meshgrid(phase, cycles)
@@ -1085,7 +924,10 @@ class HistoricalChartsDialog(QDialog):
         self.colorbar = self.figure.colorbar(surf, ax=self.axes_3d, shrink=0.5, aspect=5)
         
         # 设置图表标题和轴标签
-        self.axes_3d.set_title(f"历史PRPS图 ({num_cycles}个周期)")
+        if num_cycles < len(all_data):
+            self.axes_3d.set_title(f"历史PRPS图 ({len(all_data)}个周期，合并为{num_cycles}行)")
+        else:
+            self.axes_3d.set_title(f"历史PRPS图 ({num_cycles}个周期)")
         self.axes_3d.set_xlabel("相位)")
         self.axes_3d.set_ylabel("周期")
         self.axes_3d.set_zlabel(self.unit_label)
@@ -1160,7 +1002,10 @@ class MainWindow(QMainWindow):
         self.last_update_time = time.time()
         self.update_interval = 0.2  # 控制更新频率，每0.2秒更新一次
         
-        # 周期数据存储
+        # 周期数据存储（每个通道独立累积，图表显示当前选择的通道）
+        self.channel_data = {}  # 通道ID -> 累积的周期数据列表
+        self.channel_cycle_counts = {}  # 通道ID -> 当前周期计数
+        self.current_channel = None  # 当前显示的通道，收到第一个通道的数据时自动选择
         self.cycle_count = 1  # 当前周期计数
         self.max_cycles = 50  # 默认最大周期数，用于PRPD图
         self.prps_max_cycles = 50  # PRPS图固定显示最新的50个周期
@@ -1185,7 +1030,15 @@ class MainWindow(QMainWindow):
         
         # 数据库设置
         self.save_to_db = False  # 默认不保存数据到数据库
-        self.db_manager = DatabaseManager()  # 创建数据库管理器
+        # 创建数据库管理器；设置了环境变量GIS_PD_CYCLE_LOG_DIR时使用周期日志存储（见gis_pd_core.storage）
+        cycle_log_dir = os.environ.get(CYCLE_LOG_ENV)
+        self.db_manager = open_storage(CYCLE_LOG, cycle_log_dir) if cycle_log_dir else DatabaseManager()
+        # 数据库查看对话框使用的周期数据查询层（解码缓存在多次打开对话框之间保留）
+        self.cycle_query = CycleQuery(self.db_manager)
+        # 写库线程：分组提交，避免每个周期单独提交阻塞界面（攒批时间见writer.DEFAULT_MAX_DELAY_MS），
+        # 每次提交后通知Web服务立即推送新数据（见gis_pd_core.notify）
+        self.db_notifier = ChangeNotifier()
+        self.db_writer = BatchWriter(self.db_manager, notifier=self.db_notifier)
         
         # 获取保存路径信息
         self.get_save_paths()
@@ -1218,6 +1071,24 @@ class MainWindow(QMainWindow):
         # 标记是否需要重绘
         self.need_redraw = False
     
+    @property
+    def accumulated_data(self):
+        """当前通道累积的周期数据"""
+        return self.channel_data.setdefault(self.current_channel, [])
+    
+    @accumulated_data.setter
+    def accumulated_data(self, value):
+        self.channel_data[self.current_channel] = value
+    
+    @property
+    def cycle_count(self):
+        """当前通道的周期计数"""
+        return self.channel_cycle_counts.get(self.current_channel, 1)
+    
+    @cycle_count.setter
+    def cycle_count(self, value):
+        self.channel_cycle_counts[self.current_channel] = value
+    
     def setup_ui(self):
         """设置用户界面"""
         # 创建中央部件
@@ -1239,11 +1110,18 @@ class MainWindow(QMainWindow):
         self.broker_port_input = QLineEdit(str(self.mqtt_client.broker_port))
         connection_layout.addWidget(self.broker_port_input, 0, 3)
         
-        # 添加主题设置
+        # 添加主题设置（多个主题用逗号分隔，支持+/#通配符）
         connection_layout.addWidget(QLabel("主题:"), 1, 0)
         self.topic_input = QLineEdit(self.mqtt_client.topic)
+        self.topic_input.setToolTip("多个主题用逗号分隔，支持+/#通配符，每个主题对应一个通道")
         connection_layout.addWidget(self.topic_input, 1, 1)
         
+        # 添加显示通道选择
+        connection_layout.addWidget(QLabel("显示通道:"), 2, 0)
+        self.channel_combo = QComboBox()
+        self.channel_combo.currentTextChanged.connect(self.select_channel)
+        connection_layout.addWidget(self.channel_combo, 2, 1)
+        
         # 添加连接按钮
         self.connect_button = QPushButton("连接")
         self.connect_button.clicked.connect(self.toggle_connection)
@@ -1264,7 +1142,7 @@ class MainWindow(QMainWindow):
         # 添加图表类型选择
         chart_settings_layout.addWidget(QLabel("PRPD图类型:"), 0, 0)
         self.chart_type_combo = QComboBox()
-        self.chart_type_combo.addItems(["散点图", "线图"])
+        self.chart_type_combo.addItems(["散点图", "线图", "密度图"])
         self.chart_type_combo.currentIndexChanged.connect(self.update_plot_type)
         chart_settings_layout.addWidget(self.chart_type_combo, 0, 1)
         
@@ -1523,47 +1401,93 @@ class MainWindow(QMainWindow):
         self.canvas.draw()
         self.data_count_label.setText("数据点: 0")
     
-    def update_plot(self, data):
-        """更新数据，但不立即重绘"""
-        current_time = time.time()
+    def update_plot(self, batch):
+        """更新数据，但不立即重绘
+
+        Args:
+            batch: 一批(通道ID, 周期数据, 接收时间)元组，每个元组为一个周期
+        """
+        new_channels = []
+        current_updated = False
         
         # 更新数据缓冲区
         self.data_mutex.lock()
-        self.data_buffer = data
+        
+        # 第一次收到数据时自动显示第一个通道
+        if self.current_channel is None and batch:
+            self.channel_data.pop(None, None)
+            self.channel_cycle_counts.pop(None, None)
+            self.current_channel = batch[0][0]
         
         # 处理周期数据
-        # 每收到一次数据视为一个周期
-        if len(data) > 0:
-            # 添加新周期数据
-            self.accumulated_data.append(data)
+        # 每收到一次数据视为一个周期，按通道分别累积
+        touched_channels = set()
+        for channel, data, received in batch:
+            if len(data) == 0:
+                continue
             
-            # 如果累积的周期数超过PRPS的最大周期数，则移除最早的周期数据
-            # 但保留足够的数据以满足PRPD图和PRPS图的需求
-            max_needed_cycles = max(self.max_cycles, self.prps_max_cycles)
-            if len(self.accumulated_data) > max_needed_cycles:
-                self.accumulated_data = self.accumulated_data[-max_needed_cycles:]
+            if channel not in self.channel_data:
+                self.channel_data[channel] = []
+                new_channels.append(channel)
+            
+            # 添加新周期数据
+            self.channel_data[channel].append(data)
+            touched_channels.add(channel)
             
             # 更新周期计数
-            self.cycle_count = min(self.cycle_count + 1, self.max_cycles)
-            self.cycle_count_label.setText(f"{self.cycle_count}/{self.max_cycles}")
+            cycle_count = min(self.channel_cycle_counts.get(channel, 1) + 1, self.max_cycles)
+            self.channel_cycle_counts[channel] = cycle_count
+            
+            if channel == self.current_channel:
+                self.data_buffer = data
+                current_updated = True
             
             # 保存周期数据到数据库（确保在主线程中执行）
-            if self.save_to_db and self.db_manager is not None:
+            if self.save_to_db and self.db_writer is not None:
                 try:
-                    self.db_manager.save_cycle_data(self.cycle_count, data)
+                    self.db_writer.save_cycle(cycle_count, data, channel=channel,
+                                              timestamp=format_timestamp(received))
                 except Exception as e:
                     print(f"保存周期数据错误: {str(e)}")
         
+        # 如果累积的周期数超过PRPS的最大周期数，则移除最早的周期数据
+        # 但保留足够的数据以满足PRPD图和PRPS图的需求
+        max_needed_cycles = max(self.max_cycles, self.prps_max_cycles)
+        for channel in touched_channels:
+            if len(self.channel_data[channel]) > max_needed_cycles:
+                self.channel_data[channel] = self.channel_data[channel][-max_needed_cycles:]
+        
+        self.cycle_count_label.setText(f"{self.cycle_count}/{self.max_cycles}")
+        
         if len(self.data_buffer) > self.max_buffer_size:
             self.data_buffer = self.data_buffer[-self.max_buffer_size:]
         
-        self.need_redraw = True
+        if current_updated:
+            self.need_redraw = True
         self.data_mutex.unlock()
         
+        # 在释放锁之后更新通道列表（切换通道会再次加锁）
+        for channel in new_channels:
+            self.channel_combo.addItem(channel)
+        if new_channels and self.channel_combo.currentText() != self.current_channel:
+            self.channel_combo.setCurrentText(self.current_channel)
+        
         # 更新数据点数量标签
         total_points = sum(len(cycle_data) for cycle_data in self.accumulated_data)
         self.data_count_label.setText(f"数据点: {total_points}")
     
+    def select_channel(self, channel):
+        """切换图表显示的通道"""
+        if not channel:
+            return
+        self.data_mutex.lock()
+        self.current_channel = channel
+        data = self.accumulated_data
+        self.data_buffer = data[-1] if data else []
+        self.cycle_count_label.setText(f"{self.cycle_count}/{self.max_cycles}")
+        self.need_redraw = True
+        self.data_mutex.unlock()
+    
     def redraw_plot(self):
         """重绘图表，由定时器触发"""
         if not self.need_redraw:
@@ -1599,49 +1523,55 @@ class MainWindow(QMainWindow):
         
         # 只使用PRPD需要的周期数
         prpd_data = accumulated_data[-self.max_cycles:] if len(accumulated_data) > self.max_cycles else accumulated_data
+        phase_per_cycle = 360  # 每个周期的相位范围
         
-        # 合并所有周期的数据用于绘图
-        all_data = []
-        for cycle_data in prpd_data:
-            all_data.extend(cycle_data)
+        if chart_type == "密度图":
+            # 密度图按区间统计采样点数，不展开逐点数据
+            convert = (lambda values: self.convert_unit(values, True)) if self.use_dbm else None
+            value_range = draw_prpd_density(self.canvas.axes_2d, prpd_data, convert)
+            all_display_data = list(value_range) if value_range else []
+        else:
+            # 合并所有周期的数据用于绘图
+            all_data = []
+            for cycle_data in prpd_data:
+                all_data.extend(cycle_data)
         
-        if not all_data:
-            return
+            if not all_data:
+                return
             
-        # 创建X轴数据（相位）
-        # 对于累积数据，我们需要为每个周期的每个数据点分配相位值
-        phase_per_cycle = 360  # 每个周期的相位范围
-        x_data = []
+            # 创建X轴数据（相位）
+            # 对于累积数据，我们需要为每个周期的每个数据点分配相位值
+            x_data = []
         
-        for i, cycle_data in enumerate(prpd_data):
-            cycle_phases = np.linspace(0, phase_per_cycle, len(cycle_data))
-            x_data.extend(cycle_phases)
+            for i, cycle_data in enumerate(prpd_data):
+                cycle_phases = np.linspace(0, phase_per_cycle, len(cycle_data))
+                x_data.extend(cycle_phases)
         
-        # 根据当前单位设置转换数据
-        if self.use_dbm:
-            display_data = []
-            for cycle_data in prpd_data:
-                display_data.append([self.convert_unit(x, True) for x in cycle_data])
+            # 根据当前单位设置转换数据
+            if self.use_dbm:
+                display_data = []
+                for cycle_data in prpd_data:
+                    display_data.append([self.convert_unit(x, True) for x in cycle_data])
             
-            # 合并所有周期的转换后数据
-            all_display_data = []
-            for cycle_data in display_data:
-                all_display_data.extend(cycle_data)
-        else:
-            display_data = prpd_data
-            all_display_data = all_data
-        
-        if chart_type == "散点图":
-            self.canvas.axes_2d.scatter(x_data, all_display_data, alpha=0.7, s=10)
-        elif chart_type == "线图":
-            # 对于线图，我们可能需要按周期分别绘制
-            for i, cycle_data in enumerate(display_data):
-                cycle_phases = np.linspace(0, phase_per_cycle, len(cycle_data))
-                self.canvas.axes_2d.plot(cycle_phases, cycle_data, linewidth=1.0, 
-                                     label=f"周期 {i+1}")
-            # 如果周期数较多，可以选择不显示图例
-            if len(display_data) <= 3:
-                self.canvas.axes_2d.legend(loc='upper right')
+                # 合并所有周期的转换后数据
+                all_display_data = []
+                for cycle_data in display_data:
+                    all_display_data.extend(cycle_data)
+            else:
+                display_data = prpd_data
+                all_display_data = all_data
+        
+            if chart_type == "散点图":
+                self.canvas.axes_2d.scatter(x_data, all_display_data, alpha=0.7, s=10)
+            elif chart_type == "线图":
+                # 对于线图，我们可能需要按周期分别绘制
+                for i, cycle_data in enumerate(display_data):
+                    cycle_phases = np.linspace(0, phase_per_cycle, len(cycle_data))
+                    self.canvas.axes_2d.plot(cycle_phases, cycle_data, linewidth=1.0, 
+                                         label=f"周期 {i+1}")
+                # 如果周期数较多，可以选择不显示图例
+                if len(display_data) <= 3:
+                    self.canvas.axes_2d.legend(loc='upper right')
         
         # 绘制参考正弦波
         if self.show_sine_wave:
@@ -1697,33 +1627,18 @@ class MainWindow(QMainWindow):
         num_cycles = len(prps_data)
         if num_cycles == 0:
             return
-            
-        # 找到所有周期中最大的数据点数
-        max_points = max(len(cycle_data) for cycle_data in prps_data)
+        
+        # 所有周期重采样到最长周期的点数（见gis_pd_core.charts.prps_matrix）
+        z_data, _ = prps_matrix(prps_data)
+        max_points = z_data.shape[1]
         
         # 创建规则网格
-        phase = np.linspace(0, 360, max_points)
+        phase = np.arange(max_points) * (360 / max_points)
         cycles = np.arange(1, num_cycles + 1)
         
-        # 创建空的Z值矩阵
-        z_data = np.zeros((num_cycles, max_points))
-        
-        # 填充Z值矩阵
-        for i, cycle_data in enumerate(prps_data):
-            # 对于每个周期，我们需要将数据重采样到max_points个点
-            if len(cycle_data) == max_points:
-                z_data[i, :] = cycle_data
-            else:
-                # 如果周期的数据点数不等于max_points，则需要重采样
-                cycle_phases = np.linspace(0, 360, len(cycle_data))
-                z_data[i, :] = np.interp(phase, cycle_phases, cycle_data)
-        
         # 根据当前单位设置转换数据
         if self.use_dbm:
-            # 转换z_data中的每个值
-            for i in range(z_data.shape[0]):
-                for j in range(z_data.shape[1]):
-                    z_data[i, j] = self.convert_unit(z_data[i, j], True)
+            z_data = self.convert_unit(z_data, True)
         
         # 创建网格
         X, Y = np.meshgrid(phase, cycles)
@@ -1779,9 +1694,9 @@ class MainWindow(QMainWindow):
         """更新状态信息"""
         # 更新数据库状态
         if self.db_manager is not None and self.db_manager.connected:
-            cycle_count = self.db_manager.get_cycle_count()
-            raw_count = self.db_manager.get_raw_count()
-            db_status = f"数据库: 已连接 (周期数据: {cycle_count}, 原始数据: {raw_count})"
+            # 读取统计表（写入时增量更新），每秒刷新也不扫描数据表
+            stats = self.db_manager.get_stats() or {"cycle_count": 0, "raw_count": 0}
+            db_status = f"数据库: 已连接 (周期数据: {stats['cycle_count']}, 原始数据: {stats['raw_count']})"
             
             # 检查是否正在保存数据
             if self.save_to_db:
@@ -1795,12 +1710,37 @@ class MainWindow(QMainWindow):
             else:
                 self.db_status_label = QLabel(db_status)
                 self.status_bar.addPermanentWidget(self.db_status_label)
+        
+        # 更新消息队列状态（深度和丢弃数）
+        queue_stats = self.mqtt_client.get_queue_stats()
+        queue_status = f"队列: {queue_stats['depth']}/{queue_stats['capacity']} 丢弃: {queue_stats['dropped_count']}"
+        if hasattr(self, 'queue_status_label'):
+            self.queue_status_label.setText(queue_status)
+        else:
+            self.queue_status_label = QLabel(queue_status)
+            self.status_bar.addPermanentWidget(self.queue_status_label)
+        
+        # 更新写库线程状态（待写入行数、平均批大小和提交耗时）
+        writer_stats = self.db_writer.get_stats()
+        writer_status = (f"写库: 待写入 {writer_stats['pending']} "
+                         f"批大小 {writer_stats['avg_batch_size']:.1f} "
+                         f"提交 {writer_stats['last_commit_ms']:.1f}ms")
+        if hasattr(self, 'writer_status_label'):
+            self.writer_status_label.setText(writer_status)
+        else:
+            self.writer_status_label = QLabel(writer_status)
+            self.status_bar.addPermanentWidget(self.writer_status_label)
     
     def closeEvent(self, event):
         """关闭窗口事件"""
         # 断开MQTT连接
         self.mqtt_client.disconnect_from_broker()
         
+        # 写入剩余数据后停止写库线程
+        if self.db_writer is not None:
+            self.db_writer.close()
+        self.db_notifier.close()
+        
         # 关闭数据库连接
         if self.db_manager is not None:
             self.db_manager.close()
@@ -1828,18 +1768,18 @@ class MainWindow(QMainWindow):
         self.save_to_db = (state == Qt.CheckState.Checked.value)
         self.need_redraw = True
 
-    def save_raw_data(self, broker, topic, raw_data):
-        """保存原始数据到数据库（在主线程中执行）"""
-        if self.save_to_db and self.db_manager is not None:
+    def save_raw_data(self, broker, topic, raw_data, channel, timestamp):
+        """保存原始数据到数据库（放入写库线程队列）"""
+        if self.save_to_db and self.db_writer is not None:
             try:
-                self.db_manager.save_raw_data(broker, topic, raw_data)
+                self.db_writer.save_raw(broker, topic, raw_data, channel=channel, timestamp=timestamp)
             except Exception as e:
                 print(f"保存原始数据错误（主线程）: {str(e)}")
 
     def show_database_view(self):
         """显示数据库查看对话框"""
         if self.db_manager is not None and self.db_manager.connected:
-            dialog = DatabaseViewDialog(self.db_manager, self)
+            dialog = DatabaseViewDialog(self.db_manager, self, cycle_query=self.cycle_query)
             dialog.exec()
         else:
             QMessageBox.warning(self, "数据库未连接", "数据库未连接或连接失败，无法查看数据。")
@@ -2094,7 +2034,7 @@ class MainWindow(QMainWindow):
             print(f"获取应用路径出错，使用当前工作目录: {application_path}, 错误: {str(e)}")
         
         # 保存路径信息
-        self.db_path = os.path.join(application_path, "gis_pd_data.db")
+        self.db_path = self.db_manager.db_path if self.db_manager else os.path.join(application_path, "gis_pd_data.db")
         self.images_path = os.path.join(application_path, "saved_images")
         
         print(f"数据库路径: {self.db_path}")
@@ -1,16 +1,42 @@
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Depends
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import sqlite3
 import json
 import asyncio
+import threading
 import os
+import sys
 import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 import numpy as np
 from pydantic import BaseModel
 
+# 将项目根目录加入模块搜索路径，以便导入gis_pd_core公共模块
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from gis_pd_core.charts import (CycleDownsampler, PrpdHistogram, check_prpd_args, prpd_edges, prpd_histogram,
+                                prps_matrix, DOWNSAMPLE_ENVELOPE, DOWNSAMPLE_MODES, MAX_PRPS_POINTS, MAX_PRPS_ROWS,
+                                PRPD_AMPLITUDE_BINS, PRPD_AMPLITUDE_RANGE, PRPD_PHASE_BINS)
+from gis_pd_core.codec import decode_cycle, decode_raw
+from gis_pd_core.database import DatabaseManager, timestamp_to_us, us_to_timestamp
+from gis_pd_core.export import CycleExport
+from gis_pd_core.frames import SAMPLE_TYPES, encode_frame
+from gis_pd_core.notify import listen
+from gis_pd_core.pagination import NEWEST_FIRST, OLDEST_FIRST, decode_cursor
+from gis_pd_core.partitions import PartitionedStore, DAY
+from gis_pd_core.cycle_log import CycleLogStore
+from gis_pd_core.query import CycleBatch, CycleQuery
+from gis_pd_core.storage import CYCLE_LOG_ENV
+from gis_pd_core.schema import ensure_schema
+from gis_pd_core.sqlite_config import connect, query_deadline
+from gis_pd_core.stats import read_stats
+
 # 创建FastAPI应用
 app = FastAPI(title="GIS局部放电在线监测系统")
 
@@ -20,96 +46,528 @@ app.mount("/static", StaticFiles(directory="gis_pd_web/static"), name="static")
 # 设置模板
 templates = Jinja2Templates(directory="gis_pd_web/templates")
 
-# 数据库路径
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gis_pd_data.db")
+# 数据库路径（可通过环境变量GIS_PD_DB_PATH指定）
+DB_PATH = os.environ.get("GIS_PD_DB_PATH") or \
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gis_pd_data.db")
 
-# WebSocket连接管理
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+# 分区存储（采集程序使用--partition时）：设置环境变量GIS_PD_PARTITION_DIR后从分区目录读取数据，
+# 按时间范围查询只打开重叠的分区，实时数据从最新的分区读取
+PARTITION_DIR = os.environ.get("GIS_PD_PARTITION_DIR")
+PARTITION_PERIOD = os.environ.get("GIS_PD_PARTITION_PERIOD", DAY)
+partition_store = PartitionedStore(PARTITION_DIR, PARTITION_PERIOD, read_only=True) if PARTITION_DIR else None
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# 周期日志存储（采集程序使用--backend cycle-log时）：设置环境变量GIS_PD_CYCLE_LOG_DIR后从日志目录读取数据
+CYCLE_LOG_DIR = os.environ.get(CYCLE_LOG_ENV)
+cycle_log_store = CycleLogStore(CYCLE_LOG_DIR, read_only=True) if CYCLE_LOG_DIR and not PARTITION_DIR else None
+
+# 数据查询使用的存储：分区存储、周期日志存储或DB_PATH数据库（只读），查询接口相同（见gis_pd_core.storage）
+store = partition_store or cycle_log_store or DatabaseManager(db_path=DB_PATH, read_only=True)
+# 周期数据查询层（解码后的周期按id缓存，实时刷新时重复读取的最新数据不再重复解码）
+cycle_query = CycleQuery(store)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+# 数据库线程池：所有查询和结果转换都在线程池中执行，慢查询不阻塞事件循环和WebSocket推送；
+# 每个线程使用各自的只读连接（见DatabaseManager的read_only模式）
+DB_WORKERS = int(os.environ.get("GIS_PD_DB_WORKERS", "4"))
+# 同时执行和排队的查询数上限，超出时直接返回繁忙错误
+DB_MAX_PENDING = int(os.environ.get("GIS_PD_DB_MAX_PENDING", "32"))
+# 每个请求的查询时间上限(秒)，超时的SQLite查询被中断
+DB_QUERY_TIMEOUT = float(os.environ.get("GIS_PD_DB_QUERY_TIMEOUT", "30"))
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="gis-pd-db")
+# 实时推送专用的线程（不与查询接口共用线程池，也不计入查询数上限），长时间范围查询占满线程池时推送不被延迟
+hub_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gis-pd-hub")
+# 当前执行和排队的查询数（只在事件循环中修改）：查询在线程中真正结束后才减少，
+# 等待超时返回给客户端的查询仍占用名额
+db_pending = 0
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+# 在线程池中执行一次查询，超过期限时抛出TimeoutError（存储对象对中断的查询返回空结果）
+def call_with_deadline(func, args, kwargs):
+    with query_deadline(DB_QUERY_TIMEOUT) as deadline:
+        result = func(*args, **kwargs)
+    if deadline.expired:
+        raise TimeoutError(f"数据库查询超时（{DB_QUERY_TIMEOUT:g}秒）")
+    return result
+
+def release_db_slot():
+    global db_pending
+    db_pending -= 1
+
+# 在executor中执行func(*args, **kwargs)并等待结果，超时时抛出TimeoutError
+async def run_in(executor, func, args, kwargs, on_done=None):
+    loop = asyncio.get_running_loop()
+    try:
+        future = executor.submit(call_with_deadline, func, args, kwargs)
+    except RuntimeError:
+        # 线程池已关闭，没有完成回调
+        if on_done is not None:
+            on_done()
+        raise
+    if on_done is not None:
+        # 在工作线程中完成（或排队时被取消）后回到事件循环调用
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(on_done))
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), DB_QUERY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"数据库查询超时（{DB_QUERY_TIMEOUT:g}秒）")
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+# 在数据库线程池中执行func(*args, **kwargs)并等待结果；繁忙时抛出RuntimeError，超时时抛出TimeoutError
+async def run_db(func, *args, **kwargs):
+    global db_pending
+    if db_pending >= DB_MAX_PENDING:
+        raise RuntimeError("数据库查询繁忙，请稍后重试")
+    db_pending += 1
+    return await run_in(db_executor, func, args, kwargs, release_db_slot)
 
-manager = ConnectionManager()
+# 在实时推送专用的线程中执行func(*args, **kwargs)（不受查询数上限限制）
+async def run_hub(func, *args, **kwargs):
+    return await run_in(hub_executor, func, args, kwargs)
 
-# 数据库连接
+# JSON编码（格式与FastAPI默认的JSONResponse相同）
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+# 将结果编码为JSON响应，在线程池中调用，大结果的序列化也不占用事件循环；
+# 顶层的列表逐项编码：一次编码整个大结果会长时间持有GIL，事件循环线程在此期间无法运行
+def json_response(content):
+    items = []
+    for key, value in content.items():
+        value_json = "[" + ",".join(map(dumps, value)) + "]" if isinstance(value, list) else dumps(value)
+        items.append(f"{dumps(key)}:{value_json}")
+    return Response("{" + ",".join(items) + "}", media_type="application/json")
+
+# 数据库连接（Web服务只读取数据，使用只读连接，见gis_pd_core.sqlite_config）
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+    db_path = DB_PATH
+    if cycle_log_store is not None:
+        raise sqlite3.OperationalError(f"周期日志存储没有周期数据库: {CYCLE_LOG_DIR}")
+    if partition_store is not None:
+        current = partition_store.current_partition()
+        if current is None:
+            raise sqlite3.OperationalError(f"分区目录中没有数据: {PARTITION_DIR}")
+        db_path = current.path
+    conn = connect(db_path, read_only=True)
     conn.row_factory = sqlite3.Row
     return conn
 
+# 将数据库行转换为原始数据字典（负载以十六进制字符串返回）
+def raw_row_to_dict(row):
+    return {
+        "id": row[0],
+        "timestamp": row[1],
+        "broker": row[2],
+        "topic": row[3],
+        "channel": row[5],
+        "raw_data": decode_raw(row[4]).hex()
+    }
+
+# 分页接口每页的最大行数
+MAX_PAGE_SIZE = 1000
+
+# 检查分页参数：限制每页行数，游标无效时抛出ValueError（存储后端对无效游标返回空页）
+def check_page_args(after: Optional[str], limit: int):
+    if after:
+        decode_cursor(after)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
 # 首页路由
 @app.get("/", response_class=HTMLResponse)
 async def get_index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+# 获取通道列表
+@app.get("/api/channels")
+async def get_channels():
+    try:
+        return {"success": True, "data": await run_db(store.get_channels)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# 读取最新的count个周期（在数据库线程池中调用）
+def latest_cycle_batch(count: int, channel: Optional[str]):
+    # 查询结果按时间倒序，反转为升序（从旧到新）
+    return cycle_query.latest(count, channel=channel).reversed()
+
+def latest_cycle_data(count: int, channel: Optional[str]):
+    return {"success": True, "data": latest_cycle_batch(count, channel).to_dicts()}
+
 # 获取最新周期数据
 @app.get("/api/latest_cycle_data")
-async def get_latest_cycle_data(count: int = 10):
+async def get_latest_cycle_data(count: int = 10, channel: Optional[str] = None):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM cycle_data ORDER BY timestamp DESC LIMIT ?",
-            (count,)
-        )
-        data = cursor.fetchall()
-        conn.close()
-        
-        # 转换数据格式，并按时间戳升序排列（从旧到新）
-        result = []
-        for row in data:
-            cycle_data = {
-                "id": row["id"],
-                "timestamp": row["timestamp"],
-                "cycle_number": row["cycle_number"],
-                "data": [float(x) for x in row["data"].split(',')]
-            }
-            result.append(cycle_data)
-        
-        # 按时间戳升序排列，确保数据按时间顺序
-        result.sort(key=lambda x: x["timestamp"])
-        
-        return {"success": True, "data": result}
+        return await run_db(lambda: json_response(latest_cycle_data(count, channel)))
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-# 获取时间范围内的周期数据
+# 时间范围查询默认返回的周期数和上限
+BY_TIME_MAX_CYCLES = 2000
+BY_TIME_CYCLES_LIMIT = 20000
+# 降采样时每次读取的周期数，以及一次查询最多读取的周期数（超出时只返回已读取部分的降采样结果）
+BY_TIME_CHUNK = 2000
+BY_TIME_MAX_ROWS = 1000000
+
+# 按权重把total个时间段分配给各项（最大余数法），分配结果之和等于total；total不少于项数时每项至少一个
+def split_buckets(total: int, weights):
+    weights = np.asarray(weights, dtype=np.float64)
+    if not len(weights):
+        return np.zeros(0, dtype=np.int64)
+    shares = np.full(len(weights), 1 if total >= len(weights) else 0, dtype=np.int64)
+    quotas = (total - shares.sum()) * weights / weights.sum()
+    shares += np.floor(quotas).astype(np.int64)
+    # 余下的时间段依次分给小数部分最大的项
+    shares[np.argsort(np.floor(quotas) - quotas, kind="stable")[:total - shares.sum()]] += 1
+    return shares
+
+# 降采样的时间段划分（在数据库线程池中调用）：先读取各通道的统计表，时间范围收缩到通道实际有数据的范围。
+# 查询所有通道、且时间范围延伸到统计的最新周期之后时，预留 max_cycles // (通道数 + 1) 个时间段给统计之后
+# 才出现的通道（使用整个时间范围），其余按各通道的周期数分配，各通道与预留的时间段数之和等于max_cycles。
+# 返回 (layout, default)，见CycleDownsampler
+def by_time_layout(start_us: int, end_us: int, channel: Optional[str], max_cycles: int):
+    channels = [channel] if channel is not None else store.get_channels()
+    stats = {name: store.get_stats(name) for name in channels}
+    spans = {}
+    for name, value in stats.items():
+        if not value or not value["cycle_count"]:
+            continue
+        first = max(start_us, timestamp_to_us(value["earliest_cycle"]))
+        last = min(end_us, timestamp_to_us(value["latest_cycle"]))
+        if first <= last:
+            spans[name] = (first, last, value["cycle_count"])
+    counted = [value for value in stats.values() if value and value["cycle_count"]]
+    latest = max((timestamp_to_us(value["latest_cycle"]) for value in counted), default=None)
+    new_data = latest is None or end_us > latest
+    # 指定的通道在统计表中没有数据时全部时间段都给默认划分
+    reserved = max_cycles // (len(spans) + 1) if (channel is None or not spans) and new_data else 0
+    shares = split_buckets(max_cycles - reserved, [count for _, _, count in spans.values()])
+    layout = {name: (first, last, int(share)) for (name, (first, last, _)), share in zip(spans.items(), shares)}
+    return layout, (start_us, end_us, reserved)
+
+# 分块读取时间范围内其余的周期并降采样为最多max_cycles行（在数据库线程池中调用）：rows和batch为已读取的第一页，
+# cursor为其后的游标，最多读取BY_TIME_MAX_ROWS个周期，每块合并到各时间段后即释放。
+# 返回 (CycleDownsampler, 未读完时最后读取的周期时间戳，读完时为None)
+def downsample_by_time(rows, batch, cursor, time_range, channel: Optional[str], max_cycles: int, points: int,
+                       mode: str):
+    layout, default = by_time_layout(*time_range, channel, max_cycles)
+    downsampler = CycleDownsampler(layout, points, mode, default)
+    downsampler.add(batch, [row[5] for row in rows])
+    last_timestamp = rows[-1][1]
+    while cursor is not None and downsampler.rows_read < BY_TIME_MAX_ROWS:
+        rows, cursor = store.get_cycle_page(cursor, BY_TIME_CHUNK, channel=channel, time_range=time_range)
+        if not rows:
+            break
+        # 分块读取的周期只用一次，不放入解码缓存
+        downsampler.add(CycleBatch.from_rows(rows), [row[5] for row in rows])
+        last_timestamp = rows[-1][1]
+    return downsampler, last_timestamp if cursor is not None else None
+
+# 获取时间范围内的周期数据：最多返回max_cycles个周期，超出时降采样（mode=envelope同一时间段的周期合并为最大值包络，
+# mode=lttb按每周期的峰值选取周期），max_points限制每个周期的点数（按相位区间取最大值），脉冲不会因降采样而消失。
+# 超出max_cycles时按BY_TIME_CHUNK个周期一块分块读取，每块合并到各时间段后即释放，最多读取BY_TIME_MAX_ROWS个周期；
+# resolution报告实际的分辨率
 @app.get("/api/cycle_data_by_time")
-async def get_cycle_data_by_time(start_time: str, end_time: str):
+async def get_cycle_data_by_time(start_time: str, end_time: str, channel: Optional[str] = None,
+                                 max_cycles: int = BY_TIME_MAX_CYCLES, max_points: Optional[int] = None,
+                                 mode: str = DOWNSAMPLE_ENVELOPE):
+    def query():
+        time_range = (timestamp_to_us(start_time), timestamp_to_us(end_time))
+        # 分区存储只打开与时间范围重叠的分区，周期日志只读取与时间范围重叠的索引块
+        rows, cursor = store.get_cycle_page(None, max_cycles, channel=channel, order=OLDEST_FIRST,
+                                            time_range=time_range)
+        batch = cycle_query.batch(rows)
+        longest = max((len(values) for values in batch.values), default=0)
+        points = max_points if max_points is not None and max_points < longest else longest
+        if cursor is None:
+            # 不超过max_cycles个周期：原样返回，只按max_points减少每个周期的点数
+            sampled_mode = None
+            if points < longest:
+                batch.values = list(prps_matrix(batch.values, points)[0])
+                sampled_mode = mode
+            sampled, cycles_per_row, read, read_until = batch, np.ones(len(batch), dtype=np.int64), len(batch), None
+        else:
+            downsampler, read_until = downsample_by_time(rows, batch, cursor, time_range, channel, max_cycles,
+                                                         points, mode)
+            sampled, cycles_per_row = downsampler.result()
+            read, longest = downsampler.rows_read, downsampler.longest
+            sampled_mode = mode
+        return json_response({
+            "success": True,
+            "data": sampled.to_dicts(),
+            "resolution": {
+                "mode": sampled_mode,
+                # 读取的周期数（truncated为true时只读取到read_until，之后的周期没有读取）
+                "cycle_count": read,
+                "returned": len(sampled),
+                # 每行最多代表的原周期数（envelope合并的周期数；lttb和未降采样时为1）
+                "cycles_per_row": int(cycles_per_row.max(initial=1)),
+                "points": max((len(values) for values in sampled.values), default=0),
+                "original_points": longest,
+                "truncated": read_until is not None,
+                "read_until": read_until
+            }
+        })
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM cycle_data WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp",
-            (start_time, end_time)
-        )
-        data = cursor.fetchall()
-        conn.close()
+        if mode not in DOWNSAMPLE_MODES:
+            raise ValueError(f"不支持的降采样方式: {mode}")
+        if not 1 <= max_cycles <= BY_TIME_CYCLES_LIMIT:
+            raise ValueError(f"max_cycles应在1到{BY_TIME_CYCLES_LIMIT}之间: {max_cycles}")
+        if max_points is not None and not 1 <= max_points <= MAX_PRPS_POINTS:
+            raise ValueError(f"max_points应在1到{MAX_PRPS_POINTS}之间: {max_points}")
+        return await run_db(query)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# 按游标分页获取周期数据：第一页不传after，之后传入上一页返回的next_cursor，
+# next_cursor为null表示没有更多数据；order为desc（从新到旧，默认）或asc（从旧到新）
+@app.get("/api/cycles")
+async def get_cycles(after: Optional[str] = None, limit: int = 100, channel: Optional[str] = None,
+                     order: str = NEWEST_FIRST):
+    def query():
+        # 后续页沿用游标中的排序方向
+        batch, next_cursor = cycle_query.page(after, limit, channel=channel, order=order)
+        return json_response({"success": True, "data": batch.to_dicts(), "next_cursor": next_cursor})
+    try:
+        limit = check_page_args(after, limit)
+        return await run_db(query)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# 按游标分页获取原始数据（参数与/api/cycles相同）
+@app.get("/api/raw")
+async def get_raw(after: Optional[str] = None, limit: int = 100, channel: Optional[str] = None,
+                  order: str = NEWEST_FIRST):
+    def query():
+        rows, next_cursor = store.get_raw_page(after, limit, channel=channel, order=order)
+        return json_response({"success": True, "data": [raw_row_to_dict(row) for row in rows],
+                              "next_cursor": next_cursor})
+    try:
+        limit = check_page_args(after, limit)
+        return await run_db(query)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# 将数组转换为JSON列表（NaN转换为null）
+def array_to_json(array):
+    return np.where(np.isnan(array), None, np.round(array, 4)).tolist()
+
+# 获取时间范围内的预聚合趋势数据（长时间范围查询不读取逐周期数据）
+@app.get("/api/rollup")
+async def get_rollup(start_time: str, end_time: str, channel: Optional[str] = None,
+                     points: int = 500, resolution: Optional[str] = None):
+    def query():
+        rollup = store.get_rollup(start_time, end_time, channel=channel, points=points, resolution=resolution)
+        if rollup is None:
+            return {"success": False, "error": "查询预聚合数据失败"}
         
-        result = []
-        for row in data:
-            cycle_data = {
-                "id": row["id"],
-                "timestamp": row["timestamp"],
-                "cycle_number": row["cycle_number"],
-                "data": [float(x) for x in row["data"].split(',')]
+        # 每个时间桶所有相位区间中的最大值（fmax忽略没有采样点的区间）
+        bucket_max = np.fmax.reduce(rollup["bin_max"], axis=1)
+        return json_response({
+            "success": True,
+            "data": {
+                "resolution": rollup["resolution"],
+                "bucket_us": rollup["bucket_us"],
+                "timestamps": [us_to_timestamp(int(t)) for t in rollup["time_us"]],
+                "time_us": rollup["time_us"].tolist(),
+                "cycle_count": rollup["cycle_count"].tolist(),
+                "pulse_count": rollup["pulse_count"].tolist(),
+                "max": array_to_json(bucket_max),
+                "bin_max": array_to_json(rollup["bin_max"]),
+                "bin_mean": array_to_json(rollup["bin_mean"])
             }
-            result.append(cycle_data)
-        
-        return {"success": True, "data": result}
+        })
+    try:
+        return await run_db(query)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# 实时PRPD的默认周期数和上限
+PRPD_LIVE_CYCLES = 1000
+PRPD_MAX_LIVE_CYCLES = 20000
+# 同时维护的实时PRPD数（不同的通道和参数组合各一个，超出时移除最久未使用的）
+PRPD_LIVE_HISTOGRAMS = 8
+# 一个实时PRPD：直方图和上次更新时该通道的周期总数（统计表），同一个直方图的更新互斥
+class LivePrpd:
+    def __init__(self, channel: Optional[str], cycles: int, phase_bins: int, amplitude_bins: int, amplitude_range):
+        self.channel = channel
+        self.histogram = PrpdHistogram(cycles, phase_bins, amplitude_bins, amplitude_range)
+        self.cycle_count = 0
+        self.lock = threading.Lock()
+
+    def update(self):
+        """读取该通道新写入的周期并加入直方图（在数据库线程池中调用）"""
+        histogram = self.histogram
+        # 只看该通道的统计：其他通道的新数据不触发读取
+        stats = store.get_stats(self.channel)
+        if not stats or stats["last_cycle_id"] <= histogram.last_id:
+            return
+        if histogram.last_id == 0 or stats["cycle_count"] - self.cycle_count >= histogram.window:
+            # 第一次请求或新周期已超过整个窗口：重新读取最新的window个周期。
+            # 统计之后提交的周期留到下次按id读取，这里跳过以免重复计数
+            rows = [row for row in store.get_latest_cycle_data(histogram.window, channel=self.channel)
+                    if row[0] <= stats["last_cycle_id"]]
+            batch = cycle_query.batch(rows).reversed()
+            histogram.clear()
+            histogram.add(batch.values, batch.ids)
+            histogram.last_id = stats["last_cycle_id"]
+        else:
+            # 按id顺序读取上次之后写入的周期（时间戳乱序时也不会遗漏），
+            # 超出window个的部分留到下次请求
+            batch = cycle_query.after(histogram.last_id, histogram.window, channel=self.channel)
+            histogram.add(batch.values, batch.ids)
+        self.cycle_count = stats["cycle_count"]
+
+# 实时PRPD：(通道, 周期数, 相位区间数, 幅值区间数, 幅值范围) -> LivePrpd，每次请求只计算新到达的周期
+live_prpd = OrderedDict()
+live_prpd_lock = threading.Lock()
+
+# 更新并返回最新cycles个周期的PRPD（在数据库线程池中调用）
+def live_prpd_histogram(channel: Optional[str], cycles: int, phase_bins: int, amplitude_bins: int, amplitude_range):
+    key = (channel, cycles, phase_bins, amplitude_bins, amplitude_range)
+    with live_prpd_lock:
+        live = live_prpd.get(key)
+        if live is None:
+            live = live_prpd[key] = LivePrpd(channel, cycles, phase_bins, amplitude_bins, amplitude_range)
+            while len(live_prpd) > PRPD_LIVE_HISTOGRAMS:
+                live_prpd.popitem(last=False)
+        live_prpd.move_to_end(key)
+    # 不同的直方图可以在多个线程中同时更新
+    with live.lock:
+        live.update()
+        return live.histogram.counts, len(live.histogram)
+
+# 统计时间范围内全部周期的PRPD（在数据库线程池中调用）：按BY_TIME_CHUNK个周期分块读取，每块的计数累加后即释放，
+# 最多读取BY_TIME_MAX_ROWS个周期。返回 (counts, 读取的周期数, 未读完时最后读取的周期时间戳，读完时为None)
+def range_prpd_histogram(start_time: str, end_time: str, channel: Optional[str], phase_bins: int,
+                         amplitude_bins: int, amplitude_range):
+    time_range = (timestamp_to_us(start_time), timestamp_to_us(end_time))
+    counts = np.zeros((phase_bins, amplitude_bins), dtype=np.int64)
+    read, cursor, last_timestamp = 0, None, None
+    while True:
+        rows, cursor = store.get_cycle_page(cursor, BY_TIME_CHUNK, channel=channel, order=OLDEST_FIRST,
+                                            time_range=time_range)
+        if rows:
+            # 分块读取的周期只用一次，不放入解码缓存
+            counts += prpd_histogram(CycleBatch.from_rows(rows).values, phase_bins, amplitude_bins, amplitude_range)
+            read += len(rows)
+            last_timestamp = rows[-1][1]
+        if cursor is None or not rows or read >= BY_TIME_MAX_ROWS:
+            break
+    return counts, read, last_timestamp if cursor is not None else None
+
+# 获取PRPD计数矩阵（相位区间 x 幅值区间的采样点数，前端直接渲染为密度图）：
+# 指定start_time和end_time时分块统计时间范围内的全部周期（最多BY_TIME_MAX_ROWS个，超出时truncated为true，
+# 只统计到read_until），否则统计最新cycles个周期（增量更新）；
+# 幅值范围默认为ADC满量程（毫伏），超出范围的采样点计入两端的区间
+@app.get("/api/prpd")
+async def get_prpd(start_time: Optional[str] = None, end_time: Optional[str] = None, channel: Optional[str] = None,
+                   cycles: int = PRPD_LIVE_CYCLES, phase_bins: int = PRPD_PHASE_BINS,
+                   amplitude_bins: int = PRPD_AMPLITUDE_BINS, amplitude_min: float = PRPD_AMPLITUDE_RANGE[0],
+                   amplitude_max: float = PRPD_AMPLITUDE_RANGE[1]):
+    def query():
+        read_until = None
+        if start_time is not None and end_time is not None:
+            counts, cycle_count, read_until = range_prpd_histogram(start_time, end_time, channel, phase_bins,
+                                                                   amplitude_bins, amplitude_range)
+        else:
+            counts, cycle_count = live_prpd_histogram(channel, cycles, phase_bins, amplitude_bins, amplitude_range)
+        phase_edges, amplitude_edges = prpd_edges(phase_bins, amplitude_bins, amplitude_range)
+        return json_response({
+            "success": True,
+            "data": {
+                "cycle_count": cycle_count,
+                "point_count": int(counts.sum()),
+                "phase_edges": phase_edges.tolist(),
+                "amplitude_edges": np.round(amplitude_edges, 6).tolist(),
+                # counts[i][j]为第i个相位区间、第j个幅值区间的采样点数
+                "counts": counts.tolist(),
+                "truncated": read_until is not None,
+                "read_until": read_until
+            }
+        })
+    try:
+        phase_bins, amplitude_bins, amplitude_range = check_prpd_args(
+            phase_bins, amplitude_bins, (amplitude_min, amplitude_max))
+        cycles = min(max(1, cycles), PRPD_MAX_LIVE_CYCLES)
+        return await run_db(query)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# PRPS矩阵默认的周期数（与实时PRPS图相同）和默认的行数上限
+PRPS_CYCLES = 50
+PRPS_MAX_ROWS = 200
+
+# 获取PRPS矩阵（周期 x 相位的幅值，前端直接渲染为三维图）：
+# 指定start_time和end_time时读取时间范围内的周期，否则读取最新count个周期；
+# 每个周期重采样到points个相位点（默认为最长周期的点数），周期数超过max_rows时相邻周期按最大值包络合并为一行。
+# 时间范围内超过max_rows个周期时分块读取，按时间段合并（见downsample_by_time，points默认为第一块中最长周期的点数），
+# 最多读取BY_TIME_MAX_ROWS个周期，超出时truncated为true，只读取到read_until
+@app.get("/api/prps")
+async def get_prps(start_time: Optional[str] = None, end_time: Optional[str] = None, channel: Optional[str] = None,
+                   count: int = PRPS_CYCLES, points: Optional[int] = None, max_rows: int = PRPS_MAX_ROWS):
+    def query():
+        cursor, read_until = None, None
+        if start_time is not None and end_time is not None:
+            time_range = (timestamp_to_us(start_time), timestamp_to_us(end_time))
+            rows, cursor = store.get_cycle_page(None, max_rows, channel=channel, order=OLDEST_FIRST,
+                                                time_range=time_range)
+            batch = cycle_query.batch(rows)
+        else:
+            batch = latest_cycle_batch(count, channel)
+        if cursor is None:
+            matrix, starts = prps_matrix(batch.values, points, max_rows)
+            cycles_per_row = np.diff(np.append(starts, len(batch)))
+            cycle_count, cycle_numbers = len(batch), batch.cycle_numbers[starts]
+            timestamps = [batch.timestamps[i] for i in starts]
+        else:
+            row_points = points or max(len(values) for values in batch.values)
+            downsampler, read_until = downsample_by_time(rows, batch, cursor, time_range, channel, max_rows,
+                                                         row_points, DOWNSAMPLE_ENVELOPE)
+            sampled, cycles_per_row = downsampler.result()
+            matrix = np.vstack(sampled.values) if len(sampled) else np.zeros((0, row_points))
+            cycle_count, timestamps, cycle_numbers = downsampler.rows_read, sampled.timestamps, sampled.cycle_numbers
+        return json_response({
+            "success": True,
+            "data": {
+                "cycle_count": cycle_count,
+                "points": matrix.shape[1],
+                # 每行合并的周期数（未抽取时为1）
+                "cycles_per_row": cycles_per_row.tolist(),
+                "phase": (np.arange(matrix.shape[1]) * (360 / max(matrix.shape[1], 1))).tolist(),
+                # 每行第一个周期的时间和周期编号
+                "timestamps": timestamps,
+                "cycle_numbers": cycle_numbers.tolist(),
+                "z": [array_to_json(row) for row in matrix],
+                "truncated": read_until is not None,
+                "read_until": read_until
+            }
+        })
+    try:
+        if points is not None and not 1 <= points <= MAX_PRPS_POINTS:
+            raise ValueError(f"相位点数应在1到{MAX_PRPS_POINTS}之间: {points}")
+        if not 1 <= max_rows <= MAX_PRPS_ROWS:
+            raise ValueError(f"行数上限应在1到{MAX_PRPS_ROWS}之间: {max_rows}")
+        return await run_db(query)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# 将时间范围内的周期数据导出为.npy文件（结构化数组，可用np.load(..., mmap_mode="r")直接内存映射），
+# 分块读取并流式返回，不在内存中生成整个文件；dtype为float64或float32
+@app.get("/api/export")
+async def export_cycles(start_time: str, end_time: str, channel: Optional[str] = None,
+                        points: Optional[int] = None, dtype: str = "float64"):
+    try:
+        if cycle_log_store is not None:
+            return {"success": False, "error": f"周期日志存储不需要导出，可直接内存映射日志文件: {CYCLE_LOG_DIR}"}
+        start_us, end_us = timestamp_to_us(start_time), timestamp_to_us(end_time)
+        if partition_store is not None:
+            paths = [p.path for p in partition_store.partitions_for_range(start_us, end_us)]
+        else:
+            paths = [DB_PATH]
+        # 统计导出行数在线程池中执行，之后的分块读取由StreamingResponse在线程中迭代
+        export = await run_db(CycleExport, paths, start_us, end_us, channel=channel, points=points,
+                              value_dtype=dtype)
+        filename = f"gis_pd_cycles_{us_to_timestamp(start_us)[:19].replace(' ', '_').replace(':', '')}.npy"
+        return StreamingResponse(export.stream(), media_type="application/octet-stream", headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(export.nbytes),
+        })
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -117,127 +575,252 @@ async def get_cycle_data_by_time(start_time: str, end_time: str):
 @app.get("/api/db_stats")
 async def get_db_stats():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取周期数据总数
-        cursor.execute("SELECT COUNT(*) as count FROM cycle_data")
-        cycle_count = cursor.fetchone()["count"]
-        
-        # 获取原始数据总数
-        cursor.execute("SELECT COUNT(*) as count FROM raw_data")
-        raw_count = cursor.fetchone()["count"]
-        
-        # 获取最新周期数据的时间戳
-        cursor.execute("SELECT MAX(timestamp) as latest FROM cycle_data")
-        latest_cycle = cursor.fetchone()["latest"]
-        
-        # 获取最早周期数据的时间戳
-        cursor.execute("SELECT MIN(timestamp) as earliest FROM cycle_data")
-        earliest_cycle = cursor.fetchone()["earliest"]
-        
-        conn.close()
+        # 行数和时间范围读取统计表（写入时增量更新），不扫描数据表
+        stats = await run_db(store.get_stats)
+        if stats is None:
+            return {"success": False, "error": "读取统计信息失败"}
         
         return {
             "success": True,
             "data": {
-                "cycle_count": cycle_count,
-                "raw_count": raw_count,
-                "latest_cycle": latest_cycle,
-                "earliest_cycle": earliest_cycle
+                "cycle_count": stats["cycle_count"],
+                "raw_count": stats["raw_count"],
+                "latest_cycle": stats["latest_cycle"],
+                "earliest_cycle": stats["earliest_cycle"]
             }
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-# 跟踪最新数据ID
-last_data_id = 0
-
-# 检查数据库是否有新数据
-async def check_new_data():
-    global last_data_id
-    try:
+# 获取最新的周期数据ID（读取统计表；分区存储只读取最新的分区，不打开所有分区）
+def get_max_cycle_id():
+    if partition_store is not None:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取最新数据的ID
-        cursor.execute("SELECT MAX(id) as max_id FROM cycle_data")
-        result = cursor.fetchone()
-        max_id = result["max_id"] if result and result["max_id"] is not None else 0
-        
-        # 如果有新数据
-        if max_id > last_data_id:
-            # 获取新数据，增加获取数量以确保PRPS图表有足够数据
-            cursor.execute(
-                "SELECT * FROM cycle_data WHERE id > ? ORDER BY timestamp DESC LIMIT 50",
-                (last_data_id,)
-            )
-            data = cursor.fetchall()
-            
-            # 更新最新数据ID
-            last_data_id = max_id
-            
-            # 转换数据格式
-            result = []
-            for row in data:
-                cycle_data = {
-                    "id": row["id"],
-                    "timestamp": row["timestamp"],
-                    "cycle_number": row["cycle_number"],
-                    "data": [float(x) for x in row["data"].split(',')]
-                }
-                result.append(cycle_data)
-            
-            # 按时间戳升序排列，确保数据按时间顺序
-            result.sort(key=lambda x: x["timestamp"])
-            
-            return {"success": True, "data": result, "has_new_data": True}
+        try:
+            return read_stats(conn)["last_cycle_id"]
+        finally:
+            conn.close()
+    stats = store.get_stats()
+    if not stats:
+        raise RuntimeError("读取统计信息失败")
+    return stats["last_cycle_id"]
+
+# 检查新数据的间隔(秒)；写入端的提交通知（见gis_pd_core.notify）到达时立即检查，轮询只是兜底
+POLL_INTERVAL = 1.0
+# 每次检查按id顺序读取的新周期数上限（所有通道），每个客户端最多推送其中最新的PUSH_CYCLES个；
+# 读满时立即再检查一次，积压的新数据分多次读完
+NEW_DATA_LIMIT = 500
+# 每次推送的周期数，满足PRPS图表需求
+PUSH_CYCLES = 50
+# 每个客户端待发送的消息数上限，客户端接收过慢时丢弃最旧的消息
+SUBSCRIBER_QUEUE_SIZE = 16
+
+# 一个WebSocket客户端：待发送消息队列和已发送的最大周期id（各客户端独立）
+# sample_type为None时推送JSON文本，否则推送该采样点类型的二进制帧（见gis_pd_core.frames）
+class Subscriber:
+    def __init__(self, websocket: WebSocket, channel: Optional[str], sample_type: Optional[str] = None):
+        self.websocket = websocket
+        self.channel = channel
+        self.sample_type = sample_type
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.cursor = 0
+        self.dropped = 0
+
+    def offer(self, frame):
+        """放入一条消息，队列已满时丢弃最旧的消息（实时图表只需要最新数据）"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+# 将新数据编码为一条消息：sample_type为None时为JSON文本，否则为二进制帧
+def encode_message(batch, sample_type: Optional[str]):
+    if sample_type is None:
+        return dumps({"success": True, "data": batch.to_dicts(), "has_new_data": True})
+    return encode_frame(batch, sample_type, has_new_data=True)
+
+# 新数据消息：一批周期数据和按格式缓存的编码结果（同一通道、同一格式的所有客户端共用）
+class Frame:
+    def __init__(self, batch):
+        self.batch = batch
+        self.ids = batch.ids.tolist()
+        self.messages = {}
+
+    def encode(self, sample_type: Optional[str]):
+        if sample_type not in self.messages:
+            self.messages[sample_type] = encode_message(self.batch, sample_type)
+        return self.messages[sample_type]
+
+    def message_after(self, cursor, sample_type: Optional[str]):
+        """cursor之后的数据；客户端连接时的初始数据与第一条消息可能重叠，重叠时重新编码"""
+        if min(self.ids) > cursor:
+            return self.encode(sample_type)
+        indices = [i for i, row_id in enumerate(self.ids) if row_id > cursor]
+        return encode_message(self.batch.take(indices), sample_type) if indices else None
+
+# 新数据分发：一个后台任务检查新数据，每个周期只读取和解码一次，每个订阅通道只编码一次，
+# 再放入各客户端的消息队列；有客户端连接时运行，最后一个客户端断开后停止。
+# 收到写入端的提交通知时立即检查，没有通知（写入端未启用或通知丢失）时每POLL_INTERVAL秒检查一次
+class CycleHub:
+    def __init__(self):
+        self.subscribers: List[Subscriber] = []
+        self.last_id = 0
+        self.task = None
+        self.changed = asyncio.Event()
+        self.listener = None
+
+    def wake(self):
+        """写入端提交了新数据"""
+        self.changed.set()
+
+    async def start_listener(self):
+        """开始监听写入端的提交通知（只启动一次），失败时只使用轮询"""
+        if self.listener is not None:
+            return
+        try:
+            self.listener = await listen(self.wake) or False
+        except OSError as e:
+            print(f"监听新数据通知失败，改为每{POLL_INTERVAL:g}秒检查一次: {str(e)}")
+            self.listener = False
+
+    def close(self):
+        if self.listener:
+            self.listener.close()
+        self.listener = None
+
+    async def connect(self, websocket: WebSocket, channel: Optional[str], sample_type: Optional[str] = None):
+        await websocket.accept()
+        subscriber = Subscriber(websocket, channel, sample_type)
+        self.subscribers.append(subscriber)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    def read_frames(self, subscriptions):
+        """读取last_id之后的新数据，按订阅的 (通道, 格式) 生成并编码消息（在数据库线程池中调用）
+
+        Returns:
+            (frames, more)：more为True表示读满了NEW_DATA_LIMIT个，还有未读取的新数据
+        """
+        # 按id顺序读取（写入顺序），时间戳乱序、多个事务分批提交时也不会遗漏周期
+        batch = cycle_query.after(self.last_id, NEW_DATA_LIMIT)
+        if not len(batch):
+            return {}, False
+        self.last_id = int(batch.ids[-1])
         
-        conn.close()
-        return {"success": True, "data": [], "has_new_data": False}
-    except Exception as e:
-        print(f"检查新数据错误: {str(e)}")
-        return {"success": False, "error": str(e), "has_new_data": False}
+        frames = {}
+        for channel, sample_type in subscriptions:
+            if channel not in frames:
+                indices = [i for i, c in enumerate(batch.channels) if channel is None or c == channel][-PUSH_CYCLES:]
+                frames[channel] = Frame(batch.take(indices)) if indices else None
+            if frames[channel] is not None:
+                frames[channel].encode(sample_type)
+        return frames, len(batch) >= NEW_DATA_LIMIT
+
+    def broadcast(self, frames):
+        for subscriber in self.subscribers:
+            frame = frames.get(subscriber.channel)
+            if frame is not None:
+                subscriber.offer(frame)
+
+    async def run(self):
+        self.changed = asyncio.Event()
+        await self.start_listener()
+        # 读取失败时重试，不从头读取（会重新推送整个数据库）
+        self.last_id = None
+        while self.subscribers and self.last_id is None:
+            try:
+                self.last_id = await run_hub(get_max_cycle_id)
+            except Exception as e:
+                print(f"读取最新数据ID错误，{POLL_INTERVAL:g}秒后重试: {str(e)}")
+                await asyncio.sleep(POLL_INTERVAL)
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self.changed.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            # 检查期间到达的通知会再触发一次检查
+            self.changed.clear()
+            try:
+                subscriptions = {(subscriber.channel, subscriber.sample_type) for subscriber in self.subscribers}
+                frames, more = await run_hub(self.read_frames, subscriptions)
+                self.broadcast(frames)
+                if more:
+                    self.changed.set()
+            except Exception as e:
+                print(f"检查新数据错误: {str(e)}")
+
+hub = CycleHub()
 
 # WebSocket路由，用于实时数据推送
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # 客户端可通过 /ws?channel=通道ID 只订阅一个通道；
+    # /ws?format=binary&samples=float32|uint16 使用二进制帧推送周期数据（见gis_pd_core.frames），默认为JSON。
+    # 出错时的消息总是JSON文本
+    channel = websocket.query_params.get("channel")
+    sample_type = None
+    if websocket.query_params.get("format") == "binary":
+        sample_type = websocket.query_params.get("samples", "float32")
+        if sample_type not in SAMPLE_TYPES:
+            sample_type = "float32"
+    subscriber = await hub.connect(websocket, channel, sample_type)
     try:
-        # 发送初始数据，获取50个周期以满足PRPS图表需求
-        latest_data = await get_latest_cycle_data(count=50)
-        await websocket.send_json(latest_data)
+        # 发送初始数据，获取50个周期以满足PRPS图表需求（先订阅再读取，之后的新数据不会遗漏）
+        try:
+            batch = await run_db(latest_cycle_batch, PUSH_CYCLES, channel)
+            subscriber.cursor = int(batch.ids.max()) if len(batch) else 0
+            if sample_type is None:
+                await websocket.send_text(await run_db(lambda: dumps({"success": True, "data": batch.to_dicts()})))
+            else:
+                await websocket.send_bytes(await run_db(encode_frame, batch, sample_type))
+        except WebSocketDisconnect:
+            raise
+        except Exception as e:
+            await websocket.send_json({"success": False, "error": str(e)})
         
-        # 获取当前最新数据ID
-        global last_data_id
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(id) as max_id FROM cycle_data")
-        result = cursor.fetchone()
-        last_data_id = result["max_id"] if result and result["max_id"] is not None else 0
-        conn.close()
-        
-        # 实时检查数据库更新
+        # 发送后台任务分发的新数据，只发送该客户端尚未收到的周期
         while True:
-            # 每隔1秒检查一次数据库更新
-            await asyncio.sleep(1)
-            new_data = await check_new_data()
-            
-            # 只有在有新数据时才发送
-            if new_data["has_new_data"]:
-                await websocket.send_json(new_data)
-            
+            frame = await subscriber.queue.get()
+            message = frame.message_after(subscriber.cursor, sample_type)
+            if message is None:
+                continue
+            if sample_type is None:
+                await websocket.send_text(message)
+            else:
+                await websocket.send_bytes(message)
+            subscriber.cursor = max(subscriber.cursor, max(frame.ids))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        hub.disconnect(subscriber)
 
 # 启动服务器时的事件
 @app.on_event("startup")
 async def startup_event():
+    if partition_store is not None:
+        # 分区由采集程序创建并升级表结构，Web服务只读取
+        print(f"服务器启动，分区存储目录: {os.path.abspath(PARTITION_DIR)}，分区数: {len(partition_store.list_partitions())}")
+        return
+    if cycle_log_store is not None:
+        print(f"服务器启动，周期日志目录: {os.path.abspath(CYCLE_LOG_DIR)}，周期数: {cycle_log_store.get_cycle_count()}")
+        return
     print(f"服务器启动，数据库路径: {os.path.abspath(DB_PATH)}")
-    # 检查数据库连接
+    # 检查数据库连接，并将旧版本的表结构升级到当前版本
     try:
-        conn = get_db_connection()
+        # 升级表结构需要写连接，同时将数据库切换为WAL模式
+        conn = connect(DB_PATH)
+        ensure_schema(conn)
         conn.close()
+        global store, cycle_query
+        if not store.connected:
+            # 数据库文件在启动时才创建，重新打开只读存储
+            store = DatabaseManager(db_path=DB_PATH, read_only=True)
+            cycle_query = CycleQuery(store)
         print("数据库连接成功")
     except Exception as e:
         print(f"数据库连接失败: {str(e)}")
@@ -245,11 +828,13 @@ async def startup_event():
 # 关闭服务器时的事件
 @app.on_event("shutdown")
 async def shutdown_event():
+    hub.close()
+    db_executor.shutdown(wait=False)
+    hub_executor.shutdown(wait=False)
     print("服务器关闭")
 
-# 数据库测试和诊断路由
-@app.get("/api/db_test")
-async def test_database():
+# 检查数据库文件、表和统计信息（在数据库线程池中调用）
+def database_test():
     try:
         # 检查数据库文件是否存在
         if not os.path.exists(DB_PATH):
@@ -273,9 +858,11 @@ async def test_database():
         raw_count = 0
         latest_cycle = None
         
-        if "cycle_data" in table_names:
-            cursor.execute("SELECT COUNT(*) as count FROM cycle_data")
-            cycle_count = cursor.fetchone()["count"]
+        if "cycle_data" in table_names and "raw_data" in table_names:
+            # 数据总数读取统计表
+            stats = read_stats(conn)
+            cycle_count = stats["cycle_count"]
+            raw_count = stats["raw_count"]
             
             if cycle_count > 0:
                 cursor.execute("SELECT * FROM cycle_data ORDER BY id DESC LIMIT 1")
@@ -285,13 +872,10 @@ async def test_database():
                         "id": latest_record["id"],
                         "timestamp": latest_record["timestamp"],
                         "cycle_number": latest_record["cycle_number"],
-                        "data_length": len(latest_record["data"].split(',')) if latest_record["data"] else 0
+                        "channel": latest_record["channel"],
+                        "data_length": len(decode_cycle(latest_record["data"]))
                     }
         
-        if "raw_data" in table_names:
-            cursor.execute("SELECT COUNT(*) as count FROM raw_data")
-            raw_count = cursor.fetchone()["count"]
-        
         conn.close()
         
         return {
@@ -311,6 +895,14 @@ async def test_database():
             "absolute_path": os.path.abspath(DB_PATH)
         }
 
+# 数据库测试和诊断路由
+@app.get("/api/db_test")
+async def test_database():
+    try:
+        return await run_db(database_test)
+    except Exception as e:
+        return {"success": False, "error": str(e), "database_path": DB_PATH}
+
 # 如果直接运行此文件
 if __name__ == "__main__":
     import uvicorn
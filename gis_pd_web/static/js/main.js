@@ -3,6 +3,7 @@ let prpdChart = null;
 let prpsChart = null;
 let historyPrpdChart = null;
 let historyPrpsChart = null;
+let historyTrendChart = null;
 let websocket = null;
 let useDbm = false;
 let showSineWave = true;
@@ -12,6 +13,7 @@ let maxCycles = 10; // 默认显示10个周期
 let colorScheme = 'default';
 let prpsMaxCycles = 50; // PRPS图固定显示最新的50个周期
 let accumulatedData = []; // 存储累积的周期数据
+let currentChannel = ''; // 当前选择的通道，空字符串表示全部通道
 
 // 颜色方案定义
 const colorSchemes = {
@@ -38,6 +40,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // 加载数据库统计信息
     loadDbStats();
     
+    // 加载通道列表
+    loadChannels();
+    
     // 防止图表大小变化
     preventChartResize();
 });
@@ -245,11 +250,13 @@ function connectWebSocket() {
         websocket.close();
     }
     
-    // 创建新的WebSocket连接
+    // 创建新的WebSocket连接，周期数据使用二进制帧（float32采样点）推送
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${protocol}//${window.location.host}/ws`;
+    const wsUrl = `${protocol}//${window.location.host}/ws?format=binary&samples=float32` +
+        (currentChannel ? '&channel=' + encodeURIComponent(currentChannel) : '');
     
     websocket = new WebSocket(wsUrl);
+    websocket.binaryType = 'arraybuffer';
     
     websocket.onopen = function(event) {
         console.log('WebSocket连接已建立');
@@ -258,7 +265,8 @@ function connectWebSocket() {
     };
     
     websocket.onmessage = function(event) {
-        const data = JSON.parse(event.data);
+        // 二进制帧为周期数据，文本消息为JSON（出错时的消息）
+        const data = typeof event.data === 'string' ? JSON.parse(event.data) : decodeCycleFrame(event.data);
         if (data.success) {
             // 检查是否有数据
             if (data.data && data.data.length > 0) {
@@ -298,6 +306,65 @@ function connectWebSocket() {
     };
 }
 
+// 解码WebSocket二进制帧（格式见gis_pd_core/frames.py），返回与JSON消息相同结构的对象；
+// float32帧的周期数据是ArrayBuffer上的Float32Array视图，不复制数据
+function decodeCycleFrame(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== 'GPD1' || view.getUint8(4) !== 1) {
+        return {success: false, error: '无效的二进制帧'};
+    }
+    const sampleType = view.getUint8(5);
+    const hasNewData = (view.getUint8(6) & 0x01) !== 0;
+    const count = view.getUint32(8, true);
+    const points = view.getUint32(12, true);
+    const tableBytes = view.getUint32(16, true);
+    const scale = view.getFloat64(24, true);
+    const offset = view.getFloat64(32, true);
+    
+    // 各段的起始位置按8字节对齐
+    let position = 40;
+    const section = (ArrayType, length) => {
+        const array = new ArrayType(buffer, position, length);
+        position += Math.ceil(array.byteLength / 8) * 8;
+        return array;
+    };
+    const timeUs = section(Float64Array, count);
+    const ids = section(Float64Array, count);
+    const cycleNumbers = section(Float64Array, count);
+    const lengths = section(Uint32Array, count);
+    const channelIndex = section(Uint16Array, count);
+    const samples = section(sampleType === 0 ? Float32Array : Uint16Array, count * points);
+    const channelTable = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, position, tableBytes)));
+    
+    const items = [];
+    for (let i = 0; i < count; i++) {
+        const start = i * points;
+        let values = samples.subarray(start, start + lengths[i]);
+        if (sampleType !== 0) {
+            // uint16量化的采样点：值 = offset + code * scale
+            values = Float32Array.from(values, code => code === 0xFFFF ? NaN : offset + code * scale);
+        }
+        items.push({
+            id: ids[i],
+            timestamp: formatTimeUs(timeUs[i]),
+            time_us: timeUs[i],
+            cycle_number: cycleNumbers[i],
+            channel: channelTable[channelIndex[i]],
+            data: values
+        });
+    }
+    return {success: true, data: items, has_new_data: hasNewData};
+}
+
+// 工具函数：epoch微秒格式化为数据库时间戳格式（本地时间，YYYY-MM-DD HH:MM:SS.ffffff）
+function formatTimeUs(timeUs) {
+    const date = new Date(Math.floor(timeUs / 1000));
+    const pad = (value, width = 2) => String(value).padStart(width, '0');
+    return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())} ` +
+        `${pad(date.getHours())}:${pad(date.getMinutes())}:${pad(date.getSeconds())}.${pad(timeUs % 1000000, 6)}`;
+}
+
 // 更新图表数据
 function updateCharts(data) {
     // 更新PRPD图表
@@ -539,6 +606,13 @@ function addSineWave(chart, data) {
 
 // 初始化控件事件
 function initControlEvents() {
+    // 通道切换：清空累积数据并重新连接WebSocket，只接收所选通道的数据
+    document.getElementById('channel-select').addEventListener('change', function() {
+        currentChannel = this.value;
+        accumulatedData = [];
+        connectWebSocket();
+    });
+    
     // 图表类型切换
     document.getElementById('chart-type').addEventListener('change', function() {
         const chartType = this.value;
@@ -593,53 +667,27 @@ function initControlEvents() {
         queryHistoricalData();
     });
     
+    // 导出时间范围内的周期数据
+    document.getElementById('export-btn').addEventListener('click', function() {
+        exportCycleData();
+    });
+    
     // 历史图表类型切换
     document.getElementById('history-chart-type').addEventListener('change', function() {
         const chartType = this.value;
         const historyPrpdChartWrapper = document.getElementById('history-prpd-chart').closest('.chart-wrapper');
         const historyPrpsChartWrapper = document.getElementById('history-prps-chart').closest('.chart-wrapper');
         
-        if (chartType === 'prps') {
-            // 显示PRPS图
+        if (chartType === 'prpd-density') {
+            // PRPD密度图由服务器统计，不获取逐周期数据
             historyPrpsChartWrapper.style.display = 'block';
             document.getElementById('history-prps-chart').style.display = 'block';
-            
-            // 当切换到PRPS图时，确保重新渲染图表
-            // 获取当前查询的数据
-            const queryType = document.getElementById('query-type').value;
-            let url;
-            
-            if (queryType === 'latest') {
-                const count = document.getElementById('latest-count').value;
-                url = `/api/latest_cycle_data?count=${count}`;
-            } else {
-                const startTime = document.getElementById('start-time').value;
-                const endTime = document.getElementById('end-time').value;
-                
-                if (!startTime || !endTime) {
-                    alert('请选择开始时间和结束时间');
-                    return;
-                }
-                
-                const formattedStartTime = formatDateTimeForDb(startTime);
-                const formattedEndTime = formatDateTimeForDb(endTime);
-                
-                url = `/api/cycle_data_by_time?start_time=${encodeURIComponent(formattedStartTime)}&end_time=${encodeURIComponent(formattedEndTime)}`;
-            }
-            
-            // 重新获取数据并更新PRPS图表
-            fetch(url)
-                .then(response => response.json())
-                .then(data => {
-                    if (data.success) {
-                        updateHistoryPrpsChart(data.data);
-                    } else {
-                        console.error('获取历史数据失败:', data.error);
-                    }
-                })
-                .catch(error => {
-                    console.error('请求历史数据出错:', error);
-                });
+            queryPrpdDensity();
+        } else if (chartType === 'prps') {
+            // 显示PRPS图（服务器计算PRPS矩阵）
+            historyPrpsChartWrapper.style.display = 'block';
+            document.getElementById('history-prps-chart').style.display = 'block';
+            queryPrpsMatrix();
         } else {
             // 显示PRPD图
             historyPrpsChartWrapper.style.display = 'block';
@@ -724,14 +772,54 @@ function loadDbStats() {
         });
 }
 
+// 加载通道列表
+function loadChannels() {
+    fetch('/api/channels')
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                const select = document.getElementById('channel-select');
+                // 未标记通道的旧数据只在"全部通道"中显示
+                data.data.filter(channel => channel).forEach(channel => {
+                    const option = document.createElement('option');
+                    option.value = channel;
+                    option.textContent = channel;
+                    select.appendChild(option);
+                });
+            } else {
+                console.error('加载通道列表失败:', data.error);
+            }
+        })
+        .catch(error => {
+            console.error('请求通道列表出错:', error);
+        });
+}
+
+// 生成通道查询参数
+function channelQuery() {
+    return currentChannel ? `&channel=${encodeURIComponent(currentChannel)}` : '';
+}
+
 // 查询历史数据
 function queryHistoricalData() {
     const queryType = document.getElementById('query-type').value;
     let url;
     
+    // 长时间趋势查询读取预聚合数据
+    document.getElementById('history-trend-container').style.display = queryType === 'trend' ? 'block' : 'none';
+    if (queryType === 'trend') {
+        queryTrendData();
+        return;
+    }
+    
+    if (document.getElementById('history-chart-type').value === 'prpd-density') {
+        queryPrpdDensity();
+        return;
+    }
+    
     if (queryType === 'latest') {
         const count = document.getElementById('latest-count').value;
-        url = `/api/latest_cycle_data?count=${count}`;
+        url = `/api/latest_cycle_data?count=${count}${channelQuery()}`;
     } else {
         const startTime = document.getElementById('start-time').value;
         const endTime = document.getElementById('end-time').value;
@@ -745,13 +833,14 @@ function queryHistoricalData() {
         const formattedStartTime = formatDateTimeForDb(startTime);
         const formattedEndTime = formatDateTimeForDb(endTime);
         
-        url = `/api/cycle_data_by_time?start_time=${encodeURIComponent(formattedStartTime)}&end_time=${encodeURIComponent(formattedEndTime)}`;
+        url = `/api/cycle_data_by_time?start_time=${encodeURIComponent(formattedStartTime)}&end_time=${encodeURIComponent(formattedEndTime)}${channelQuery()}`;
     }
     
     fetch(url)
         .then(response => response.json())
         .then(data => {
             if (data.success) {
+                showHistoryResolution(data.resolution);
                 updateHistoryCharts(data.data);
             } else {
                 console.error('查询历史数据失败:', data.error);
@@ -764,6 +853,252 @@ function queryHistoricalData() {
         });
 }
 
+// 显示时间范围查询的实际分辨率（服务器降采样时说明合并或选取的方式）
+function showHistoryResolution(resolution) {
+    const element = document.getElementById('history-resolution');
+    if (!resolution || !resolution.mode) {
+        element.textContent = '';
+        return;
+    }
+    let text = `共 ${resolution.cycle_count} 个周期，显示 ${resolution.returned} 个`;
+    if (resolution.mode === 'envelope') {
+        text += `（相邻周期按最大值合并，每行最多 ${resolution.cycles_per_row} 个周期）`;
+    } else {
+        text += '（按峰值选取代表性周期）';
+    }
+    if (resolution.points < resolution.original_points) {
+        text += `，每周期 ${resolution.points}/${resolution.original_points} 点`;
+    }
+    if (resolution.truncated) {
+        text += `；读取的周期数已达上限，只显示到 ${resolution.read_until}`;
+    }
+    element.textContent = text;
+}
+
+// 查询PRPD密度图（服务器按相位区间和幅值区间统计采样点数，返回固定大小的计数矩阵）
+function queryPrpdDensity() {
+    const queryType = document.getElementById('query-type').value;
+    let url;
+    
+    if (queryType === 'latest') {
+        const count = document.getElementById('latest-count').value;
+        url = `/api/prpd?cycles=${count}${channelQuery()}`;
+    } else {
+        const startTime = document.getElementById('start-time').value;
+        const endTime = document.getElementById('end-time').value;
+        
+        if (!startTime || !endTime) {
+            alert('请选择开始时间和结束时间');
+            return;
+        }
+        
+        const formattedStartTime = formatDateTimeForDb(startTime);
+        const formattedEndTime = formatDateTimeForDb(endTime);
+        url = `/api/prpd?start_time=${encodeURIComponent(formattedStartTime)}&end_time=${encodeURIComponent(formattedEndTime)}${channelQuery()}`;
+    }
+    
+    fetch(url)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                document.getElementById('history-prps-chart').style.display = 'block';
+                updatePrpdDensityChart(data.data);
+            } else {
+                console.error('查询PRPD密度图失败:', data.error);
+                alert('查询PRPD密度图失败: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('请求PRPD密度图出错:', error);
+            alert('请求PRPD密度图出错: ' + error);
+        });
+}
+
+// 查询PRPS矩阵（服务器把周期重采样到相同的相位点数，周期数较多时按最大值包络合并相邻周期）
+function queryPrpsMatrix() {
+    const queryType = document.getElementById('query-type').value;
+    let url;
+    
+    if (queryType === 'latest') {
+        const count = document.getElementById('latest-count').value;
+        url = `/api/prps?count=${count}${channelQuery()}`;
+    } else {
+        const startTime = document.getElementById('start-time').value;
+        const endTime = document.getElementById('end-time').value;
+        
+        if (!startTime || !endTime) {
+            alert('请选择开始时间和结束时间');
+            return;
+        }
+        
+        const formattedStartTime = formatDateTimeForDb(startTime);
+        const formattedEndTime = formatDateTimeForDb(endTime);
+        url = `/api/prps?start_time=${encodeURIComponent(formattedStartTime)}&end_time=${encodeURIComponent(formattedEndTime)}${channelQuery()}`;
+    }
+    
+    fetch(url)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                updateHistoryPrpsChart(data.data);
+            } else {
+                console.error('获取PRPS矩阵失败:', data.error);
+            }
+        })
+        .catch(error => {
+            console.error('请求PRPS矩阵出错:', error);
+        });
+}
+
+// 绘制PRPD密度图（counts[i][j]为第i个相位区间、第j个幅值区间的采样点数）
+function updatePrpdDensityChart(data) {
+    const centers = edges => edges.slice(1).map((edge, i) => (edges[i] + edge) / 2);
+    const amplitudes = centers(data.amplitude_edges).map(value => useDbm ? convertToDbm(value) : value);
+    
+    const plotData = [{
+        type: 'heatmap',
+        x: centers(data.phase_edges),
+        y: amplitudes,
+        z: data.counts,
+        // counts按相位区间排列，转置后行对应幅值
+        transpose: true,
+        colorscale: getColorscale(colorScheme),
+        colorbar: {title: '点数'}
+    }];
+    
+    const layout = {
+        title: `PRPD密度图 (${data.cycle_count}个周期，${data.point_count}个采样点)`,
+        xaxis: {title: '相位 (°)', range: [0, 360]},
+        yaxis: {title: useDbm ? '幅值 (dBm)' : '幅值 (mV)'},
+        margin: {l: 60, r: 20, b: 50, t: 40},
+        autosize: true
+    };
+    
+    Plotly.react(historyPrpsChart, plotData, layout, {responsive: true, displaylogo: false});
+}
+
+// 下载时间范围内的周期数据（.npy文件，服务器分块流式生成）
+function exportCycleData() {
+    const startTime = document.getElementById('start-time').value;
+    const endTime = document.getElementById('end-time').value;
+    
+    if (!startTime || !endTime) {
+        alert('请选择开始时间和结束时间');
+        return;
+    }
+    
+    const formattedStartTime = formatDateTimeForDb(startTime);
+    const formattedEndTime = formatDateTimeForDb(endTime);
+    window.location.href = `/api/export?start_time=${encodeURIComponent(formattedStartTime)}&end_time=${encodeURIComponent(formattedEndTime)}${channelQuery()}`;
+}
+
+// 查询长时间趋势（服务器根据点数选择1秒/1分钟/1小时的预聚合分辨率）
+function queryTrendData() {
+    const startTime = document.getElementById('start-time').value;
+    const endTime = document.getElementById('end-time').value;
+    
+    if (!startTime || !endTime) {
+        alert('请选择开始时间和结束时间');
+        return;
+    }
+    
+    const formattedStartTime = formatDateTimeForDb(startTime);
+    const formattedEndTime = formatDateTimeForDb(endTime);
+    const url = `/api/rollup?start_time=${encodeURIComponent(formattedStartTime)}&end_time=${encodeURIComponent(formattedEndTime)}&points=500${channelQuery()}`;
+    
+    fetch(url)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                updateTrendChart(data.data);
+            } else {
+                console.error('查询趋势数据失败:', data.error);
+                alert('查询趋势数据失败: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('请求趋势数据出错:', error);
+            alert('请求趋势数据出错: ' + error);
+        });
+}
+
+// 更新趋势图：每个时间桶的最大幅值和脉冲数
+function updateTrendChart(data) {
+    const maxValues = data.max.map(value => (value === null || !useDbm) ? value : convertToDbm(value));
+    const datasets = [
+        {
+            label: useDbm ? '最大幅值 (dBm)' : '最大幅值 (mV)',
+            data: maxValues,
+            borderColor: 'rgba(255, 99, 132, 1)',
+            backgroundColor: 'rgba(255, 99, 132, 0.2)',
+            pointRadius: 0,
+            borderWidth: 1,
+            yAxisID: 'y'
+        },
+        {
+            label: '脉冲数',
+            data: data.pulse_count,
+            borderColor: 'rgba(54, 162, 235, 1)',
+            backgroundColor: 'rgba(54, 162, 235, 0.2)',
+            pointRadius: 0,
+            borderWidth: 1,
+            yAxisID: 'y1'
+        }
+    ];
+    
+    document.getElementById('history-trend-title').textContent =
+        `趋势图（分辨率 ${data.resolution}，${data.timestamps.length} 个时间桶）`;
+    
+    if (historyTrendChart) {
+        historyTrendChart.data.labels = data.timestamps;
+        historyTrendChart.data.datasets = datasets;
+        historyTrendChart.update();
+        return;
+    }
+    
+    const ctx = document.getElementById('history-trend-chart').getContext('2d');
+    historyTrendChart = new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: data.timestamps,
+            datasets: datasets
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            animation: false,
+            scales: {
+                x: {
+                    title: {
+                        display: true,
+                        text: '时间'
+                    },
+                    ticks: {
+                        maxTicksLimit: 10
+                    }
+                },
+                y: {
+                    position: 'left',
+                    title: {
+                        display: true,
+                        text: '最大幅值'
+                    }
+                },
+                y1: {
+                    position: 'right',
+                    title: {
+                        display: true,
+                        text: '脉冲数'
+                    },
+                    grid: {
+                        drawOnChartArea: false
+                    }
+                }
+            }
+        }
+    });
+}
+
 // 更新历史图表
 function updateHistoryCharts(data) {
     const chartType = document.getElementById('history-chart-type').value;
@@ -773,7 +1108,7 @@ function updateHistoryCharts(data) {
     
     // 如果选择的是PRPS图，则更新PRPS图表并显示
     if (chartType === 'prps') {
-        updateHistoryPrpsChart(data);
+        queryPrpsMatrix();
         document.getElementById('history-prps-chart').style.display = 'block';
     } else {
         document.getElementById('history-prps-chart').style.display = 'none';
@@ -841,55 +1176,15 @@ function updateHistoryPrpdChart(data, type) {
 
 // 更新历史PRPS图表
 function updateHistoryPrpsChart(data) {
-    // 准备数据
-    let numCycles = data.length;
-    if (numCycles === 0) return;
-    
-    console.log("历史PRPS图表更新 - 接收到的周期数:", numCycles);
-    
-    // 只使用PRPS需要的最新周期数
-    let prpsData = data;
-    if (numCycles > prpsMaxCycles) {
-        prpsData = data.slice(-prpsMaxCycles);
-        numCycles = prpsMaxCycles;
-    }
+    // data为/api/prps返回的PRPS矩阵（服务器已完成重采样和抽取）
+    const numRows = data.z.length;
+    if (numRows === 0) return;
     
-    console.log("历史PRPS图表更新 - 使用的周期数:", numCycles);
+    console.log("历史PRPS图表更新 - 周期数:", data.cycle_count, "行数:", numRows);
     
-    // 找到所有周期中最大的数据点数
-    let maxPoints = 0;
-    prpsData.forEach(cycle => {
-        maxPoints = Math.max(maxPoints, cycle.data.length);
-    });
-    
-    // 创建规则网格
-    const phase = Array.from({length: maxPoints}, (_, i) => i * (360 / maxPoints));
-    const cycles = Array.from({length: numCycles}, (_, i) => i + 1);
-    
-    // 创建Z值矩阵
-    const zData = Array(numCycles).fill().map(() => Array(maxPoints).fill(0));
-    
-    // 填充Z值矩阵
-    prpsData.forEach((cycle, i) => {
-        const cycleData = cycle.data;
-        
-        if (cycleData.length === maxPoints) {
-            // 如果数据点数等于maxPoints，直接填充
-            for (let j = 0; j < maxPoints; j++) {
-                zData[i][j] = useDbm ? convertToDbm(cycleData[j]) : cycleData[j];
-            }
-        } else {
-            // 如果数据点数不等于maxPoints，需要重采样
-            const cyclePhases = Array.from({length: cycleData.length}, (_, i) => i * (360 / cycleData.length));
-            
-            for (let j = 0; j < maxPoints; j++) {
-                // 使用线性插值
-                const phaseValue = phase[j];
-                let value = interpolateValue(cyclePhases, cycleData, phaseValue);
-                zData[i][j] = useDbm ? convertToDbm(value) : value;
-            }
-        }
-    });
+    const phase = data.phase;
+    const cycles = Array.from({length: numRows}, (_, i) => i + 1);
+    const zData = useDbm ? data.z.map(row => row.map(value => value === null ? null : convertToDbm(value))) : data.z;
     
     // 创建新的数据对象
     const plotData = [{
@@ -911,7 +1206,9 @@ function updateHistoryPrpsChart(data) {
     
     // 更新布局
     const layout = {
-        title: `历史PRPS图 (${numCycles}个周期)`,
+        title: numRows < data.cycle_count ?
+            `历史PRPS图 (${data.cycle_count}个周期，每行最多合并${Math.max(...data.cycles_per_row)}个周期)` :
+            `历史PRPS图 (${numRows}个周期)`,
         scene: {
             xaxis: {
                 title: '相位 (°)',
@@ -919,7 +1216,7 @@ function updateHistoryPrpsChart(data) {
             },
             yaxis: {
                 title: '周期',
-                range: [1, prpsMaxCycles]
+                range: [1, numRows]
             },
             zaxis: {
                 title: {
@@ -969,7 +1266,7 @@ function fetchLatestData() {
     const requestCount = Math.max(maxCycles, prpsMaxCycles);
     console.log(`请求最新数据 - 请求数量: ${requestCount} (PRPD: ${maxCycles}, PRPS: ${prpsMaxCycles})`);
     
-    fetch(`/api/latest_cycle_data?count=${requestCount}`)
+    fetch(`/api/latest_cycle_data?count=${requestCount}${channelQuery()}`)
         .then(response => response.json())
         .then(data => {
             if (data.success) {
@@ -0,0 +1,31 @@
+"""PartitionedStore分区存储测试"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gis_pd_core import PartitionedStore  # noqa: E402
+
+DATA = [0.0, 1.0]
+
+
+def test_ids_unique_after_restart_with_late_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PartitionedStore(tmp)
+        store.write_batch([("2026-01-02 10:00:00.000", 1, DATA, "A")], [])
+        store.write_batch([("2026-01-03 10:00:00.000", 2, DATA, "A")],
+                          [("2026-01-03 10:00:00.000", "broker", "topic", b"raw", "A")])
+        # 迟到的数据写入较早的分区，该分区的自增序列超过最新的分区
+        store.write_batch([("2026-01-02 11:00:00.000", 3, DATA, "A"),
+                           ("2026-01-02 12:00:00.000", 4, DATA, "A")], [])
+        store.close()
+
+        store = PartitionedStore(tmp)
+        try:
+            store.write_batch([("2026-01-03 11:00:00.000", 5, DATA, "A")], [])
+            ids = [row[0] for row in store.get_cycles_after(0)]
+            assert len(ids) == 5
+            assert len(set(ids)) == len(ids)
+        finally:
+            store.close()
@@ -0,0 +1,53 @@
+"""BatchWriter写库线程测试"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gis_pd_core import BatchWriter, DatabaseManager  # noqa: E402
+
+
+class FailingStore:
+    """第一次写入时抛出异常的存储，之后委托给真实的数据库"""
+    def __init__(self, db):
+        self.db = db
+        self.calls = 0
+
+    def write_batch(self, cycle_records, raw_records):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("模拟写入错误")
+        return self.db.write_batch(cycle_records, raw_records)
+
+
+def test_bad_row_rejected_and_good_row_saved():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(db_path=os.path.join(tmp, "test.db"))
+        writer = BatchWriter(db, max_delay_ms=0)
+        try:
+            assert not writer.save_cycle_batch([("2026-01-01 00:00:00.000000", 1, [1.0, "bad"], "A")])
+            assert writer.save_cycle(2, [1.0, 2.0], channel="A")
+            assert writer.flush(5)
+            assert writer._thread.is_alive()
+            assert db.get_cycle_count() == 1
+        finally:
+            writer.close()
+            db.close()
+
+
+def test_writer_survives_commit_exception():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(db_path=os.path.join(tmp, "test.db"))
+        writer = BatchWriter(FailingStore(db), max_delay_ms=0)
+        try:
+            writer.save_cycle(1, [1.0], channel="A")
+            assert writer.flush(5)
+            writer.save_cycle(2, [2.0], channel="A")
+            assert writer.flush(5)
+            assert writer._thread.is_alive()
+            assert writer.get_stats()["failed_batches"] == 1
+            assert db.get_cycle_count() == 1
+        finally:
+            writer.close()
+            db.close()